@@ -8,6 +8,14 @@ case "$1" in
         echo "Running in test mode..."
         python -m streamlit run src/Home.py -- --test-mode
         ;;
+    "record")
+        echo "Running in record mode (LLM responses are saved to the cassette)..."
+        LLM_PROVIDER=record python -m streamlit run src/Home.py -- --test-mode
+        ;;
+    "replay")
+        echo "Running in replay mode (LLM responses are served from the cassette)..."
+        LLM_PROVIDER=replay python -m streamlit run src/Home.py -- --test-mode
+        ;;
     *)
         echo "Running in regular mode..."
         python -m streamlit run src/Home.py
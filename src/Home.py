@@ -1,14 +1,32 @@
 import streamlit as st
+from contextlib import contextmanager
 from pathlib import Path
 from services.openai_service import OpenAIService
 from services.firebase_service import FirebaseService
 from services.pdf_service import PDFService
 from services.user_service import UserService
 from services.goal_refinement_service import GoalRefinementService
+from services.resilience import ResilienceManager, CircuitBreaker
+from services.llm_scheduler import scheduling
+from services.plan_index import PlanIndex
+from services.job_service import Job, JobService
+from services.deferred_queue import DeferredQueue
+from services.refinement_chat import RefinementConversation
+from services.plan_store import PlanStore
 from components.welcome import show_welcome_section
 from components.ui import get_pdf_download_link
-from utils.session import init_session_state, is_valid_email
+from utils.session import init_session_state, is_valid_email, get_session_id
 from test_data import get_test_goal
+from config.settings import (
+    LLM_STREAMING_ENABLED,
+    SPECULATIVE_PREFETCH_ENABLED,
+    PLAN_INDEX_ENABLED,
+    PLAN_INDEX_MIN_SIMILARITY,
+    BACKGROUND_JOBS_ENABLED,
+    JOB_POLL_SECONDS,
+    DEFERRED_QUEUE_ENABLED,
+)
+from config.prompts import DEFAULT_QUESTION_BANK
 import base64
 import sys
 
@@ -31,6 +49,184 @@ def reset_form():
     st.session_state.refined_goal = None
     st.session_state.refinement_questions = None
     st.session_state.show_refinement_response = False
+    st.session_state.refinement_chat = None
+    openai_service.cancel_prefetched_questions(get_session_id())
+    job_service.cancel(st.session_state.plan_job_id)
+    st.session_state.plan_job_id = None
+    st.session_state.plan_error = None
+    st.session_state.deferred_request_id = None
+    st.query_params.pop("plan", None)
+
+def streaming_text(render):
+    """Return an `on_delta` callback that re-renders partial text in a placeholder."""
+    if not LLM_STREAMING_ENABLED:
+        return None
+    placeholder = st.empty()
+    return lambda text: render(placeholder, text)
+
+def streaming_questions():
+    """Return an `on_question` callback that lists questions as they arrive."""
+    if not LLM_STREAMING_ENABLED:
+        return None
+    container = st.container()
+    return lambda question: container.markdown(f"- {question}")
+
+PLAN_STREAM_SECTIONS = {
+    'strategic_initiatives': "🎯 Strategic Initiatives",
+    'one_time_actions': "🔧 One-time Setup Actions",
+    'habits': "✨ Daily Micro-habits",
+}
+
+def streaming_plan():
+    """Return an `on_item` callback that renders plan items under their section as they arrive."""
+    if not LLM_STREAMING_ENABLED:
+        return None
+    sections = {}
+    counts = {}
+    for key, title in PLAN_STREAM_SECTIONS.items():
+        sections[key] = st.container()
+        sections[key].markdown(f"#### {title}")
+        counts[key] = 0
+
+    def on_item(section, item):
+        counts[section] += 1
+        sections[section].markdown(f"**{counts[section]}.** {item}")
+    return on_item
+
+def streaming_section():
+    """Return an `on_item` callback that lists the items of a regenerated section as they arrive."""
+    if not LLM_STREAMING_ENABLED:
+        return None
+    container = st.container()
+    return lambda section, item: container.markdown(f"- {item}")
+
+@contextmanager
+def queued_status():
+    """Attribute LLM calls to this session and show the queue position while they wait."""
+    placeholder = st.empty()
+    def on_queued(position):
+        if position:
+            placeholder.info(f"⏳ We're busy right now. You're queued, position {position}.")
+        else:
+            placeholder.empty()
+    with scheduling(get_session_id(), on_queued):
+        yield
+
+def find_draft_plan(goal):
+    """Return the stored goal most similar to `goal`, or None if none is similar enough."""
+    if not PLAN_INDEX_ENABLED:
+        return None
+    neighbors = plan_index.search(goal, k=1, min_similarity=PLAN_INDEX_MIN_SIMILARITY)
+    draft = firebase_service.get_goal(neighbors[0][0]) if neighbors else None
+    if draft:
+        plan_index.record_draft()
+    return draft
+
+def render_stored_plan(goal):
+    """List the initiatives and habits of a goal document."""
+    for title, items in (("🎯 Strategic Initiatives", goal.get('tasks')), ("✨ Daily Micro-habits", goal.get('habits'))):
+        st.markdown(f"**{title}**")
+        for item in (items or '').split('\n'):
+            if item.strip():
+                st.markdown(f"- {item}")
+
+def render_draft_plan(draft):
+    """Show a stored plan as a draft while the personalized plan is generated."""
+    st.markdown("#### 📋 Draft plan from a similar goal")
+    st.caption(f"While we personalize your plan, here is one made for: {draft['goal']}")
+    render_stored_plan(draft)
+
+def show_draft_plan(goal):
+    """Show the stored plan of the most similar past goal; returns its placeholder, or None."""
+    draft = find_draft_plan(goal)
+    if not draft:
+        return None
+    placeholder = st.empty()
+    with placeholder.container():
+        render_draft_plan(draft)
+    return placeholder
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def plan_job_status():
+    """Poll the background plan job, showing items as they stream, and pick up the finished plan."""
+    if st.session_state.plan_job_id is None:
+        return
+    job = job_service.get(st.session_state.plan_job_id)
+    if job is None:
+        st.session_state.plan_job_id = None
+        st.error("Your plan request expired. Please try again.")
+    elif job.status == Job.DONE:
+        st.session_state.current_plan = job.result
+        st.session_state.plan_saved = False
+        st.session_state.plan_job_id = None
+        st.rerun()
+    elif job.status == Job.FAILED:
+        st.session_state.plan_job_id = None
+        st.session_state.plan_error = openai_service.error_message(job.error)
+        st.rerun()
+    else:
+        st.info("🎨 Creating your personalized plan... Feel free to look around; it will be here when you come back.")
+        items = list(job.progress)
+        for section, title in PLAN_STREAM_SECTIONS.items():
+            section_items = [item for item_section, item in items if item_section == section]
+            if section_items:
+                st.markdown(f"#### {title}")
+                for i, item in enumerate(section_items, 1):
+                    st.markdown(f"**{i}.** {item}")
+        if not items and st.session_state.get('plan_job_draft'):
+            render_draft_plan(st.session_state.plan_job_draft)
+
+def show_deferred_form(goal=None, questions=None, answers=None, time_commitment=None):
+    """Offer to generate the plan once the AI provider is back, with reminders to the user's email.
+
+    Without a goal, the form also asks for the goal and answers to the default questions.
+    """
+    if st.session_state.deferred_request_id:
+        # Its status is shown at the top of the page
+        return
+
+    with st.form("deferred_form"):
+        st.markdown("#### 📬 Get your plan later instead")
+        st.caption("Our AI provider is unavailable right now. Leave your email and we'll create your plan as soon as "
+                   "it's back, with daily reminders to that address.")
+        if goal is None:
+            goal = st.text_area("What's your goal?", height=100)
+            questions = DEFAULT_QUESTION_BANK
+            answers = [st.text_input(question, key=f"deferred_answer_{i}") for i, question in enumerate(questions)]
+        email = st.text_input("Email address", value=st.session_state.user_email or "")
+        submit_deferred = st.form_submit_button("Create My Plan Later", type="primary")
+
+    if submit_deferred:
+        if not is_valid_email(email):
+            st.error("Please enter a valid email address.")
+        elif not goal.strip() or not all(answer.strip() for answer in answers):
+            st.error("🤔 Please fill in your goal and answer all questions first!")
+        else:
+            st.session_state.deferred_request_id = deferred_queue.enqueue(
+                goal, questions, answers, email, time_commitment, session_id=get_session_id()
+            )
+            # The link to this page now leads back to the plan
+            st.query_params["plan"] = deferred_queue.status(st.session_state.deferred_request_id)['goal_id']
+            st.rerun()
+
+def show_deferred_plan():
+    """Show the status of the session's deferred request, and the plan once it is ready."""
+    request = deferred_queue.status(st.session_state.deferred_request_id)
+    if request is None:
+        st.warning("We couldn't find this plan request.")
+    elif request['status'] == DeferredQueue.DONE:
+        plan = firebase_service.get_goal(request['goal_id'])
+        if plan is None:
+            st.warning("Your plan is ready but couldn't be loaded. Please refresh the page.")
+            return
+        st.success("✨ Your plan is ready!")
+        st.markdown(f"#### {plan['goal']}")
+        render_stored_plan(plan)
+    elif request['status'] == DeferredQueue.FAILED:
+        st.error("We couldn't create your plan. Please try again.")
+    else:
+        st.info("📬 Your plan request is saved. It will appear on this page as soon as it's ready; "
+                "bookmark this page to come back to it.")
 
 def check_connectivity():
     """Check if we can connect to OpenAI's API."""
@@ -42,27 +238,23 @@ def check_connectivity():
         return False
 
 def save_entries():
+    """Persist the current plan; safe on every rerun since unchanged plans are not written again."""
     try:
         # Ensure time_commitment is set
         if 'time_commitment' not in st.session_state.current_plan:
             st.session_state.current_plan['time_commitment'] = time_commitment
-        # Save to Firebase
-        firebase_service.store_user_goal(
-            goal=st.session_state.current_plan['goal'],
-            questions=st.session_state.current_plan['questions'],
-            answers=st.session_state.current_plan['answers'],
+        # Upserted into Firebase in the background, keyed on the session and goal
+        goal_id = plan_store.save(
+            get_session_id(),
+            st.session_state.current_plan,
             time_commitment=st.session_state.current_plan['time_commitment'],
-            tasks=st.session_state.current_plan['initiatives'],  # Assuming you want to store initiatives here
-            habits=st.session_state.current_plan['habits'],
-            reminder_settings={
-                'email': st.session_state.user_email,
-                'frequency': 'Daily',
-                'time': None,
-                'status': 'active'
-            }
+            email=st.session_state.user_email
         )
-        st.session_state.plan_saved = True
-        st.success("✨ Your plan has been saved!")
+        if PLAN_INDEX_ENABLED:
+            plan_index.add(goal_id, st.session_state.current_plan['goal'])
+        if not st.session_state.plan_saved:
+            st.session_state.plan_saved = True
+            st.success("✨ Your plan has been saved!")
     except Exception as e:
         st.error(f"Error saving plan: {str(e)}")
 
@@ -72,9 +264,19 @@ pdf_service = PDFService()
 user_service = UserService()
 firebase_service = FirebaseService()
 goal_refinement_service = GoalRefinementService()
+plan_index = PlanIndex()
+job_service = JobService()
+deferred_queue = DeferredQueue()
+plan_store = PlanStore()
+if DEFERRED_QUEUE_ENABLED:
+    deferred_queue.start_worker()
+if PLAN_INDEX_ENABLED:
+    plan_index.sync_in_background(firebase_service.get_goals_since)
 
 # Constants
 TEST_MODE_ENABLED = "--test-mode" in sys.argv
+ONESHOT_REFINEMENT = goal_refinement_service.pipeline_mode == "oneshot"
+CHAT_REFINEMENT = goal_refinement_service.pipeline_mode == "chat"
 
 # Initialize session state
 if 'current_step' not in st.session_state:
@@ -104,6 +306,14 @@ css_path = Path(__file__).parent / "styles" / "main.css"
 with open(css_path) as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
+# A link to a deferred plan shows that plan
+if st.query_params.get("plan") and not st.session_state.deferred_request_id:
+    st.session_state.deferred_request_id = deferred_queue.find(st.query_params["plan"])
+    if st.session_state.deferred_request_id is None:
+        st.query_params.pop("plan", None)
+if st.session_state.deferred_request_id:
+    show_deferred_plan()
+
 # Check connectivity before proceeding
 if not check_connectivity():
     st.error("""
@@ -114,11 +324,17 @@ if not check_connectivity():
         
         If the problem persists, your network might be blocking the connection.
     """)
+    if DEFERRED_QUEUE_ENABLED:
+        show_deferred_form()
     st.stop()
 
 # Show welcome section
 show_welcome_section()
 
+# Warn when the AI provider is failing fast
+if CircuitBreaker.OPEN in ResilienceManager().breaker_states().values():
+    st.warning("⚠️ Our AI provider is having trouble right now. Some requests may fail or use a backup model.")
+
 # Add test mode in sidebar only if enabled
 if TEST_MODE_ENABLED:
     with st.sidebar:
@@ -144,6 +360,7 @@ if TEST_MODE_ENABLED:
                     st.session_state.refined_goal = None
                     st.session_state.show_refinement_response = False
                     st.session_state.show_questions = False
+                    st.session_state.questions = None
                     st.session_state.current_plan = None
                     st.session_state.goal_input = None
                     
@@ -170,18 +387,88 @@ if not st.session_state.current_plan:
                 placeholder="Example: I want to get a promotion",
                 height=100
             )
+            if ONESHOT_REFINEMENT:
+                # Ask the refinement questions up front so a single request can refine the goal
+                st.markdown(goal_refinement_service.get_intake_questions())
+                intake_response = st.text_area(
+                    "Your response",
+                    value=test_data['refinement_response'] if test_data else "",
+                    height=100
+                )
             submit_goal = st.form_submit_button("Continue", type="primary")
             
-            if submit_goal and goal_input.strip():
+            if submit_goal and goal_input.strip() and ONESHOT_REFINEMENT:
+                if intake_response.strip():
+                    st.session_state.initial_goal = goal_input
+                    with queued_status():
+                        refinement = openai_service.generate_refined_goal_and_questions(
+                            goal_input,
+                            intake_response,
+                            on_question=streaming_questions()
+                        )
+                    if refinement:
+                        st.session_state.refinement_questions = goal_refinement_service.get_intake_questions()
+                        st.session_state.refined_goal = refinement.refined_goal
+                        st.session_state.questions = refinement.questions
+                        st.rerun()
+            elif submit_goal and goal_input.strip() and CHAT_REFINEMENT:
                 st.session_state.initial_goal = goal_input
-                questions = goal_refinement_service.get_refinement_questions(goal_input)
+                conversation = RefinementConversation(goal_input)
+                with queued_status():
+                    reply = goal_refinement_service.send_chat_message(
+                        conversation,
+                        goal_input,
+                        on_delta=streaming_text(lambda placeholder, text: placeholder.markdown(text))
+                    )
+                if reply:
+                    st.session_state.refinement_chat = conversation
+                    st.session_state.show_refinement_response = True
+                    st.rerun()
+            elif submit_goal and goal_input.strip():
+                st.session_state.initial_goal = goal_input
+                with queued_status():
+                    questions = goal_refinement_service.get_refinement_questions(
+                        goal_input,
+                        on_delta=streaming_text(lambda placeholder, text: placeholder.markdown(text))
+                    )
                 if questions:
                     st.session_state.refinement_questions = questions
                     st.session_state.show_refinement_response = True
                     st.rerun()
     
+    # Step 2: Refinement chat
+    if st.session_state.show_refinement_response and st.session_state.refinement_chat:
+        conversation = st.session_state.refinement_chat
+        refinement_container = st.container()
+        with refinement_container:
+            st.markdown("### Step 2: Let's refine your goal")
+            for message in conversation.messages[1:]:
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+
+            proposed_goal = conversation.proposed_goal()
+            if proposed_goal and proposed_goal != st.session_state.refined_goal:
+                if st.button("Use this goal", key="use_chat_goal", type="primary"):
+                    st.session_state.refined_goal = proposed_goal
+                    st.rerun()
+
+            if not st.session_state.refined_goal:
+                chat_message = st.chat_input("Answer, or ask for changes to the goal")
+                if chat_message:
+                    with st.chat_message("user"):
+                        st.markdown(chat_message)
+                    with st.chat_message("assistant"):
+                        with queued_status():
+                            reply = goal_refinement_service.send_chat_message(
+                                conversation,
+                                chat_message,
+                                on_delta=streaming_text(lambda placeholder, text: placeholder.markdown(text))
+                            )
+                    if reply:
+                        st.rerun()
+
     # Step 2: Refinement Questions
-    if st.session_state.show_refinement_response:
+    elif st.session_state.show_refinement_response:
         refinement_container = st.container()
         with refinement_container:
             st.markdown("### Step 2: Let's refine your goal")
@@ -195,10 +482,12 @@ if not st.session_state.current_plan:
                 submit_refinement = st.form_submit_button("Continue", type="primary")
                 
                 if submit_refinement and refinement_response.strip():
-                    refined_goal = goal_refinement_service.generate_refined_goal(
-                        st.session_state.initial_goal,
-                        refinement_response
-                    )
+                    with queued_status():
+                        refined_goal = goal_refinement_service.generate_refined_goal(
+                            st.session_state.initial_goal,
+                            refinement_response,
+                            on_delta=streaming_text(lambda placeholder, text: placeholder.info(text))
+                        )
                     if refined_goal:
                         st.session_state.refined_goal = refined_goal
                         st.rerun()
@@ -210,18 +499,35 @@ if not st.session_state.current_plan:
             st.markdown("### Step 3: Your Refined Goal")
             st.info(st.session_state.refined_goal)
             
+            # Start generating the clarifying questions while the user reads the goal
+            if SPECULATIVE_PREFETCH_ENABLED and not st.session_state.questions:
+                openai_service.prefetch_questions(st.session_state.refined_goal, get_session_id())
+            
             col1, col2 = st.columns([1, 1])
             with col1:
                 if st.button("Start Over", key="start_over"):
+                    openai_service.cancel_prefetched_questions(get_session_id())
+                    job_service.cancel(st.session_state.plan_job_id)
+                    st.session_state.plan_job_id = None
                     st.session_state.initial_goal = None
                     st.session_state.refined_goal = None
                     st.session_state.refinement_questions = None
                     st.session_state.show_refinement_response = False
+                    st.session_state.refinement_chat = None
+                    st.session_state.questions = None
+                    st.session_state.show_questions = False
                     st.rerun()
             with col2:
                 if st.button("Begin My Journey", key="begin_journey", type="primary"):
                     st.session_state.goal_input = st.session_state.refined_goal
-                    st.session_state.questions = openai_service.generate_questions(st.session_state.refined_goal)
+                    # The oneshot pipeline already generated the questions with the refined goal
+                    if not st.session_state.questions:
+                        with queued_status():
+                            st.session_state.questions = openai_service.generate_questions(
+                                st.session_state.refined_goal,
+                                on_question=streaming_questions(),
+                                session_id=get_session_id()
+                            )
                     if st.session_state.questions:
                         st.session_state.show_questions = True
                         st.rerun()
@@ -302,24 +608,51 @@ if not st.session_state.current_plan:
                     st.error("⏰ Please set your daily time commitment!")
                     st.stop()
 
-                with st.spinner("🎨 Creating your personalized plan..."):
+                st.session_state.plan_error = None
+                if BACKGROUND_JOBS_ENABLED:
                     goal = st.session_state.refined_goal
                     questions = st.session_state.questions
                     answers = [st.session_state[f"answer_{i}"] for i in range(len(questions))]
                     
-                    # Generate the plan
-                    plan = openai_service.generate_plan(goal, questions, answers)
+                    # Generate off the script thread; plan_job_status picks up the result
+                    job_service.cancel(st.session_state.plan_job_id)
+                    st.session_state.plan_job_id = openai_service.start_plan_job(goal, questions, answers, get_session_id())
+                    st.session_state.plan_job_draft = find_draft_plan(goal) if st.session_state.plan_job_id else None
+                else:
+                    with st.spinner("🎨 Creating your personalized plan..."):
+                        goal = st.session_state.refined_goal
+                        questions = st.session_state.questions
+                        answers = [st.session_state[f"answer_{i}"] for i in range(len(questions))]
+                    
+                        # Show a similar stored plan right away, then stream the personalized one
+                        draft = show_draft_plan(goal)
+                        with queued_status():
+                            plan = openai_service.generate_plan(goal, questions, answers, on_item=streaming_plan())
+                        if draft:
+                            draft.empty()
                     
-                    if plan:
-                        st.session_state.current_plan = plan
-                        st.session_state.plan_saved = False
-                        st.rerun()
-                    else:
-                        st.error("Failed to generate plan. Please try again.")
+                        if plan:
+                            st.session_state.current_plan = plan
+                            st.session_state.plan_saved = False
+                            st.rerun()
+                        else:
+                            st.session_state.plan_error = "Failed to generate plan. Please try again."
             st.markdown("</div>", unsafe_allow_html=True)
+        
+        if st.session_state.plan_job_id:
+            plan_job_status()
+        elif st.session_state.plan_error:
+            st.error(st.session_state.plan_error)
+            if DEFERRED_QUEUE_ENABLED:
+                show_deferred_form(
+                    st.session_state.refined_goal,
+                    st.session_state.questions,
+                    [st.session_state.get(f"answer_{i}", "") for i in range(len(st.session_state.questions))],
+                    time_commitment
+                )
 
 # Display plan and reminder option
-if st.session_state.current_plan and not st.session_state.plan_saved:
+if st.session_state.current_plan:
     st.session_state.current_step = 3
     
     # Add custom CSS for responsiveness
@@ -422,6 +755,47 @@ if st.session_state.current_plan and not st.session_state.plan_saved:
     
     st.markdown("</div>", unsafe_allow_html=True)
     
+    # Regenerate one section or item without rebuilding the whole plan
+    with st.expander("✏️ Adjust your plan"):
+        with st.form("regenerate_form"):
+            section = st.radio(
+                "What would you like to change?",
+                list(PLAN_STREAM_SECTIONS),
+                format_func=PLAN_STREAM_SECTIONS.get,
+                horizontal=True
+            )
+            section_items = {'strategic_initiatives': initiatives, 'one_time_actions': one_time_actions, 'habits': habits}
+            item_number = st.selectbox(
+                "Regenerate",
+                [0] + list(range(1, max(len(items) for items in section_items.values()) + 1)),
+                format_func=lambda number: f"Item {number} only" if number else "The whole section"
+            )
+            feedback = st.text_input("What should be different? (optional)")
+            edited_answers = [
+                st.text_input(question, value=answer, key=f"edit_answer_{i}")
+                for i, (question, answer) in enumerate(zip(st.session_state.current_plan['questions'],
+                                                          st.session_state.current_plan['answers']))
+            ]
+            submit_regeneration = st.form_submit_button("Regenerate")
+
+        if submit_regeneration:
+            if item_number > len(section_items[section]):
+                st.error(f"That section only has {len(section_items[section])} items.")
+            else:
+                with queued_status():
+                    updated_plan = openai_service.regenerate_section(
+                        st.session_state.current_plan,
+                        section,
+                        answers=edited_answers,
+                        feedback=feedback,
+                        item_index=item_number - 1 if item_number else None,
+                        on_item=streaming_section() if not item_number else None
+                    )
+                if updated_plan:
+                    st.session_state.current_plan = updated_plan
+                    st.session_state.plan_saved = False
+                    st.rerun()
+    
     # Time commitment input section
     time_commitment = st.text_input("Enter time commitment for your goal (e.g., 30 minutes/day):")
     if time_commitment:
@@ -502,8 +876,8 @@ if st.session_state.current_plan and not st.session_state.plan_saved:
             else:
                 st.error("Please enter a valid email address.")
     
-    # Save all entries regardless of button click
-    save_entries()  # Call the function to save all entries
+    # Keep the stored plan in sync; the plan store skips unchanged plans and batches rapid edits
+    save_entries()
 
 if st.session_state.plan_saved:
     col1, col2, col3 = st.columns([1,2,1])
@@ -511,6 +885,7 @@ if st.session_state.plan_saved:
         st.markdown("<div class='big-button'>", unsafe_allow_html=True)
         if st.button("Create Another Goal"):
             reset_form()
+            st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
 
 # Add a note about the admin dashboard
@@ -0,0 +1,95 @@
+"""Wall-clock latency benchmarks for LLM generation modes.
+
+Runs against the goals in test_data.py using the API key in .streamlit/secrets.toml.
+The response cache is disabled so every run hits the model.
+Set LLM_PROVIDER=replay to run offline and repeatably against a recorded cassette.
+
+Usage:
+    python src/benchmark.py plan-modes [--runs 3]
+    python src/benchmark.py refinement-pipelines [--runs 3]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+from services.openai_service import OpenAIService
+from services.goal_refinement_service import GoalRefinementService
+from test_data import get_all_test_goals
+
+
+def time_call(fn, *args, **kwargs) -> float:
+    """Return the wall-clock seconds taken by a single call."""
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def print_summary(name: str, timings: list):
+    """Print median, mean and worst latency for a list of timings."""
+    print(f"{name:<12} median {statistics.median(timings):6.2f}s  "
+          f"mean {statistics.mean(timings):6.2f}s  max {max(timings):6.2f}s  (n={len(timings)})")
+
+
+def benchmark_plan_modes(runs: int):
+    """Compare single-call and sectioned plan generation."""
+    service = OpenAIService()
+    timings = {"single": [], "sectioned": []}
+    for _ in range(runs):
+        for goal_type, data in get_all_test_goals().items():
+            questions = [key.replace('_', ' ').title() for key in data['answers']]
+            answers = list(data['answers'].values())
+            for mode in timings:
+                elapsed = time_call(service.fetch_plan, data['refined_goal'], questions, answers, mode=mode)
+                timings[mode].append(elapsed)
+                print(f"{goal_type:<8} {mode:<10} {elapsed:6.2f}s")
+
+    print()
+    for mode, values in timings.items():
+        print_summary(mode, values)
+
+
+def run_sequential_refinement(refinement: GoalRefinementService, service: OpenAIService, data: dict):
+    """The three requests made by the sequential pipeline before the plan."""
+    refinement.fetch_refinement_questions(data['initial_goal'])
+    refined_goal = refinement.fetch_refined_goal(data['initial_goal'], data['refinement_response'])
+    service.fetch_questions(refined_goal)
+
+
+def run_oneshot_refinement(refinement: GoalRefinementService, service: OpenAIService, data: dict):
+    """The single request made by the oneshot pipeline before the plan."""
+    service.fetch_refined_goal_and_questions(data['initial_goal'], data['refinement_response'])
+
+
+def benchmark_refinement_pipelines(runs: int):
+    """Compare the sequential and oneshot refinement pipelines, up to the plan questions."""
+    refinement = GoalRefinementService()
+    service = OpenAIService()
+    pipelines = {"sequential": run_sequential_refinement, "oneshot": run_oneshot_refinement}
+    timings = {name: [] for name in pipelines}
+    for _ in range(runs):
+        for goal_type, data in get_all_test_goals().items():
+            for name, pipeline in pipelines.items():
+                elapsed = time_call(pipeline, refinement, service, data)
+                timings[name].append(elapsed)
+                print(f"{goal_type:<8} {name:<10} {elapsed:6.2f}s")
+
+    print()
+    for name, values in timings.items():
+        print_summary(name, values)
+
+
+BENCHMARKS = {
+    "plan-modes": benchmark_plan_modes,
+    "refinement-pipelines": benchmark_refinement_pipelines,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions per goal and mode or pipeline")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args.runs)
@@ -2,8 +2,8 @@
 Configuration file for AI model settings and prompts.
 """
 
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from enum import Enum
 
 @dataclass
@@ -11,6 +11,8 @@ class PromptConfig:
     model: str
     system_prompt: str
     user_prompt_template: str
+    fallback_models: List[str] = field(default_factory=list)  # Tried in order when the model errors
+    hedge_model: Optional[str] = None  # Model (a faster one, or the same) raced against slow requests when hedging is enabled
 
 # Available Models
 class Models(Enum):
@@ -39,7 +41,9 @@ Return EXACTLY 4 questions in this JSON format:
         "Question 4"
     ]
 }""",
-    user_prompt_template="Generate 4 relevant questions to help create an action plan for this goal: {goal}"
+    user_prompt_template="Generate 4 relevant questions to help create an action plan for this goal: {goal}",
+    fallback_models=[Models.GPT_4o.value],
+    hedge_model=Models.GPT_4o_MINI.value  # A duplicate request cuts the tail on a slow replica
 )
 
 PLAN_CONFIG = PromptConfig(
@@ -91,13 +95,17 @@ Return the response in this JSON format:
 Questions and Answers:
 {answers}
 
-Create a comprehensive plan with strategic initiatives, one-time setup actions, and daily micro-habits to achieve this goal."""
+Create a comprehensive plan with strategic initiatives, one-time setup actions, and daily micro-habits to achieve this goal.""",
+    fallback_models=[Models.GPT_4o.value],
+    hedge_model=Models.GPT_4o_MINI.value
 )
 
 # Goal Refinement Prompts
 GOAL_REFINEMENT_CONFIG = dict(
     system_role="You are a goal refinement expert helping users create more specific, measurable, and meaningful goals.",
     model=Models.GPT_4.value,
+    fallback_models=[Models.GPT_4o.value, Models.GPT_4o_MINI.value],
+    hedge_model=Models.GPT_4o.value,
     prompt="""Help refine the user's initial goal by asking for critical missing information.
 Focus on three key aspects:
 1. Specificity - What exactly they want to achieve
@@ -115,6 +123,8 @@ To phrase the goal in more tangible terms, give me a bit more information about
 GOAL_FINAL_REFINEMENT_CONFIG = dict(
     system_role="You are a goal refinement expert helping users create inspiring yet practical goal statements.",
     model=Models.GPT_4.value,
+    fallback_models=[Models.GPT_4o.value, Models.GPT_4o_MINI.value],
+    hedge_model=Models.GPT_4o.value,
     prompt="""Based on the initial goal and the user's responses, create a refined, actionable goal statement.
 The statement should be concise (1-2 sentences) and include:
 - The specific outcome
@@ -124,3 +134,207 @@ The statement should be concise (1-2 sentences) and include:
 Format it as a first-person statement starting with "I will..."
 Make it inspiring yet practical."""
 )
+
+# Multi-turn refinement chat
+REFINEMENT_CHAT_CONFIG = dict(
+    system_role="""You are a goal refinement expert having a short conversation to help the user turn a vague
+goal into a specific, measurable and meaningful one. Ask ONE short clarifying question at a time about
+whatever is still missing: the exact outcome and deadline, how progress will be measured, or why it matters.
+Once you know enough, or whenever the user asks, propose a refined goal on its own line, formatted exactly as:
+Refined goal: I will ...
+Keep it to 1-2 sentences, inspiring yet practical. Keep refining if the user asks for changes.""",
+    model=Models.GPT_4o.value,
+    fallback_models=[Models.GPT_4o_MINI.value]
+)
+
+REFINEMENT_SUMMARY_CONFIG = dict(
+    system_role="You summarize goal refinement conversations for the coach who continues them.",
+    model=Models.GPT_4o_MINI.value,
+    fallback_models=[Models.GPT_4o.value],
+    prompt="""Update the summary of this goal refinement conversation with the new turns below.
+Keep every fact the user gave about their goal, deadline, measures, motivation and constraints, and any
+goal statements proposed so far. Drop small talk. Reply with the summary only, in at most 150 words."""
+)
+
+# One-shot refinement: fixed refinement questions asked alongside the goal, then one
+# request returns the refined goal together with the plan questions
+REFINEMENT_INTAKE_QUESTIONS = """To phrase the goal in more tangible terms, give me a bit more information about what you want to achieve:
+
+1. What exactly do you want to achieve, and by when?
+2. How will you measure your progress?
+3. Why does this goal matter to you?"""
+
+ONESHOT_REFINEMENT_CONFIG = PromptConfig(
+    model=Models.GPT_4o.value,
+    system_prompt="""You are a goal refinement expert helping users create inspiring yet practical goal statements.
+Based on the initial goal and the user's responses, do two things:
+
+1. Create a refined, actionable goal statement. It should be concise (1-2 sentences), include the
+specific outcome, how it will be measured and the personal motivation, and be a first-person
+statement starting with "I will..." that is inspiring yet practical.
+
+2. Ask exactly 4 questions about the refined goal that will help create a personalized action plan,
+covering their current situation and starting point, specific challenges or obstacles, previous
+attempts or experience, and available resources and support. Do not ask for information the user
+has already given.
+
+Return ONLY this JSON:
+{
+    "refined_goal": "I will ...",
+    "questions": ["Question 1", "Question 2", "Question 3", "Question 4"]
+}""",
+    user_prompt_template="""Initial Goal: {goal}
+User's Additional Information: {responses}""",
+    fallback_models=[Models.GPT_4o_MINI.value]
+)
+
+# Category-specific prompts for goals the local classifier recognizes. Plan questions come
+# from a fixed bank (no request), and refinement uses shorter prompts on a faster model.
+CATEGORY_QUESTION_BANKS = {
+    "fitness": [
+        "What is your current fitness level and activity routine?",
+        "What has stopped you from exercising consistently in the past?",
+        "Which kinds of exercise have you tried before, and what did you enjoy or dislike?",
+        "What equipment, facilities or training partners do you have access to?",
+    ],
+    "career": [
+        "What is your current role and how long have you been in it?",
+        "What is the biggest obstacle between you and the next step in your career?",
+        "What have you already tried to advance, and how did it go?",
+        "Who at work or in your network could support or sponsor you?",
+    ],
+    "finance": [
+        "What are your current income, monthly expenses and savings?",
+        "Which expenses or debts make it hardest to make progress?",
+        "Have you tried budgeting or saving plans before, and what happened?",
+        "What financial tools, accounts or advice do you have access to?",
+    ],
+}
+
+# Asked when no model is available to generate questions, e.g. for deferred plan requests
+DEFAULT_QUESTION_BANK = [
+    "Where are you starting from today?",
+    "What challenges or obstacles do you expect?",
+    "What have you tried before, and how did it go?",
+    "What resources or support do you have available?",
+]
+
+CATEGORY_REFINEMENT_CONFIGS = {
+    category: dict(
+        system_role=f"You are a {category} coach helping users make their goals specific and measurable.",
+        model=Models.GPT_4o_MINI.value,
+        fallback_models=[Models.GPT_4o.value],
+        prompt=f"""Ask three short questions to refine this {category} goal: the exact outcome and deadline,
+how progress will be measured{measure}, and why it matters to them.
+
+Respond with ONLY:
+To phrase the goal in more tangible terms, give me a bit more information about what you want to achieve:
+
+1. [Outcome question]
+2. [Measurement question]
+3. [Motivation question]"""
+    )
+    for category, measure in [
+        ("fitness", " (times, distances, weights or body measurements)"),
+        ("career", " (roles, projects, skills or feedback)"),
+        ("finance", " (amounts saved, paid off or invested)"),
+    ]
+}
+
+CATEGORY_FINAL_REFINEMENT_CONFIGS = {
+    category: dict(
+        system_role=f"You are a {category} coach writing inspiring yet practical goal statements.",
+        model=Models.GPT_4o_MINI.value,
+        fallback_models=[Models.GPT_4o.value],
+        prompt=f"""From the initial {category} goal and the user's responses, write a 1-2 sentence first-person
+goal starting with "I will..." that states the outcome, how it will be measured and why it matters."""
+    )
+    for category in CATEGORY_QUESTION_BANKS
+}
+
+# Sectioned plan generation: one smaller request per plan section, run concurrently
+PLAN_SECTION_USER_PROMPT = """Goal: {goal}
+
+Questions and Answers:
+{answers}"""
+
+PLAN_SECTION_CONFIGS = {
+    "strategic_initiatives": PromptConfig(
+        model=Models.GPT_4o_MINI.value,
+        system_prompt="""You are an AI goal achievement expert. Based on the user's goal and their answers to questions,
+create 3-5 strategic initiatives that form a comprehensive plan. Each initiative should be formatted as:
+"Action-Oriented Title: Detailed description including timeframe, specific steps, and expected outcomes."
+
+Return ONLY this JSON:
+{
+    "strategic_initiatives": ["Initiative 1: Description", ...]
+}""",
+        user_prompt_template=PLAN_SECTION_USER_PROMPT,
+        fallback_models=[Models.GPT_4o.value]
+    ),
+    "one_time_actions": PromptConfig(
+        model=Models.GPT_4o_MINI.value,
+        system_prompt="""You are an AI goal achievement expert. Based on the user's goal and their answers to questions,
+list 2-5 one-time setup actions needed to get started. Each action must be a specific task that only
+needs to be done once, can be completed within a week, and lays the foundation for the goal.
+
+Return ONLY this JSON:
+{
+    "one_time_actions": ["Setup Action 1", ...]
+}""",
+        user_prompt_template=PLAN_SECTION_USER_PROMPT,
+        fallback_models=[Models.GPT_4o.value]
+    ),
+    "habits": PromptConfig(
+        model=Models.GPT_4o_MINI.value,
+        system_prompt="""You are an AI goal achievement expert. Based on the user's goal and their answers to questions,
+list 3-7 daily micro-habits that support the goal. Each habit must be specific and actionable,
+take 5-15 minutes, be easy to start, and be done DAILY.
+
+Return ONLY this JSON:
+{
+    "habits": ["Daily Habit 1", ...]
+}""",
+        user_prompt_template=PLAN_SECTION_USER_PROMPT,
+        fallback_models=[Models.GPT_4o.value]
+    ),
+}
+
+# Regenerating one section or item of an existing plan; the rest of the plan is context only
+PLAN_SECTION_REGENERATION_USER_PROMPT = """Goal: {goal}
+
+Questions and Answers:
+{answers}
+
+The rest of the current plan, which stays unchanged:
+{plan}
+
+Current items in this section, to be replaced:
+{current_items}
+
+User feedback: {feedback}"""
+
+PLAN_ITEM_REGENERATION_CONFIG = PromptConfig(
+    model=Models.GPT_4o_MINI.value,
+    system_prompt="""You are an AI goal achievement expert. The user wants to replace ONE item of their
+action plan. Write a single new item for the given section that fits the rest of the plan, does not
+repeat any existing item, follows the user's feedback and uses the same format as the other items
+in the section.
+
+Return ONLY this JSON:
+{
+    "item": "New item"
+}""",
+    user_prompt_template="""Goal: {goal}
+
+Questions and Answers:
+{answers}
+
+Current plan:
+{plan}
+
+Replace this {section} item: {item}
+
+User feedback: {feedback}""",
+    fallback_models=[Models.GPT_4o.value]
+)
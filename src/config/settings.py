@@ -0,0 +1,136 @@
+"""
+Deployment settings for the LLM and persistence layers.
+
+Each setting can be overridden per deployment with an environment variable of
+the same name or a top-level key in `.streamlit/secrets.toml`.
+"""
+
+import os
+import streamlit as st
+
+# Repository root; default paths for local state files are resolved against it, not the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_setting(name: str, default, cast=None):
+    """Read a setting from the environment, then Streamlit secrets, then the default."""
+    value = os.environ.get(name)
+    if value is None:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            value = None
+    if value is None:
+        return default
+    cast = cast or type(default)
+    if cast is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return cast(value)
+
+
+# LLM response cache
+LLM_CACHE_ENABLED = get_setting("LLM_CACHE_ENABLED", True)
+LLM_CACHE_MAX_ENTRIES = get_setting("LLM_CACHE_MAX_ENTRIES", 1024)
+LLM_CACHE_TTL_SECONDS = get_setting("LLM_CACHE_TTL_SECONDS", 24 * 3600)
+LLM_CACHE_DISK_PATH = get_setting("LLM_CACHE_DISK_PATH", "")  # Empty disables the on-disk tier
+
+# Streaming
+LLM_STREAMING_ENABLED = get_setting("LLM_STREAMING_ENABLED", True)
+
+# Shared LLM client connection pool
+LLM_POOL_SIZE = get_setting("LLM_POOL_SIZE", 20)
+LLM_KEEPALIVE_SECONDS = get_setting("LLM_KEEPALIVE_SECONDS", 60.0)
+
+# Speculative prefetch of clarifying questions
+SPECULATIVE_PREFETCH_ENABLED = get_setting("SPECULATIVE_PREFETCH_ENABLED", False)
+PREFETCH_MAX_WORKERS = get_setting("PREFETCH_MAX_WORKERS", 8)
+PREFETCH_TTL_SECONDS = get_setting("PREFETCH_TTL_SECONDS", 600)
+
+# Plan generation: "single" (one request) or "sectioned" (concurrent per-section requests)
+PLAN_GENERATION_MODE = get_setting("PLAN_GENERATION_MODE", "single")
+
+# Goal refinement: "sequential" (three requests), "oneshot" (one request for the refined goal and
+# questions) or "chat" (a multi-turn conversation)
+REFINEMENT_PIPELINE_MODE = get_setting("REFINEMENT_PIPELINE_MODE", "sequential")
+REFINEMENT_CHAT_TOKEN_BUDGET = get_setting("REFINEMENT_CHAT_TOKEN_BUDGET", 1200)  # Prompt tokens per chat turn
+REFINEMENT_CHAT_KEEP_TURNS = get_setting("REFINEMENT_CHAT_KEEP_TURNS", 4)  # Recent messages never summarized
+
+# Local goal classifier: category question banks and prompts instead of generic LLM prompts
+GOAL_CLASSIFIER_ENABLED = get_setting("GOAL_CLASSIFIER_ENABLED", False)
+GOAL_CLASSIFIER_MIN_CONFIDENCE = get_setting("GOAL_CLASSIFIER_MIN_CONFIDENCE", 0.6)
+GOAL_CLASSIFIER_MIN_TERMS = get_setting("GOAL_CLASSIFIER_MIN_TERMS", 2)
+
+# Similar-plan index: show a stored plan for a similar goal while the new one is generated
+PLAN_INDEX_ENABLED = get_setting("PLAN_INDEX_ENABLED", False)
+PLAN_INDEX_DIMENSIONS = get_setting("PLAN_INDEX_DIMENSIONS", 128)  # float16, so 256 bytes per goal
+PLAN_INDEX_MIN_SIMILARITY = get_setting("PLAN_INDEX_MIN_SIMILARITY", 0.5)
+PLAN_INDEX_SYNC_SECONDS = get_setting("PLAN_INDEX_SYNC_SECONDS", 300)
+PLAN_INDEX_PATH = get_setting("PLAN_INDEX_PATH", os.path.join(PROJECT_ROOT, "plan_index.npz"))
+
+# Background jobs: plan generation runs off the script thread and the UI polls for it
+BACKGROUND_JOBS_ENABLED = get_setting("BACKGROUND_JOBS_ENABLED", True)
+JOB_MAX_WORKERS = get_setting("JOB_MAX_WORKERS", 16)
+JOB_RESULT_TTL_SECONDS = get_setting("JOB_RESULT_TTL_SECONDS", 900)
+JOB_POLL_SECONDS = get_setting("JOB_POLL_SECONDS", 1.0)
+
+# Deferred generation: plan requests made during an outage are queued and generated later
+DEFERRED_QUEUE_ENABLED = get_setting("DEFERRED_QUEUE_ENABLED", True)
+DEFERRED_QUEUE_PATH = get_setting("DEFERRED_QUEUE_PATH", os.path.join(PROJECT_ROOT, "deferred_queue.db"))
+DEFERRED_MAX_CONCURRENCY = get_setting("DEFERRED_MAX_CONCURRENCY", 2)
+DEFERRED_POLL_SECONDS = get_setting("DEFERRED_POLL_SECONDS", 30)
+DEFERRED_MAX_ATTEMPTS = get_setting("DEFERRED_MAX_ATTEMPTS", 5)
+
+# Plan persistence: idempotent upserts, debounced and written behind the UI on a background thread
+PLAN_WRITE_BEHIND_ENABLED = get_setting("PLAN_WRITE_BEHIND_ENABLED", True)
+PLAN_WRITE_DEBOUNCE_SECONDS = get_setting("PLAN_WRITE_DEBOUNCE_SECONDS", 2.0)
+
+# Bulk Firestore imports: goals per batch commit (at most 250) and batches committed in parallel
+FIREBASE_BULK_CHUNK_SIZE = get_setting("FIREBASE_BULK_CHUNK_SIZE", 200)
+FIREBASE_BULK_MAX_WORKERS = get_setting("FIREBASE_BULK_MAX_WORKERS", 8)
+
+# Admin Dashboard goal list
+ADMIN_PAGE_SIZE = get_setting("ADMIN_PAGE_SIZE", 25)
+GOAL_ROLLUP_SHARDS = get_setting("GOAL_ROLLUP_SHARDS", 10)  # Counter shards behind the dashboard metrics
+GOAL_DETAIL_CACHE_SIZE = get_setting("GOAL_DETAIL_CACHE_SIZE", 128)  # Goals kept in memory by get_goal; 0 disables
+
+# LLM provider layer: "openai", "stub" for offline testing, or "record"/"replay" for cassettes
+LLM_PROVIDER = get_setting("LLM_PROVIDER", "openai")
+LLM_HEDGING_ENABLED = get_setting("LLM_HEDGING_ENABLED", False)
+LLM_HEDGE_DELAY_SECONDS = get_setting("LLM_HEDGE_DELAY_SECONDS", 8.0)  # Until the model's p95 latency is known
+LLM_HEDGE_MAX_WORKERS = get_setting("LLM_HEDGE_MAX_WORKERS", 16)
+
+# Record/replay of LLM traffic: "record" saves live responses to the cassette, "replay" serves them offline
+LLM_CASSETTE_PATH = get_setting("LLM_CASSETTE_PATH", "cassettes/llm.jsonl")
+LLM_REPLAY_LATENCY = get_setting("LLM_REPLAY_LATENCY", "recorded")  # recorded, none, constant:S, uniform:A,B, lognormal:M,S
+LLM_REPLAY_ERROR_RATE = get_setting("LLM_REPLAY_ERROR_RATE", 0.0)
+LLM_REPLAY_ERRORS = get_setting("LLM_REPLAY_ERRORS", "timeout,rate_limit,server")
+LLM_REPLAY_SEED = get_setting("LLM_REPLAY_SEED", 0)
+LLM_REPLAY_ON_MISS = get_setting("LLM_REPLAY_ON_MISS", "error")  # "error" or "stub"
+
+# LLM telemetry: latency histograms, tokens, retries and errors per prompt config and model
+LLM_TELEMETRY_ENABLED = get_setting("LLM_TELEMETRY_ENABLED", True)
+LLM_METRICS_PATH = get_setting("LLM_METRICS_PATH", "")  # Prometheus text file; empty disables the export
+LLM_METRICS_EXPORT_SECONDS = get_setting("LLM_METRICS_EXPORT_SECONDS", 15)
+
+# Prompt experiments: variants of prompt configs bucketed per session, read from a JSON file
+PROMPT_EXPERIMENTS_PATH = get_setting("PROMPT_EXPERIMENTS_PATH", "prompt_experiments.json")
+PROMPT_EXPERIMENTS_RELOAD_SECONDS = get_setting("PROMPT_EXPERIMENTS_RELOAD_SECONDS", 10)
+PROMPT_EXPERIMENT_MIN_SESSIONS = get_setting("PROMPT_EXPERIMENT_MIN_SESSIONS", 50)  # Before a variant is recommended
+
+# Resilience: adaptive timeouts, jittered retries and circuit breakers per model
+LLM_TIMEOUT_DEFAULT_SECONDS = get_setting("LLM_TIMEOUT_DEFAULT_SECONDS", 30.0)  # Until enough latency samples exist
+LLM_TIMEOUT_MIN_SECONDS = get_setting("LLM_TIMEOUT_MIN_SECONDS", 5.0)
+LLM_TIMEOUT_MAX_SECONDS = get_setting("LLM_TIMEOUT_MAX_SECONDS", 60.0)
+LLM_TIMEOUT_MULTIPLIER = get_setting("LLM_TIMEOUT_MULTIPLIER", 1.5)  # Applied to the observed p99
+LLM_RETRY_MAX_ATTEMPTS = get_setting("LLM_RETRY_MAX_ATTEMPTS", 3)
+LLM_RETRY_BASE_DELAY_SECONDS = get_setting("LLM_RETRY_BASE_DELAY_SECONDS", 0.5)
+LLM_RETRY_MAX_DELAY_SECONDS = get_setting("LLM_RETRY_MAX_DELAY_SECONDS", 8.0)
+LLM_BREAKER_FAILURE_THRESHOLD = get_setting("LLM_BREAKER_FAILURE_THRESHOLD", 5)
+LLM_BREAKER_RESET_SECONDS = get_setting("LLM_BREAKER_RESET_SECONDS", 30.0)
+
+# Fair-share scheduling of upstream LLM concurrency
+LLM_DEFAULT_MODEL_CONCURRENCY = get_setting("LLM_DEFAULT_MODEL_CONCURRENCY", 8)
+LLM_MODEL_CONCURRENCY = get_setting("LLM_MODEL_CONCURRENCY", "gpt-4:4,gpt-4o:8,gpt-4o-mini:16")
+LLM_QUEUE_DOWNGRADE_THRESHOLD = get_setting("LLM_QUEUE_DOWNGRADE_THRESHOLD", 0)  # 0 disables downgrading
+LLM_DOWNGRADE_MODELS = get_setting("LLM_DOWNGRADE_MODELS", "gpt-4:gpt-4o-mini,gpt-4o:gpt-4o-mini")
+LLM_SCHEDULER_TIER_WEIGHTS = get_setting("LLM_SCHEDULER_TIER_WEIGHTS", "interactive:1,prefetch:0.5,deferred:0.25")
@@ -0,0 +1,161 @@
+"""One-off maintenance jobs for the Firestore collections.
+
+Uses the Firebase credentials in .streamlit/secrets.toml.
+
+Usage:
+    python src/maintenance.py dedupe-goals [--dry-run]
+    python src/maintenance.py backfill-goals [--dry-run]
+"""
+
+import argparse
+from collections import defaultdict
+
+from services.firebase_service import ROLLUP_FIELDS, FirebaseService, rollup_values
+from services.plan_store import content_hash
+from utils.time_commitment import parse_minutes
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+
+def commit_in_batches(db, operations: list, dry_run: bool):
+    """Apply (kind, doc_ref, data) operations, where kind is "delete" or "update"."""
+    if dry_run:
+        return
+    for start in range(0, len(operations), BATCH_SIZE):
+        batch = db.batch()
+        for kind, doc_ref, data in operations[start:start + BATCH_SIZE]:
+            if kind == "delete":
+                batch.delete(doc_ref)
+            else:
+                batch.update(doc_ref, data)
+        batch.commit()
+
+
+def merged_fields(kept: dict, duplicates: list) -> dict:
+    """Return the fields the kept goal should take from its duplicates, newest first in `duplicates`."""
+    update = {}
+    time_commitment = next((data['time_commitment'] for data in duplicates
+                            if data.get('time_commitment') not in (None, '')), None)
+    if time_commitment is not None and time_commitment != kept.get('time_commitment'):
+        update['time_commitment'] = time_commitment
+        update['time_commitment_minutes'] = parse_minutes(time_commitment)
+    reminder_settings = next((data['reminder_settings'] for data in duplicates
+                              if (data.get('reminder_settings') or {}).get('email')), None)
+    if reminder_settings is not None and reminder_settings != kept.get('reminder_settings'):
+        update['reminder_settings'] = reminder_settings
+    return update
+
+
+def dedupe_goals(dry_run: bool):
+    """Remove goals saved more than once with the same plan, and their extra reminders.
+
+    Goals of the same session with the same content hash (goal, questions,
+    answers, initiatives and habits) are duplicates; the oldest document is
+    kept. Identical plans of different sessions are never merged, since the
+    response cache gives users with the same answers the same plan. Goals
+    stored without a session are only merged with ones sent to the same email. The first save of a
+    plan has no time commitment or email yet, so the kept goal takes the
+    newest non-empty time commitment and reminder settings with an email from
+    its duplicates. Reminders of removed goals that have an email are moved to
+    the kept goal, the rest are deleted, and a kept goal ends up with at most
+    one reminder per email and no reminder without one if it has any with one.
+    """
+    db = FirebaseService().db
+
+    groups = defaultdict(list)
+    for doc in db.collection('goals').stream():
+        data = doc.to_dict()
+        session = data.get('session_id') or ('email', (data.get('reminder_settings') or {}).get('email'))
+        key = (session, content_hash(data.get('goal'), data.get('questions'), data.get('answers'),
+                                     data.get('tasks'), data.get('habits')))
+        groups[key].append((data.get('timestamp'), doc.id, data))
+
+    kept_for = {}  # removed goal id -> kept goal id
+    operations = []
+    merged_goals = 0
+    for docs in groups.values():
+        if len(docs) == 1:
+            continue
+        # Oldest first; documents without a timestamp sort last
+        docs.sort(key=lambda item: (item[0] is None, item[0] or 0))
+        kept, kept_data = docs[0][1], docs[0][2]
+        for _, goal_id, _ in docs[1:]:
+            kept_for[goal_id] = kept
+            operations.append(("delete", db.collection('goals').document(goal_id), None))
+        update = merged_fields(kept_data, [data for _, _, data in reversed(docs)])
+        if update:
+            merged_goals += 1
+            operations.append(("update", db.collection('goals').document(kept), update))
+
+    reminders = [(doc, doc.to_dict()) for doc in db.collection('reminders').stream()]
+    goals_with_email = {kept_for.get(data.get('goal_id'), data.get('goal_id'))
+                        for _, data in reminders if data.get('email')}
+    reminders_by_goal = defaultdict(dict)  # kept goal id -> email -> reminder id
+    for doc, data in reminders:
+        goal_id = kept_for.get(data.get('goal_id'), data.get('goal_id'))
+        email = data.get('email')
+        # Reminders without an email are only worth keeping on a goal that stays and has no other
+        if (not email and (data.get('goal_id') in kept_for or goal_id in goals_with_email)) \
+                or email in reminders_by_goal[goal_id]:
+            operations.append(("delete", doc.reference, None))
+            continue
+        reminders_by_goal[goal_id][email] = doc.id
+        if goal_id != data.get('goal_id'):
+            operations.append(("update", doc.reference, {'goal_id': goal_id}))
+
+    deleted_goals = len(kept_for)
+    deleted_reminders = sum(kind == "delete" for kind, _, _ in operations) - deleted_goals
+    moved_reminders = sum(kind == "update" for kind, _, _ in operations) - merged_goals
+    commit_in_batches(db, operations, dry_run)
+    prefix = "Would remove" if dry_run else "Removed"
+    print(f"{prefix} {deleted_goals} duplicate goals and {deleted_reminders} reminders; "
+          f"{moved_reminders} reminders {'would move' if dry_run else 'moved'} to the kept goal; "
+          f"{merged_goals} kept goals {'would take' if dry_run else 'took'} a time commitment or email "
+          f"from a duplicate.")
+    if not dry_run and operations:
+        # The rollup counters still include the removed goals
+        backfill_goals(dry_run)
+
+
+def backfill_goals(dry_run: bool):
+    """Normalize `time_commitment_minutes` on every goal and rebuild the rollup counters.
+
+    Needed once for goals stored before the counters existed, and after
+    anything that writes goals outside `store_user_goal` (deletes, re-imports,
+    a GOAL_ROLLUP_SHARDS change).
+    """
+    service = FirebaseService()
+    db = service.db
+
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    operations = []
+    for doc in db.collection('goals').stream():
+        data = doc.to_dict()
+        minutes = parse_minutes(data.get('time_commitment'))
+        if 'time_commitment_minutes' not in data or data['time_commitment_minutes'] != minutes:
+            operations.append(("update", doc.reference, {'time_commitment_minutes': minutes}))
+            data['time_commitment_minutes'] = minutes
+        for field, value in rollup_values(data).items():
+            totals[field] += value
+
+    commit_in_batches(db, operations, dry_run)
+    if not dry_run:
+        service.reset_goal_rollups(totals)
+    prefix = "Would normalize" if dry_run else "Normalized"
+    print(f"{prefix} the time commitment of {len(operations)} goals; "
+          f"{totals['goals']} goals, {totals['goals_with_reminders']} with reminders.")
+
+
+JOBS = {
+    "dedupe-goals": dedupe_goals,
+    "backfill-goals": backfill_goals,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+    JOBS[args.job](args.dry_run)
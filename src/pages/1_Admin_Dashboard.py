@@ -1,5 +1,8 @@
 import streamlit as st
 from services.firebase_service import FirebaseService
+from services.telemetry import LLMTelemetry, collect_stats
+from services.prompt_registry import PromptRegistry
+from config.settings import ADMIN_PAGE_SIZE
 from datetime import datetime
 
 # Initialize Firebase service
@@ -40,28 +43,165 @@ def check_password():
         # Password correct
         return True
 
+def format_stat(field: str, value) -> str:
+    """Format one counter for display, using its name's unit suffix."""
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        if field.endswith("_rate"):
+            return f"{value:.0%}"
+        if field.endswith("_seconds"):
+            return f"{value:.1f}s"
+        if field.endswith("_mb"):
+            return f"{value:.1f} MB"
+        return f"{value:.2f}"
+    return str(value)
+
+def render_metrics_panel(stats: dict):
+    """Render each component's counters as metrics, and its per-key breakdowns as tables."""
+    if not stats:
+        st.info("No service has recorded metrics in this process yet.")
+        return
+    for name, component in stats.items():
+        st.markdown(f"**{name.replace('_', ' ').title().replace('Llm', 'LLM')}**")
+        scalars = [(field, value) for field, value in component.items() if not isinstance(value, dict)]
+        for start in range(0, len(scalars), 4):
+            for column, (field, value) in zip(st.columns(4), scalars[start:start + 4]):
+                column.metric(field.replace('_', ' ').capitalize(), format_stat(field, value))
+        for field, table in component.items():
+            if not isinstance(table, dict) or not table:
+                continue
+            st.caption(field.replace('_', ' ').capitalize())
+            if all(isinstance(row, dict) for row in table.values()):
+                st.table([
+                    {'Key': key, **{column: format_stat(column, cell) for column, cell in row.items()}}
+                    for key, row in table.items()
+                ])
+            else:
+                st.table([{key: format_stat(key, value) for key, value in table.items()}])
+
 if check_password():
     st.title("🔒 Admin Dashboard")
     
-    # Get all goals
-    goals = firebase_service.get_user_goals(limit=100)  # Increased limit for admin view
+    # Get the current page of goals; pages already visited come from the session cache
+    if 'goal_pages' not in st.session_state:
+        st.session_state.goal_pages = []  # (goals, next cursor) per visited page
+        st.session_state.goal_page_index = 0
+    if not st.session_state.goal_pages:
+        st.session_state.goal_pages.append(firebase_service.get_goals_page(ADMIN_PAGE_SIZE))
+        st.session_state.goal_page_index = 0
+    goals, next_cursor = st.session_state.goal_pages[st.session_state.goal_page_index]
     
-    # Calculate metrics
-    total_goals = len(goals)
-    goals_with_reminders = sum(1 for goal in goals if 'reminder_settings' in goal and goal['reminder_settings'])
-    avg_time = sum(int(goal['time_commitment']) if isinstance(goal['time_commitment'], int) else int(goal['time_commitment']) for goal in goals if isinstance(goal['time_commitment'], (int, str)) and (isinstance(goal['time_commitment'], str) and goal['time_commitment'].isdigit() or isinstance(goal['time_commitment'], int))) / total_goals if total_goals > 0 else 0
+    # Metrics over all goals, from the rollup counters (a fixed number of reads)
+    goal_metrics = firebase_service.get_goal_metrics()
     
     # Display metrics
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Goals", total_goals)
+        st.metric("Total Goals", goal_metrics['total_goals'])
     with col2:
-        st.metric("Goals with Reminders", goals_with_reminders)
+        st.metric("Goals with Reminders", goal_metrics['goals_with_reminders'])
     with col3:
-        st.metric("Avg. Time Commitment", f"{avg_time:.0f} min")
+        st.metric("Avg. Time Commitment", f"{goal_metrics['avg_time_commitment']:.0f} min")
     
-    # Display all goals in a table
+    # Counters every service registered with telemetry (process-wide)
+    st.subheader("Service Metrics")
+    render_metrics_panel(collect_stats())
+    
+    # LLM latency, tokens and errors per prompt config and model
+    st.subheader("LLM Telemetry")
+    telemetry = LLMTelemetry()
+    telemetry_stats = telemetry.stats()
+
+    def format_seconds(value):
+        return "-" if value is None else ("> 64s" if value == float("inf") else f"≤ {value:g}s")
+
+    def telemetry_row(summary: dict) -> dict:
+        # "~" marks averages that include local token estimates
+        approx = "~" if summary['estimated_token_calls'] else ""
+        return {
+            'Calls': summary['calls'],
+            'Avg Latency (s)': f"{summary['avg_latency']:.2f}",
+            'p50': format_seconds(summary['p50']),
+            'p95': format_seconds(summary['p95']),
+            'Avg Prompt Tokens': f"{approx}{summary['avg_prompt_tokens']:.0f}",
+            'Avg Completion Tokens': f"{approx}{summary['avg_completion_tokens']:.0f}",
+            'Estimated Token Calls': summary['estimated_token_calls'],
+            'Retries': summary['retries'],
+            'Errors': ", ".join(f"{error}: {count}" for error, count in summary['errors'].items()) or "-",
+        }
+
+    if telemetry_stats['prompts']:
+        st.markdown("**By prompt**")
+        st.table([
+            {'Prompt': prompt, 'Model': model, **telemetry_row(summary)}
+            for (prompt, model), summary in telemetry_stats['prompts'].items()
+        ])
+        st.markdown("**By model**")
+        st.table([{'Model': model, **telemetry_row(summary)} for model, summary in telemetry_stats['models'].items()])
+        st.caption("Token counts are the usage reported by the API. \"~\" marks averages that include local "
+                   "estimates, for retried attempts or providers that report no usage.")
+        st.download_button("Download Prometheus metrics", telemetry.render_prometheus(),
+                           file_name="llm_metrics.prom", mime="text/plain")
+    else:
+        st.info("No LLM calls recorded since the app started.")
+    
+    # Prompt and model variants bucketed per session
+    st.subheader("Prompt Experiments")
+    prompt_registry = PromptRegistry()
+    experiments = prompt_registry.summary()
+    if not experiments:
+        st.info("No prompt experiments configured.")
+    for experiment, result in experiments.items():
+        st.markdown(f"**{experiment}**")
+        st.table([
+            {
+                'Variant': variant,
+                'Version': stats['version'],
+                'Model': stats['model'],
+                'Weight': stats['weight'],
+                'Sessions': stats['sessions'],
+                'Completion Rate': f"{stats['completion_rate']:.1%}",
+                'Parse Failures': f"{stats['parse_failure_rate']:.1%}",
+                'Calls': stats['calls'],
+                'Avg Latency (s)': f"{stats['avg_latency']:.2f}",
+                'Avg Tokens': f"{stats['avg_prompt_tokens'] + stats['avg_completion_tokens']:.0f}",
+            }
+            for variant, stats in result['variants'].items()
+        ])
+        recommended = result['recommended']
+        if recommended and result['variants'][recommended]['weight'] < sum(
+            stats['weight'] for stats in result['variants'].values()
+        ):
+            if st.button(f"Promote {recommended} (fastest)", key=f"promote_{experiment}"):
+                try:
+                    prompt_registry.promote(experiment, recommended)
+                    st.success(f"All sessions now use {recommended}.")
+                except Exception as e:
+                    st.error(f"Error promoting variant: {str(e)}")
+        elif not recommended:
+            st.caption("Not enough sessions per variant to recommend one yet.")
+    
+    # Display the current page of goals in a table
     st.subheader("All Goals")
+    page_number = st.session_state.goal_page_index + 1
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 3])
+    with col1:
+        if st.button("← Previous", disabled=page_number == 1):
+            st.session_state.goal_page_index -= 1
+            st.rerun()
+    with col2:
+        if st.button("Next →", disabled=next_cursor is None):
+            if page_number == len(st.session_state.goal_pages):
+                st.session_state.goal_pages.append(firebase_service.get_goals_page(ADMIN_PAGE_SIZE, next_cursor))
+            st.session_state.goal_page_index += 1
+            st.rerun()
+    with col3:
+        if st.button("Refresh"):
+            st.session_state.goal_pages = []
+            st.rerun()
+    with col4:
+        st.caption(f"Page {page_number} · {ADMIN_PAGE_SIZE} goals per page")
     
     # Create a table view
     if goals:
@@ -84,7 +224,8 @@ if check_password():
             with col1:
                 st.write(goal['goal'][:50] + "..." if len(goal['goal']) > 50 else goal['goal'])
             with col2:
-                st.write(goal['time_commitment'])
+                minutes = goal.get('time_commitment_minutes')
+                st.write(minutes if minutes is not None else goal['time_commitment'])
             with col3:
                 st.write(goal['timestamp'])
             with col4:
@@ -98,16 +239,20 @@ if check_password():
                 else:
                     st.write("-")
             
-            # Expandable details
-            with st.expander("View Details"):
+            # Details are loaded only when a row is opened
+            if st.toggle("View Details", key=f"details_{goal['id']}"):
+                details = firebase_service.get_goal(goal['id'])
+                if details is None:
+                    st.warning("This goal could not be loaded.")
+                    continue
                 st.write("**Tasks:**")
-                st.write(goal['tasks'])
+                st.write(details['tasks'])
                 st.write("**Habits:**")
-                st.write(goal['habits'])
-                if 'reminder_settings' in goal and goal['reminder_settings']:
+                st.write(details['habits'])
+                if details.get('reminder_settings'):
                     st.write("**Reminder Settings:**")
-                    st.write(f"Email: {goal['reminder_settings']['email']}")
-                    st.write(f"Frequency: {goal['reminder_settings']['frequency']}")
-                    st.write(f"Time: {goal['reminder_settings']['time']}")
+                    st.write(f"Email: {details['reminder_settings']['email']}")
+                    st.write(f"Frequency: {details['reminder_settings']['frequency']}")
+                    st.write(f"Time: {details['reminder_settings']['time']}")
     else:
         st.info("No goals found in the database.")
@@ -0,0 +1,239 @@
+import json
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from services.llm_scheduler import scheduling
+from services.resilience import CircuitBreaker, ResilienceManager
+from services.security_service import SecurityService
+from services.telemetry import register_stats
+from config.settings import (
+    DEFERRED_QUEUE_PATH,
+    DEFERRED_MAX_CONCURRENCY,
+    DEFERRED_POLL_SECONDS,
+    DEFERRED_MAX_ATTEMPTS,
+)
+
+# Completions within this window count toward the drain rate
+DRAIN_RATE_WINDOW_SECONDS = 600
+
+
+def upstream_available() -> bool:
+    """Return whether OpenAI is reachable and no model's circuit breaker is open."""
+    try:
+        socket.create_connection(("api.openai.com", 443), timeout=5).close()
+    except OSError:
+        return False
+    return CircuitBreaker.OPEN not in ResilienceManager().breaker_states().values()
+
+
+class DeferredQueue:
+    """Durable SQLite queue of plan requests made while the upstream was unavailable.
+
+    A daemon worker drains the queue with at most DEFERRED_MAX_CONCURRENCY plans
+    in flight once `upstream_available()` is true. Each request is generated
+    and stored through `FirebaseService.store_user_goal` with an active email
+    reminder, so it reaches the user through the reminders pipeline like any
+    other plan. The goal id is a random token fixed when the request is
+    queued, so the page can link to the plan before it exists; the link is the
+    only way to view the plan, so the id must not be derivable from the goal. Failed requests are retried on
+    later polls, up to DEFERRED_MAX_ATTEMPTS times.
+    """
+    _instance = None
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DeferredQueue, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(DEFERRED_QUEUE_PATH, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS deferred_requests ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, goal TEXT, questions TEXT, answers TEXT, email TEXT, "
+            "time_commitment INTEGER, status TEXT, attempts INTEGER DEFAULT 0, error TEXT, goal_id TEXT, "
+            "session_id TEXT, created_at REAL, updated_at REAL)"
+        )
+        # Requests interrupted by a restart go back in line
+        self._db.execute(
+            "UPDATE deferred_requests SET status = ? WHERE status = ?", (self.PENDING, self.PROCESSING)
+        )
+        self._db.commit()
+        self._executor = ThreadPoolExecutor(max_workers=DEFERRED_MAX_CONCURRENCY, thread_name_prefix="deferred")
+        self._worker = None
+        self._completions = deque()
+        self._processed = 0
+        self._failures = 0
+        register_stats("deferred_queue", self.stats)
+
+    def enqueue(self, goal: str, questions: List[str], answers: List[str], email: str,
+                time_commitment: Optional[int] = None, session_id: Optional[str] = None) -> int:
+        """Queue a plan request for later; returns its id.
+
+        `status` reports the goal id the plan will be stored under, a random
+        URL-safe token. The plan is generated as `session_id`, so it gets the
+        same prompt experiment variants as the session that queued it.
+        """
+        security = SecurityService()
+        goal = security.sanitize_input(goal)
+        questions = [security.sanitize_input(q) for q in questions]
+        answers = [security.sanitize_input(a) for a in answers]
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO deferred_requests (goal, questions, answers, email, time_commitment, status, "
+                "goal_id, session_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (goal, json.dumps(questions), json.dumps(answers), email, time_commitment, self.PENDING,
+                 secrets.token_urlsafe(16), session_id, now, now)
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def status(self, request_id: int) -> Optional[dict]:
+        """Return a request's status, attempts and stored goal id, or None if it is unknown."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, attempts, goal_id FROM deferred_requests WHERE id = ?", (request_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'status': row[0], 'attempts': row[1], 'goal_id': row[2]}
+
+    def find(self, goal_id: str) -> Optional[int]:
+        """Return the id of the request whose plan is stored under `goal_id`, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM deferred_requests WHERE goal_id = ?", (goal_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def depth(self) -> int:
+        """Return the number of requests waiting to be generated."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM deferred_requests WHERE status IN (?, ?)", (self.PENDING, self.PROCESSING)
+            ).fetchone()[0]
+
+    def start_worker(self):
+        """Start the background worker if it is not running."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name="deferred-worker", daemon=True)
+                self._worker.start()
+
+    def drain(self) -> int:
+        """Generate up to DEFERRED_MAX_CONCURRENCY pending requests concurrently; returns how many succeeded."""
+        batch = self._claim(DEFERRED_MAX_CONCURRENCY)
+        futures = [self._executor.submit(self._process, row) for row in batch]
+        return sum(future.result() for future in futures)
+
+    def stats(self) -> dict:
+        """Return queue depth, oldest wait, and processed, failed and drain-rate counters."""
+        now = time.time()
+        with self._lock:
+            while self._completions and self._completions[0] < now - DRAIN_RATE_WINDOW_SECONDS:
+                self._completions.popleft()
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM deferred_requests GROUP BY status"
+            ).fetchall())
+            oldest = self._db.execute(
+                "SELECT MIN(created_at) FROM deferred_requests WHERE status IN (?, ?)", (self.PENDING, self.PROCESSING)
+            ).fetchone()[0]
+            return {
+                'depth': counts.get(self.PENDING, 0) + counts.get(self.PROCESSING, 0),
+                'processing': counts.get(self.PROCESSING, 0),
+                'done': counts.get(self.DONE, 0),
+                'failed': counts.get(self.FAILED, 0),
+                'oldest_wait_seconds': now - oldest if oldest else 0.0,
+                'processed': self._processed,
+                'failures': self._failures,
+                'drain_rate_per_minute': len(self._completions) * 60 / DRAIN_RATE_WINDOW_SECONDS,
+            }
+
+    def _work(self):
+        while True:
+            try:
+                if self.depth() and upstream_available():
+                    # Keep draining while requests succeed; wait before retrying failures
+                    if self.drain():
+                        continue
+            except Exception as e:
+                print(f"Error draining deferred queue: {str(e)}")
+            time.sleep(DEFERRED_POLL_SECONDS)
+
+    def _claim(self, limit: int) -> List[tuple]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, goal, questions, answers, email, time_commitment, attempts, goal_id, session_id "
+                "FROM deferred_requests WHERE status = ? ORDER BY id LIMIT ?", (self.PENDING, limit)
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE deferred_requests SET status = ?, updated_at = ? WHERE id = ?",
+                [(self.PROCESSING, time.time(), row[0]) for row in rows]
+            )
+            self._db.commit()
+        return rows
+
+    def _process(self, row: tuple) -> bool:
+        # Imported here so the queue itself does not need the OpenAI or Firebase credentials
+        from services.openai_service import OpenAIService
+        from services.firebase_service import FirebaseService
+
+        request_id, goal, questions, answers, email, time_commitment, attempts, goal_id, session_id = row
+        questions, answers = json.loads(questions), json.loads(answers)
+        try:
+            # Runs as the session that queued it, for its prompt variants, but yields upstream capacity
+            # to interactive requests
+            with scheduling(session_id or f"deferred-{request_id}", tier="deferred"):
+                plan = OpenAIService().fetch_plan(goal, questions, answers)
+            firebase = FirebaseService()
+            stored_id = firebase.store_user_goal(
+                goal=goal,
+                questions=questions,
+                answers=answers,
+                time_commitment=time_commitment,
+                tasks=plan['initiatives'],
+                habits=plan['habits'],
+                reminder_settings={
+                    'email': email,
+                    'frequency': 'Daily',
+                    'time': None,
+                    'status': 'active'
+                },
+                # The id given out when the request was queued; a retry overwrites instead of duplicating
+                goal_id=goal_id
+            )
+            if stored_id is None:
+                raise RuntimeError("Plan could not be stored")
+        except Exception as e:
+            print(f"Error generating deferred plan {request_id}: {str(e)}")
+            status = self.FAILED if attempts + 1 >= DEFERRED_MAX_ATTEMPTS else self.PENDING
+            with self._lock:
+                self._failures += 1
+                self._db.execute(
+                    "UPDATE deferred_requests SET status = ?, attempts = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (status, attempts + 1, str(e), time.time(), request_id)
+                )
+                self._db.commit()
+            return False
+
+        with self._lock:
+            self._processed += 1
+            self._completions.append(time.time())
+            self._db.execute(
+                "UPDATE deferred_requests SET status = ?, attempts = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (self.DONE, attempts + 1, time.time(), request_id)
+            )
+            self._db.commit()
+        return True
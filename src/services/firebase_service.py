@@ -1,8 +1,46 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+from collections import OrderedDict
+import random
+import threading
 import streamlit as st
+from utils.time_commitment import parse_minutes
+from config.settings import (
+    FIREBASE_BULK_CHUNK_SIZE,
+    FIREBASE_BULK_MAX_WORKERS,
+    GOAL_ROLLUP_SHARDS,
+    GOAL_DETAIL_CACHE_SIZE,
+)
+
+# Fields a goal listing row needs; questions, answers, tasks and habits are loaded with get_goal
+GOAL_LISTING_FIELDS = [
+    'goal',
+    'time_commitment',
+    'time_commitment_minutes',
+    'timestamp',
+    'reminder_settings.email',
+    'reminder_settings.frequency',
+    'reminder_settings.time',
+]
+
+# Counters kept in the goal rollup shards
+ROLLUP_FIELDS = ('goals', 'goals_with_reminders', 'time_commitment_minutes_sum', 'time_commitment_count')
+
+
+def rollup_values(goal_data: dict) -> dict:
+    """Return a goal document's contribution to the rollup counters."""
+    minutes = goal_data.get('time_commitment_minutes')
+    if minutes is None:
+        minutes = parse_minutes(goal_data.get('time_commitment'))
+    reminder = goal_data.get('reminder_settings') or {}
+    return {
+        'goals': 1,
+        'goals_with_reminders': int(bool(reminder.get('email'))),
+        'time_commitment_minutes_sum': minutes or 0,
+        'time_commitment_count': int(minutes is not None),
+    }
 
 class FirebaseService:
     _instance = None
@@ -36,60 +74,198 @@ class FirebaseService:
                 cred = credentials.Certificate(cred_dict)
                 firebase_admin.initialize_app(cred)
                 self.db = firestore.client()
+                self._goal_cache = OrderedDict()  # goal id -> goal data, least recently used first
+                self._goal_cache_lock = threading.Lock()
                 self._initialized = True
             except Exception as e:
                 print(f"Error initializing Firebase: {str(e)}")
                 raise
 
-    def store_user_goal(self, goal: str, questions: list, answers: dict, time_commitment: int, tasks: str, habits: str, reminder_settings: dict = None) -> str:
-        """Store user's goal and related information in Firestore."""
-        try:
-            # Create a new document in the goals collection
-            doc_ref = self.db.collection('goals').document()
+    def _goal_writes(self, goal: str, questions: list, answers: dict, time_commitment: int, tasks: str, habits: str, reminder_settings: dict = None, goal_id: str = None, extra_fields: dict = None) -> list:
+        """Return the (document, data, created) writes that store one goal and its reminder.
+
+        `created` holds the fields written only when the document is new: the
+        goal's timestamp and the reminder's status and send state, which later
+        saves of the same goal must not reset.
+        """
+        # Create a new document in the goals collection, or update the given one
+        doc_ref = self.db.collection('goals').document(goal_id)
+        
+        # Prepare the document data
+        goal_data = {
+            'goal': goal,
+            'questions': questions,
+            'answers': answers,
+            'time_commitment': time_commitment,
+            'time_commitment_minutes': parse_minutes(time_commitment),
+            'tasks': tasks,
+            'habits': habits
+        }
+        goal_created = {'timestamp': firestore.SERVER_TIMESTAMP}
+        if extra_fields:
+            goal_data.update(extra_fields)
+            # An explicit timestamp (bulk imports) is kept as given
+            if 'timestamp' in extra_fields:
+                goal_created = {}
+        writes = [(doc_ref, goal_data, goal_created)]
+
+        # Add reminder settings if provided
+        if reminder_settings:
+            goal_data['reminder_settings'] = {key: value for key, value in reminder_settings.items() if key != 'status'}
+            goal_created['reminder_settings'] = reminder_settings
             
-            # Prepare the document data
-            goal_data = {
+            # Also store in a separate reminders collection for easier querying
+            reminder_ref = self.db.collection('reminders').document(goal_id)
+            writes.append((reminder_ref, {
+                'goal_id': doc_ref.id,
                 'goal': goal,
-                'questions': questions,
-                'answers': answers,
-                'time_commitment': time_commitment,
-                'tasks': tasks,
                 'habits': habits,
-                'timestamp': firestore.SERVER_TIMESTAMP
-            }
+                'email': reminder_settings['email'],
+                'frequency': reminder_settings['frequency'],
+                'time': reminder_settings['time']
+            }, {
+                'status': reminder_settings['status'],
+                'last_sent': None,
+                'created_at': firestore.SERVER_TIMESTAMP
+            }))
+        return writes
 
-            # Add reminder settings if provided
-            if reminder_settings:
-                goal_data['reminder_settings'] = reminder_settings
-                
-                # Also store in a separate reminders collection for easier querying
-                reminder_ref = self.db.collection('reminders').document()
-                reminder_ref.set({
-                    'goal_id': doc_ref.id,
-                    'goal': goal,
-                    'habits': habits,
-                    'email': reminder_settings['email'],
-                    'frequency': reminder_settings['frequency'],
-                    'time': reminder_settings['time'],
-                    'status': reminder_settings['status'],
-                    'last_sent': None,
-                    'created_at': firestore.SERVER_TIMESTAMP
-                })
-            
-            # Store the goal data
-            doc_ref.set(goal_data)
+    def store_user_goal(self, goal: str, questions: list, answers: dict, time_commitment: int, tasks: str, habits: str, reminder_settings: dict = None, goal_id: str = None, extra_fields: dict = None) -> str:
+        """Store user's goal and related information in Firestore.
+
+        The goal, its reminder and the rollup counter update are committed
+        together, so either all are stored or none is. With `goal_id`, they are
+        merged into documents with that id, so repeated saves are idempotent:
+        the goal keeps its original timestamp and the reminder its status and
+        send state. The earlier version is read in the same transaction so the
+        counters only change by the difference. `extra_fields` are stored on the
+        goal document as well.
+        """
+        try:
+            writes = self._goal_writes(goal, questions, answers, time_commitment, tasks, habits,
+                                       reminder_settings, goal_id, extra_fields)
+            if goal_id is None:
+                # A new document: no read needed, one round trip
+                batch = self.db.batch()
+                for doc_ref, data, created in writes:
+                    batch.set(doc_ref, {**data, **created})
+                batch.set(self._rollup_shard(), self._rollup_increments(rollup_values(writes[0][1])), merge=True)
+                batch.commit()
+            else:
+                self._upsert_goal(self.db.transaction(), writes)
+                self._forget_goal(goal_id)
             
-            return doc_ref.id
+            return writes[0][0].id
         except Exception as e:
             print(f"Error storing goal in Firebase: {str(e)}")
             return None
 
+    def store_user_goals_bulk(self, goals: list, chunk_size: int = FIREBASE_BULK_CHUNK_SIZE,
+                              max_workers: int = FIREBASE_BULK_MAX_WORKERS) -> list:
+        """Store many goals for imports and migrations; returns their ids, None for goals that failed.
+
+        Each goal is a dict of `store_user_goal` arguments; an original
+        `timestamp` can be kept by passing it in `extra_fields`. Goals are
+        committed in batches of `chunk_size` goals (a goal and its reminder stay
+        in the same batch), with up to `max_workers` batches in flight. The
+        rollup counters assume the goals are new; rebuild them with
+        `python src/maintenance.py backfill-goals` after re-importing.
+        """
+        # Firestore batches hold at most 500 writes: up to two per goal plus the rollup shard
+        chunk_size = max(1, min(chunk_size, 249))
+        chunks = [goals[start:start + chunk_size] for start in range(0, len(goals), chunk_size)]
+
+        def commit(chunk: list) -> list:
+            try:
+                batch = self.db.batch()
+                ids = []
+                totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+                for goal in chunk:
+                    writes = self._goal_writes(**goal)
+                    for doc_ref, data, created in writes:
+                        batch.set(doc_ref, {**data, **created})
+                    ids.append(writes[0][0].id)
+                    for field, value in rollup_values(writes[0][1]).items():
+                        totals[field] += value
+                batch.set(self._rollup_shard(), self._rollup_increments(totals), merge=True)
+                batch.commit()
+                for goal_id in ids:
+                    self._forget_goal(goal_id)
+                return ids
+            except Exception as e:
+                print(f"Error storing goal batch in Firebase: {str(e)}")
+                return [None] * len(chunk)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="firestore-bulk") as executor:
+            return [goal_id for ids in executor.map(commit, chunks) for goal_id in ids]
+
+    def _upsert_goal(self, transaction, writes: list):
+        @firestore.transactional
+        def upsert(transaction):
+            # Transactions need every read before the first write
+            snapshots = [doc_ref.get(transaction=transaction) for doc_ref, _, _ in writes]
+            goal_data = writes[0][1]
+            old_goal = snapshots[0].to_dict() if snapshots[0].exists else None
+            delta = rollup_values({**(old_goal or {}), **goal_data})
+            if old_goal is not None:
+                for field, value in rollup_values(old_goal).items():
+                    delta[field] -= value
+            for (doc_ref, data, created), snapshot in zip(writes, snapshots):
+                if snapshot.exists:
+                    transaction.set(doc_ref, data, merge=True)
+                else:
+                    transaction.set(doc_ref, {**data, **created})
+            if any(delta.values()):
+                transaction.set(self._rollup_shard(), self._rollup_increments(delta), merge=True)
+
+        upsert(transaction)
+
+    def _rollup_shard(self, index: int = None):
+        # Spread counter updates over shards: a single document sustains about one write per second
+        if index is None:
+            index = random.randrange(GOAL_ROLLUP_SHARDS)
+        return self.db.collection('rollups').document('goals').collection('shards').document(str(index))
+
+    @staticmethod
+    def _rollup_increments(values: dict) -> dict:
+        return {field: firestore.Increment(value) for field, value in values.items() if value}
+
+    def get_goal_metrics(self) -> dict:
+        """Return total goals, goals with an email reminder and the average daily minutes.
+
+        Summed from the rollup counter shards, so the cost is GOAL_ROLLUP_SHARDS
+        reads however many goals are stored.
+        """
+        try:
+            totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+            for doc in self.db.collection('rollups').document('goals').collection('shards').stream():
+                data = doc.to_dict()
+                for field in ROLLUP_FIELDS:
+                    totals[field] += data.get(field, 0)
+            return {
+                'total_goals': totals['goals'],
+                'goals_with_reminders': totals['goals_with_reminders'],
+                'avg_time_commitment': (totals['time_commitment_minutes_sum'] / totals['time_commitment_count']
+                                        if totals['time_commitment_count'] else 0),
+            }
+        except Exception as e:
+            print(f"Error retrieving goal metrics from Firebase: {str(e)}")
+            return {'total_goals': 0, 'goals_with_reminders': 0, 'avg_time_commitment': 0}
+
+    def reset_goal_rollups(self, totals: dict):
+        """Overwrite the rollup shards with recomputed totals (used by the backfill job)."""
+        batch = self.db.batch()
+        for index in range(GOAL_ROLLUP_SHARDS):
+            batch.set(self._rollup_shard(index), totals if index == 0 else dict.fromkeys(ROLLUP_FIELDS, 0))
+        batch.commit()
+
     def get_user_goals(self, limit: int = 10) -> list:
-        """Retrieve the most recent user goals."""
+        """Retrieve the most recent user goals, with the GOAL_LISTING_FIELDS only."""
         try:
             # Query the goals collection, ordered by timestamp
             goals_ref = self.db.collection('goals')
-            query = goals_ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit)
+            query = (goals_ref.select(GOAL_LISTING_FIELDS)
+                     .order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit))
             
             # Get the documents
             docs = query.stream()
@@ -109,6 +285,98 @@ class FirebaseService:
             print(f"Error retrieving goals from Firebase: {str(e)}")
             return []
 
+    def get_goals_page(self, limit: int = 25, cursor: tuple = None) -> tuple:
+        """Retrieve one page of goals, newest first, and the cursor of the next page.
+
+        `cursor` is the `(timestamp, id)` of the last goal on the previous page;
+        the document id breaks ties between goals saved at the same time. The
+        next cursor is None on the last page. Each page is one query of
+        `limit + 1` documents, the extra one showing whether more exist, and
+        returns the GOAL_LISTING_FIELDS only; use `get_goal` for the details.
+        """
+        try:
+            query = (self.db.collection('goals')
+                     .select(GOAL_LISTING_FIELDS)
+                     .order_by('timestamp', direction=firestore.Query.DESCENDING)
+                     .order_by('__name__', direction=firestore.Query.DESCENDING))
+            if cursor:
+                timestamp, goal_id = cursor
+                query = query.start_after({
+                    'timestamp': timestamp,
+                    '__name__': self.db.collection('goals').document(goal_id)
+                })
+            docs = list(query.limit(limit + 1).stream())
+
+            goals = []
+            for doc in docs[:limit]:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                goals.append(data)
+            next_cursor = (goals[-1]['timestamp'], goals[-1]['id']) if len(docs) > limit else None
+            for data in goals:
+                # Convert timestamp to string for display, after the cursor kept the raw value
+                if data.get('timestamp'):
+                    data['timestamp'] = data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+            return goals, next_cursor
+        except Exception as e:
+            print(f"Error retrieving goals page from Firebase: {str(e)}")
+            return [], None
+
+    def get_goal(self, goal_id: str) -> dict:
+        """Retrieve a single goal by id, or None if it does not exist.
+
+        The last GOAL_DETAIL_CACHE_SIZE goals read are kept in memory; goals
+        written through this process are dropped from it.
+        """
+        with self._goal_cache_lock:
+            data = self._goal_cache.get(goal_id)
+            if data is not None:
+                self._goal_cache.move_to_end(goal_id)
+                return dict(data)
+        try:
+            doc = self.db.collection('goals').document(goal_id).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            data['id'] = doc.id
+        except Exception as e:
+            print(f"Error retrieving goal from Firebase: {str(e)}")
+            return None
+        if GOAL_DETAIL_CACHE_SIZE > 0:
+            with self._goal_cache_lock:
+                self._goal_cache[goal_id] = data
+                self._goal_cache.move_to_end(goal_id)
+                while len(self._goal_cache) > GOAL_DETAIL_CACHE_SIZE:
+                    self._goal_cache.popitem(last=False)
+        return dict(data)
+
+    def _forget_goal(self, goal_id: str):
+        with self._goal_cache_lock:
+            self._goal_cache.pop(goal_id, None)
+
+    def get_goals_since(self, cursor: tuple = None, limit: int = 500) -> list:
+        """Retrieve goal ids, texts and timestamps after a `(timestamp, id)` cursor, oldest first.
+
+        Goals are ordered by timestamp, then id; without a cursor, all goals
+        are returned.
+        """
+        try:
+            goals_ref = self.db.collection('goals')
+            query = goals_ref.select(['goal', 'timestamp']).order_by('timestamp').order_by('__name__')
+            if cursor is not None:
+                timestamp, goal_id = cursor
+                query = query.start_after({'timestamp': timestamp, '__name__': goals_ref.document(goal_id)})
+
+            goals = []
+            for doc in query.limit(limit).stream():
+                data = doc.to_dict()
+                data['id'] = doc.id
+                goals.append(data)
+            return goals
+        except Exception as e:
+            print(f"Error retrieving goals from Firebase: {str(e)}")
+            return []
+
     def get_pending_reminders(self) -> list:
         """Get all active reminders that need to be sent."""
         try:
@@ -0,0 +1,144 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config.settings import GOAL_CLASSIFIER_ENABLED, GOAL_CLASSIFIER_MIN_CONFIDENCE, GOAL_CLASSIFIER_MIN_TERMS
+from services.telemetry import register_stats
+
+# Seed vocabulary per category; terms shared between categories get a lower IDF weight
+CATEGORY_KEYWORDS = {
+    "fitness": [
+        "fitness", "fit", "shape", "run", "runner", "race", "5k", "10k", "marathon", "jog", "gym",
+        "workout", "exercise", "train", "strength", "muscle", "lift", "weight", "pound", "kg", "lbs",
+        "lose", "body", "cardio", "swim", "cycle", "bike", "yoga", "stretch", "push", "pull", "squat",
+        "athlete", "sport", "health", "healthy", "diet", "calorie", "protein", "step", "walk", "mile",
+        "endurance", "flexibility", "triathlon", "hike", "abs",
+    ],
+    "career": [
+        "career", "job", "work", "promotion", "promote", "senior", "manager", "management", "lead",
+        "leader", "leadership", "engineer", "developer", "software", "role", "position", "title",
+        "interview", "resume", "hire", "company", "employer", "team", "mentor", "skill", "certification",
+        "certify", "boss", "raise", "salary", "professional", "industry", "network", "linkedin",
+        "project", "performance", "review", "colleague", "business", "startup", "client", "freelance",
+        "portfolio", "technical", "advance",
+    ],
+    "finance": [
+        "finance", "financial", "money", "save", "saving", "budget", "debt", "loan", "mortgage",
+        "house", "home", "down", "payment", "invest", "investment", "stock", "retire", "retirement",
+        "income", "expense", "spend", "pay", "credit", "card", "emergency", "fund", "dollar", "$",
+        "wealth", "rich", "net", "worth", "bank", "account", "rent", "equity", "afford", "tax",
+        "portfolio", "401k", "ira", "salary", "raise", "cost",
+    ],
+}
+
+_TOKEN_PATTERN = re.compile(r"\$|[a-z0-9]+")
+_SUFFIXES = ("ings", "ing", "ions", "ion", "ments", "ment", "ers", "er", "ed", "es", "s", "e")
+
+
+def stem(token: str) -> str:
+    """Strip one common English suffix so that e.g. 'running', 'runs' and 'run' match."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    if len(token) > 3 and token[-1] == token[-2]:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in _TOKEN_PATTERN.findall(text.lower())]
+
+
+class GoalClassifier:
+    """In-process TF-IDF goal classifier; no network calls.
+
+    Each category is a TF-IDF vector over its seed vocabulary. A goal is scored
+    by cosine similarity against every category, and its confidence is the best
+    category's share of the total score. A share says nothing when only one
+    word matched ("home" in "learn piano at home"), so the best category must
+    first match GOAL_CLASSIFIER_MIN_TERMS distinct terms of the goal. Goals
+    without that evidence or below GOAL_CLASSIFIER_MIN_CONFIDENCE are
+    unclassified and keep using the generic prompts.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(GoalClassifier, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.enabled = GOAL_CLASSIFIER_ENABLED
+        self.min_confidence = GOAL_CLASSIFIER_MIN_CONFIDENCE
+        self.min_terms = GOAL_CLASSIFIER_MIN_TERMS
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+        vocabularies = {category: set(tokenize(' '.join(words))) for category, words in CATEGORY_KEYWORDS.items()}
+        document_frequency = Counter(term for terms in vocabularies.values() for term in terms)
+        total = len(vocabularies)
+        self._weights = {}  # term -> {category: idf weight}
+        for category, terms in vocabularies.items():
+            norm = math.sqrt(sum(self._idf(document_frequency[term], total) ** 2 for term in terms))
+            for term in terms:
+                self._weights.setdefault(term, {})[category] = self._idf(document_frequency[term], total) / norm
+        register_stats("goal_classifier", self.stats)
+
+    @staticmethod
+    def _idf(frequency: int, total: int) -> float:
+        return math.log((1 + total) / (1 + frequency)) + 1
+
+    def scores(self, goal: str) -> Dict[str, float]:
+        """Return cosine similarity of the goal against each category that shares a term with it."""
+        counts = Counter(tokenize(goal))
+        scores = {}
+        norm = 0.0
+        for term, count in counts.items():
+            weights = self._weights.get(term)
+            if not weights:
+                continue
+            norm += count * count
+            for category, weight in weights.items():
+                scores[category] = scores.get(category, 0.0) + count * weight
+        if not norm:
+            return {}
+        return {category: score / math.sqrt(norm) for category, score in scores.items()}
+
+    def matched_terms(self, goal: str, category: str) -> int:
+        """Return how many distinct terms of the goal are in the category's vocabulary."""
+        return sum(1 for term in set(tokenize(goal)) if category in self._weights.get(term, {}))
+
+    def predict(self, goal: str) -> Tuple[Optional[str], float, int]:
+        """Return (best category, confidence, matched terms) regardless of the thresholds.
+
+        (None, 0.0, 0) if nothing matched.
+        """
+        scores = self.scores(goal)
+        if not scores:
+            return None, 0.0, 0
+        category = max(scores, key=scores.get)
+        return category, scores[category] / sum(scores.values()), self.matched_terms(goal, category)
+
+    def classify(self, goal: str) -> Optional[str]:
+        """Return the goal's category, or None when disabled, without enough evidence or not confident enough."""
+        if not self.enabled or not goal:
+            return None
+        category, confidence, matched = self.predict(goal)
+        if category is None or matched < self.min_terms or confidence < self.min_confidence:
+            category = None
+        with self._lock:
+            self._counts[category or 'unclassified'] += 1
+        return category
+
+    def stats(self) -> dict:
+        """Return how many goals were assigned to each category or left unclassified."""
+        with self._lock:
+            classified = sum(count for category, count in self._counts.items() if category != 'unclassified')
+            return {
+                'classified': classified,
+                'unclassified': self._counts['unclassified'],
+                'categories': {category: self._counts[category] for category in CATEGORY_KEYWORDS},
+            }
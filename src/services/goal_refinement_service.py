@@ -1,36 +1,225 @@
-import openai
+import time
 import streamlit as st
-from typing import Dict, Optional
+from contextlib import closing
+from typing import Callable, Dict, List, Optional
 from services.security_service import SecurityService
-from config.prompts import GOAL_REFINEMENT_CONFIG, GOAL_FINAL_REFINEMENT_CONFIG
+from services.llm_cache import ResponseCache, make_cache_key
+from services.llm_providers import LLMRouter, route_options
+from services.single_flight import SingleFlight
+from services.goal_classifier import GoalClassifier
+from services.prompt_registry import PromptRegistry
+from services.refinement_chat import ChatTurnStats, RefinementConversation
+from services.token_counter import count_message_tokens
+from config.prompts import (
+    GOAL_REFINEMENT_CONFIG,
+    GOAL_FINAL_REFINEMENT_CONFIG,
+    REFINEMENT_INTAKE_QUESTIONS,
+    CATEGORY_REFINEMENT_CONFIGS,
+    CATEGORY_FINAL_REFINEMENT_CONFIGS,
+    REFINEMENT_CHAT_CONFIG,
+    REFINEMENT_SUMMARY_CONFIG,
+)
+from config.settings import REFINEMENT_PIPELINE_MODE, REFINEMENT_CHAT_TOKEN_BUDGET, REFINEMENT_CHAT_KEEP_TURNS
 
 class GoalRefinementService:
     def __init__(self):
         self.security = SecurityService()
-        openai.api_key = st.secrets["OPENAI_API_KEY"]  # Use the same API key from secrets
+        self.cache = ResponseCache()
+        self.llm = LLMRouter()  # Shared provider layer using the API key from secrets
+        self.single_flight = SingleFlight()
+        self.classifier = GoalClassifier()
+        self.chat_stats = ChatTurnStats()
+        self.prompts = PromptRegistry()
         
         self.refinement_config = GOAL_REFINEMENT_CONFIG
         self.final_refinement_config = GOAL_FINAL_REFINEMENT_CONFIG
+        self.pipeline_mode = REFINEMENT_PIPELINE_MODE
 
-    def get_refinement_questions(self, initial_goal: str) -> Optional[str]:
-        """Generate refinement questions based on the initial goal."""
+    def _complete(self, config: Dict, messages: List[Dict], on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """Run a chat completion, passing the accumulated text to `on_delta` while streaming."""
+        if on_delta is None:
+            return self.llm.chat(config["model"], messages, temperature=0.7, **route_options(config))
+
+        parts = []
+        with closing(self.llm.stream_chat(config["model"], messages, temperature=0.7, **route_options(config))) as stream:
+            for delta in stream:
+                parts.append(delta)
+                on_delta(''.join(parts))
+        return ''.join(parts)
+
+    def get_intake_questions(self) -> str:
+        """Return the fixed refinement questions asked together with the goal in "oneshot" mode."""
+        return REFINEMENT_INTAKE_QUESTIONS
+
+    def fetch_refinement_questions(self, initial_goal: str, on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """Generate refinement questions for an already-sanitized goal without touching the UI.
+
+        Goals the local classifier recognizes use a shorter category prompt on a faster model.
+        """
+        category = self.classifier.classify(initial_goal)
+        config = self.prompts.resolve(CATEGORY_REFINEMENT_CONFIGS[category] if category else self.refinement_config)
+        cache_key = make_cache_key(config["model"], config, initial_goal)
+        questions = self.cache.get(cache_key)
+        replay = questions is not None
+        if questions is None:
+            # Identical concurrent requests share one upstream call
+            questions, replay = self.single_flight.do(
+                cache_key,
+                self._complete,
+                config,
+                [
+                    {"role": "system", "content": config["system_role"]},
+                    {"role": "user", "content": config["prompt"]},
+                    {"role": "user", "content": initial_goal}
+                ],
+                on_delta
+            )
+            self.cache.set(cache_key, questions)
+        if replay and on_delta:
+            on_delta(questions)
+        return questions
+
+    def fetch_refined_goal(self, initial_goal: str, user_responses: str,
+                           on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """Generate the refined goal for already-sanitized inputs without touching the UI.
+
+        Categorized goals use a shorter prompt, as in `fetch_refinement_questions`.
+        """
+        category = self.classifier.classify(initial_goal)
+        config = self.prompts.resolve(
+            CATEGORY_FINAL_REFINEMENT_CONFIGS[category] if category else self.final_refinement_config
+        )
+        prompt = f"""Initial Goal: {initial_goal}
+User's Additional Information: {user_responses}"""
+        
+        cache_key = make_cache_key(
+            config["model"],
+            config,
+            initial_goal,
+            user_responses
+        )
+        refined_goal = self.cache.get(cache_key)
+        replay = refined_goal is not None
+        if refined_goal is None:
+            refined_goal, replay = self.single_flight.do(
+                cache_key,
+                self._complete,
+                config,
+                [
+                    {"role": "system", "content": config["system_role"]},
+                    {"role": "user", "content": config["prompt"]},
+                    {"role": "user", "content": prompt}
+                ],
+                on_delta
+            )
+            self.cache.set(cache_key, refined_goal)
+        if replay and on_delta:
+            on_delta(refined_goal)
+        return refined_goal
+
+    def _chat_messages(self, config: Dict, conversation: RefinementConversation) -> List[Dict]:
+        messages = [{"role": "system", "content": config["system_role"]}]
+        if conversation.summary:
+            messages.append({
+                "role": "system",
+                "content": f"""Initial goal: {conversation.initial_goal}
+Summary of the conversation so far: {conversation.summary}"""
+            })
+        return messages + conversation.recent_messages()
+
+    def _compact(self, conversation: RefinementConversation, keep: int):
+        """Fold all but the last `keep` unsummarized messages into the rolling summary."""
+        folded = conversation.recent_messages()[:-keep]
+        if not folded:
+            return
+        config = self.prompts.resolve(REFINEMENT_SUMMARY_CONFIG)
+        transcript = "\n".join(f"{message['role'].title()}: {message['content']}" for message in folded)
+        # Identical compactions (e.g. a rerun replaying the same turn) reuse the cached summary
+        cache_key = make_cache_key(config["model"], config, conversation.summary, transcript)
+        summary = self.cache.get(cache_key)
+        if summary is None:
+            try:
+                summary = self._complete(config, [
+                    {"role": "system", "content": config["system_role"]},
+                    {"role": "user", "content": f"""{config["prompt"]}
+
+Current summary: {conversation.summary or "(none)"}
+
+New turns:
+{transcript}"""}
+                ])
+                self.cache.set(cache_key, summary)
+            except Exception as e:
+                # Keep the chat going: the folded turns are dropped instead of summarized
+                print(f"Error summarizing refinement chat: {str(e)}")
+                summary = conversation.summary
+        conversation.summary = summary
+        conversation.summarized += len(folded)
+
+    def fetch_chat_reply(self, conversation: RefinementConversation, message: str,
+                         on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """Add an already-sanitized user message to `conversation` and return the coach's reply.
+
+        Older messages are folded into the conversation's rolling summary until
+        the prompt fits in REFINEMENT_CHAT_TOKEN_BUDGET tokens, so later turns
+        cost about as much as early ones.
+        """
+        started = time.perf_counter()
+        conversation.add("user", message)
+        config = self.prompts.resolve(REFINEMENT_CHAT_CONFIG)
+        model = config["model"]
+        messages = self._chat_messages(config, conversation)
+        compaction_seconds = None
+        keep = REFINEMENT_CHAT_KEEP_TURNS
+        while count_message_tokens(messages, model) > REFINEMENT_CHAT_TOKEN_BUDGET and len(conversation.recent_messages()) > 1:
+            compaction_started = time.perf_counter()
+            self._compact(conversation, keep)
+            compaction_seconds = (compaction_seconds or 0.0) + time.perf_counter() - compaction_started
+            # Still over budget: the kept messages themselves are long, so keep fewer
+            keep = max(1, keep // 2)
+            messages = self._chat_messages(config, conversation)
+
+        reply = self._complete(config, messages, on_delta)
+        conversation.add("assistant", reply)
+
+        latency = time.perf_counter() - started
+        prompt_tokens = count_message_tokens(messages, model)
+        conversation.turn_stats.append({
+            'turn': conversation.turns,
+            'latency': latency,
+            'prompt_tokens': prompt_tokens,
+            'compacted': compaction_seconds is not None,
+        })
+        self.chat_stats.record(conversation.turns, latency, prompt_tokens, compaction_seconds)
+        return reply
+
+    def send_chat_message(self, conversation: RefinementConversation, message: str,
+                          on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Send a user message in the refinement chat; `on_delta` streams the reply."""
+        try:
+            message = self.security.sanitize_input(message)
+            return self.fetch_chat_reply(conversation, message, on_delta)
+        except Exception as e:
+            # Drop the unanswered message so the user can send it again
+            if conversation.messages and conversation.messages[-1]["role"] == "user":
+                conversation.messages.pop()
+            st.error(f"Error continuing the refinement chat: {str(e)}")
+            return None
+
+    def get_refinement_questions(self, initial_goal: str, on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Generate refinement questions based on the initial goal.
+
+        When `on_delta` is given, the response is streamed and the text generated
+        so far is passed to it after every chunk.
+        """
         try:
             # Sanitize input
             initial_goal = self.security.sanitize_input(initial_goal)
             
             st.write("DEBUG - Initial goal:", initial_goal)  # Debug log
             
-            response = openai.ChatCompletion.create(
-                model=self.refinement_config["model"],
-                messages=[
-                    {"role": "system", "content": self.refinement_config["system_role"]},
-                    {"role": "user", "content": self.refinement_config["prompt"]},
-                    {"role": "user", "content": initial_goal}
-                ],
-                temperature=0.7
-            )
+            questions = self.fetch_refinement_questions(initial_goal, on_delta)
             
-            questions = response.choices[0].message.content
             st.write("DEBUG - Generated questions:", questions)  # Debug log
             return questions
             
@@ -38,8 +227,13 @@ class GoalRefinementService:
             st.error(f"Error generating refinement questions: {str(e)}")
             return None
 
-    def generate_refined_goal(self, initial_goal: str, user_responses: str) -> Optional[str]:
-        """Generate the final refined goal based on initial goal and user responses."""
+    def generate_refined_goal(self, initial_goal: str, user_responses: str,
+                              on_delta: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Generate the final refined goal based on initial goal and user responses.
+
+        `on_delta` streams the partial goal statement the same way as in
+        `get_refinement_questions`.
+        """
         try:
             # Sanitize inputs
             initial_goal = self.security.sanitize_input(initial_goal)
@@ -49,20 +243,8 @@ class GoalRefinementService:
             st.write("Initial goal:", initial_goal)
             st.write("User responses:", user_responses)
             
-            prompt = f"""Initial Goal: {initial_goal}
-User's Additional Information: {user_responses}"""
-            
-            response = openai.ChatCompletion.create(
-                model=self.final_refinement_config["model"],
-                messages=[
-                    {"role": "system", "content": self.final_refinement_config["system_role"]},
-                    {"role": "user", "content": self.final_refinement_config["prompt"]},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
+            refined_goal = self.fetch_refined_goal(initial_goal, user_responses, on_delta)
             
-            refined_goal = response.choices[0].message.content
             st.write("DEBUG - Generated refined goal:", refined_goal)  # Debug log
             return refined_goal
             
@@ -0,0 +1,124 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from services.llm_scheduler import background_context, scheduling
+from services.telemetry import register_stats
+from config.settings import JOB_MAX_WORKERS, JOB_RESULT_TTL_SECONDS
+
+
+class Job:
+    """A unit of background work and its outcome."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, session_id: str, name: str):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.name = name
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        self.progress = []  # Partial results reported while running
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.DONE, Job.FAILED, Job.CANCELLED)
+
+    def report(self, item):
+        """Record a partial result, e.g. a streamed plan item."""
+        self.progress.append(item)
+
+
+class JobService:
+    """Process-wide executor and result store for generation jobs.
+
+    Jobs run on a thread pool, outside the Streamlit script, so reruns and page
+    navigation neither cancel nor repeat them. The UI keeps only the job id in
+    session state and polls `get`. Finished jobs are kept for
+    JOB_RESULT_TTL_SECONDS.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobService, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._executor = ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        register_stats("background_jobs", self.stats)
+
+    def submit(self, session_id: str, name: str, fn: Callable[[Job], object]) -> Job:
+        """Run `fn(job)` in the background, attributing its LLM calls to `session_id`."""
+        job = Job(session_id, name)
+        with scheduling(session_id):
+            context = background_context()
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+            self._submitted += 1
+            job.future = self._executor.submit(context.run, self._run, job, fn)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """Return a job by id, or None if it is unknown or has expired."""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: Optional[str]):
+        """Cancel a job that has not started and forget it; a running job finishes unobserved."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job and job.future.cancel():
+            job.status = Job.CANCELLED
+
+    def stats(self) -> dict:
+        """Return submitted, running, completed and failed job counts."""
+        with self._lock:
+            return {
+                'submitted': self._submitted,
+                'running': sum(job.status == Job.RUNNING for job in self._jobs.values()),
+                'pending': sum(job.status == Job.PENDING for job in self._jobs.values()),
+                'completed': self._completed,
+                'failed': self._failed,
+                'stored': len(self._jobs),
+            }
+
+    def _run(self, job: Job, fn: Callable[[Job], object]):
+        job.status = Job.RUNNING
+        try:
+            job.result = fn(job)
+            status = Job.DONE
+        except Exception as e:
+            print(f"Error in background job {job.name}: {str(e)}")
+            job.error = e
+            status = Job.FAILED
+        # Set finished_at first: a job counts as finished (and may expire) once its status changes
+        job.finished_at = time.time()
+        job.status = status
+        with self._lock:
+            if status == Job.DONE:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def _expire(self):
+        cutoff = time.time() - JOB_RESULT_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,213 @@
+import json
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from services.telemetry import register_stats
+
+
+class UnsalvageableResponse(ValueError):
+    """Raised when a model response cannot be repaired into the expected shape."""
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """Return the first JSON object in `text`, dropping code fences and surrounding prose.
+
+    If the object is never closed, everything from its opening brace is returned.
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+    depth = 0
+    in_string = False
+    escape = False
+    for index in range(start, len(text)):
+        ch = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def fix_json_syntax(text: str) -> str:
+    """Fix common model mistakes: smart quotes, trailing commas and unclosed strings or brackets."""
+    text = text.replace('“', '"').replace('”', '"').replace('‘', "'").replace('’', "'")
+    text = re.sub(r',\s*([}\]])', r'\1', text)
+
+    closers = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            closers.append('}' if ch == '{' else ']')
+        elif ch in '}]' and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r',\s*$', '', text)
+    return text + ''.join(reversed(closers))
+
+
+def clean_item(item) -> Optional[str]:
+    """Return a list item as the stripped string `coerce_lists` keeps, or None if it is dropped."""
+    text = item if isinstance(item, str) else json.dumps(item)
+    return text.strip() if text and text.strip() else None
+
+
+def coerce_lists(data: Dict, bounds: Dict[str, Tuple[int, int]], fillers: Dict[str, List[str]]) -> bool:
+    """Coerce list fields in place to their (min, max) bounds; returns whether anything changed.
+
+    Strings are split into lines, lists are truncated to the maximum and short
+    lists are padded from `fillers`. A missing or empty field cannot be salvaged.
+    """
+    changed = False
+    for name, (min_items, max_items) in bounds.items():
+        value = data.get(name)
+        if isinstance(value, str):
+            value = [line.strip(' -*\t') for line in value.splitlines()]
+            changed = True
+        if not isinstance(value, list):
+            raise UnsalvageableResponse(f"Missing list field: {name}")
+        items = [item for item in map(clean_item, value) if item is not None]
+        if not items:
+            raise UnsalvageableResponse(f"Empty list field: {name}")
+        if max_items is not None and len(items) > max_items:
+            items = items[:max_items]
+        if min_items is not None and len(items) < min_items:
+            extra = [filler for filler in fillers.get(name, []) if filler not in items]
+            items += extra[:min_items - len(items)]
+            if len(items) < min_items:
+                raise UnsalvageableResponse(f"Too few items in {name}")
+        changed = changed or items != value
+        data[name] = items
+    return changed
+
+
+def model_list_bounds(model_cls) -> Dict[str, Tuple[int, int]]:
+    """Read `Field(min_items=..., max_items=...)` bounds from the bounded fields of a pydantic model."""
+    return {
+        name: (field.field_info.min_items, field.field_info.max_items)
+        for name, field in model_cls.__fields__.items()
+        if field.field_info.min_items is not None or field.field_info.max_items is not None
+    }
+
+
+class ValidatedElements:
+    """Pass streamed list elements on the way `coerce_lists` keeps them.
+
+    Elements are cleaned like list items and dropped past their field's maximum,
+    so what streams is a prefix of the validated response; `finish` then passes
+    on the items validation added, such as fillers. If validation changed the
+    streamed items (e.g. a re-requested response), callers re-render from the
+    returned data instead.
+    """
+
+    def __init__(self, on_element: Callable, keys: Iterable[str], model_cls=None):
+        self.on_element = on_element
+        self.keys = set(keys)
+        self.bounds = model_list_bounds(model_cls) if model_cls is not None else {}
+        self.emitted = {}  # key -> items passed on
+
+    def __call__(self, key: str, element):
+        item = clean_item(element)
+        items = self.emitted.setdefault(key, [])
+        max_items = self.bounds.get(key, (None, None))[1]
+        if item is None or (max_items is not None and len(items) >= max_items):
+            return
+        items.append(item)
+        self.on_element(key, item)
+
+    def finish(self, data: Dict):
+        for key in self.keys:
+            value, emitted = data.get(key), self.emitted.get(key, [])
+            if isinstance(value, list) and value[:len(emitted)] == emitted:
+                for item in value[len(emitted):]:
+                    self(key, item)
+
+
+class ResponseRepairer:
+    """Process-wide repair stage for JSON model responses, with outcome counters."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResponseRepairer, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._lock = threading.Lock()
+        self._counts = {'clean': 0, 'repaired': 0, 'salvaged': 0, 'failed': 0}
+        register_stats("response_repair", self.stats)
+
+    def parse(self, content: str, model_cls=None, fillers: Optional[Dict[str, List[str]]] = None,
+              fields: Optional[List[str]] = None) -> Dict:
+        """Parse a response into a dict, repairing syntax and coercing list bounds of `model_cls`.
+
+        `fields` limits coercion to some of the model's fields (e.g. one plan section).
+        Raises `UnsalvageableResponse` when nothing usable can be recovered.
+        """
+        repaired = False
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            data = self._repair_syntax(content)
+            repaired = True
+        if not isinstance(data, dict):
+            self._count('failed')
+            raise UnsalvageableResponse("Response is not a JSON object")
+
+        salvaged = False
+        if model_cls is not None:
+            bounds = model_list_bounds(model_cls)
+            if fields is not None:
+                bounds = {name: bounds[name] for name in fields}
+            try:
+                salvaged = coerce_lists(data, bounds, fillers or {})
+            except UnsalvageableResponse:
+                self._count('failed')
+                raise
+
+        self._count('salvaged' if salvaged else 'repaired' if repaired else 'clean')
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def _repair_syntax(self, content: str) -> Dict:
+        candidate = extract_json_object(content or '')
+        if candidate is None:
+            self._count('failed')
+            raise UnsalvageableResponse("No JSON object in response")
+        for attempt in (candidate, fix_json_syntax(candidate)):
+            try:
+                return json.loads(attempt)
+            except ValueError:
+                continue
+        self._count('failed')
+        raise UnsalvageableResponse("Response JSON could not be repaired")
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
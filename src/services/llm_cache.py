@@ -0,0 +1,155 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from config.settings import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_DISK_PATH,
+)
+from services.telemetry import register_stats
+
+
+def normalize_input(text: str) -> str:
+    """Collapse whitespace so inputs that differ only in spacing share a cache entry.
+
+    Case and punctuation are kept, since plans are personalised to the exact answers.
+    """
+    return ' '.join(str(text).split())
+
+
+def make_cache_key(model: str, config, *inputs) -> str:
+    """Build a cache key from the model, the prompt config and the normalized inputs."""
+    if isinstance(config, dict):
+        config_text = json.dumps(config, sort_keys=True, default=str)
+    else:
+        config_text = json.dumps(vars(config), sort_keys=True, default=str)
+    parts = [model, hashlib.sha256(config_text.encode('utf-8')).hexdigest()]
+    for value in inputs:
+        if isinstance(value, (list, tuple)):
+            parts.append(json.dumps([normalize_input(v) for v in value]))
+        else:
+            parts.append(normalize_input(value))
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Process-wide LRU + TTL cache for LLM responses with an optional SQLite tier."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResponseCache, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.enabled = LLM_CACHE_ENABLED
+        self.max_entries = LLM_CACHE_MAX_ENTRIES
+        self.ttl = LLM_CACHE_TTL_SECONDS
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._disk = None
+        if LLM_CACHE_DISK_PATH:
+            try:
+                self._disk = sqlite3.connect(LLM_CACHE_DISK_PATH, check_same_thread=False)
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._disk.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening LLM cache database: {str(e)}")
+                self._disk = None
+        register_stats("response_cache", self.stats)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for a key, or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+            row = self._disk_get(key, now)
+            if row is not None:
+                self._disk_hits += 1
+                self._remember(key, row[0], row[1])
+                return row[0]
+
+            self._misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Store a value in memory and, when configured, on disk."""
+        if not self.enabled or value is None:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at)
+                    )
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing LLM cache entry: {str(e)}")
+
+    def clear(self):
+        """Drop every cached entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+                self._disk.commit()
+
+    def stats(self) -> dict:
+        """Return hit and miss counters for monitoring."""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        if self._disk is None:
+            return None
+        try:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._disk.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._disk.commit()
+                return None
+            return row
+        except sqlite3.Error as e:
+            print(f"Error reading LLM cache entry: {str(e)}")
+            return None
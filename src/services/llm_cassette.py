@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
+import openai
+from services.llm_client import TokenUsage
+from services.llm_providers import LLMProvider, StubProvider
+from config.settings import (
+    LLM_REPLAY_LATENCY,
+    LLM_REPLAY_ERROR_RATE,
+    LLM_REPLAY_ERRORS,
+    LLM_REPLAY_SEED,
+    LLM_REPLAY_ON_MISS,
+)
+
+# Request attached to injected errors, which the openai exceptions require
+_INJECTED_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+    def __init__(self, model: str, fingerprint: str):
+        super().__init__(f"No recorded response for {model} request {fingerprint[:12]}")
+        self.model = model
+        self.fingerprint = fingerprint
+
+
+def fingerprint(model: str, messages: List[Dict], **kwargs) -> str:
+    """Return a stable hash of a request; the per-attempt `timeout` is not part of it."""
+    options = {key: value for key, value in kwargs.items() if key != "timeout"}
+    payload = json.dumps({'model': model, 'messages': messages, 'options': options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec: str) -> Callable[[random.Random, float], float]:
+    """Parse a latency distribution into `sample(rng, recorded_seconds) -> seconds`.
+
+    Supported: "recorded", "none", "constant:S", "uniform:LOW,HIGH" and
+    "lognormal:MEDIAN,SIGMA".
+    """
+    name, _, args = spec.strip().lower().partition(":")
+    values = [float(value) for value in args.split(",")] if args else []
+    if name == "recorded":
+        return lambda rng, recorded: recorded
+    if name == "none":
+        return lambda rng, recorded: 0.0
+    if name == "constant" and len(values) == 1:
+        return lambda rng, recorded: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda rng, recorded: rng.uniform(values[0], values[1])
+    if name == "lognormal" and len(values) == 2:
+        return lambda rng, recorded: values[0] * rng.lognormvariate(0.0, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def injected_error(kind: str) -> Exception:
+    """Return the openai exception a real upstream failure of this kind raises."""
+    if kind == "timeout":
+        return openai.APITimeoutError(request=_INJECTED_REQUEST)
+    if kind == "connection":
+        return openai.APIConnectionError(request=_INJECTED_REQUEST)
+    if kind == "rate_limit":
+        return openai.RateLimitError(
+            "Injected rate limit", response=httpx.Response(429, request=_INJECTED_REQUEST), body=None
+        )
+    if kind == "server":
+        return openai.InternalServerError(
+            "Injected server error", response=httpx.Response(500, request=_INJECTED_REQUEST), body=None
+        )
+    raise ValueError(f"Unknown injected error: {kind}")
+
+
+class Cassette:
+    """Append-only JSONL file of recorded requests and responses.
+
+    A request recorded several times keeps every response; replay cycles
+    through them in recording order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}  # fingerprint -> list of records
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._records.setdefault(record['fingerprint'], []).append(record)
+
+    def __len__(self):
+        return sum(len(records) for records in self._records.values())
+
+    def get(self, key: str) -> List[Dict]:
+        return self._records.get(key, [])
+
+    def append(self, record: Dict):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._records.setdefault(record['fingerprint'], []).append(record)
+
+
+class RecordingProvider(LLMProvider):
+    """Passes calls through to a live provider and records successful responses to a cassette.
+
+    Latency is recorded per attempt, as seen by the provider, so retries and
+    fallbacks above it are not folded into the recording.
+    """
+
+    def __init__(self, provider: LLMProvider, cassette: Cassette):
+        self.provider = provider
+        self.cassette = cassette
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        started = time.perf_counter()
+        response = self.provider.chat(model, messages, **kwargs)
+        self._record(model, messages, kwargs, response, None, time.perf_counter() - started, None)
+        return response
+
+    def stream_chat(self, model: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        started = time.perf_counter()
+        chunks, first_chunk = [], None
+        for chunk in self.provider.stream_chat(model, messages, **kwargs):
+            if isinstance(chunk, TokenUsage):
+                yield chunk
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        self._record(model, messages, kwargs, ''.join(chunks), chunks, time.perf_counter() - started, first_chunk)
+
+    async def achat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        started = time.perf_counter()
+        response = await self.provider.achat(model, messages, **kwargs)
+        self._record(model, messages, kwargs, response, None, time.perf_counter() - started, None)
+        return response
+
+    async def astream_chat(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        chunks, first_chunk = [], None
+        async for chunk in self.provider.astream_chat(model, messages, **kwargs):
+            if isinstance(chunk, TokenUsage):
+                yield chunk
+                continue
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        self._record(model, messages, kwargs, ''.join(chunks), chunks, time.perf_counter() - started, first_chunk)
+
+    def _record(self, model: str, messages: List[Dict], kwargs: Dict, response: str, chunks: Optional[List[str]],
+                latency: float, first_chunk_latency: Optional[float]):
+        try:
+            self.cassette.append({
+                'fingerprint': fingerprint(model, messages, **kwargs),
+                'model': model,
+                'messages': messages,
+                'response': response,
+                'chunks': chunks,
+                'latency': latency,
+                'first_chunk_latency': first_chunk_latency,
+                'recorded_at': time.time(),
+            })
+        except Exception as e:
+            print(f"Error recording LLM response: {str(e)}")
+
+
+class ReplayProvider(LLMProvider):
+    """Serves recorded responses without network access.
+
+    Latency is drawn from LLM_REPLAY_LATENCY and a share LLM_REPLAY_ERROR_RATE
+    of calls fail with one of LLM_REPLAY_ERRORS, raised as the matching openai
+    exception so retries, breakers and fallbacks behave as they would live.
+    Each call's draws are seeded from LLM_REPLAY_SEED, its fingerprint and how
+    often that request was replayed before, so a run is reproducible even when
+    calls interleave across threads. A latency above the call's timeout ends
+    in a timeout error at the timeout.
+    """
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.sample_latency = parse_latency(LLM_REPLAY_LATENCY)
+        self.error_rate = LLM_REPLAY_ERROR_RATE
+        self.error_kinds = [kind.strip() for kind in LLM_REPLAY_ERRORS.split(",") if kind.strip()]
+        for kind in self.error_kinds:
+            injected_error(kind)  # Fail at startup on a misspelled kind
+        self.seed = LLM_REPLAY_SEED
+        self.stub = StubProvider() if LLM_REPLAY_ON_MISS == "stub" else None
+        self._lock = threading.Lock()
+        self._replays = {}  # fingerprint -> times replayed
+        self._hits = 0
+        self._misses = 0
+        self._injected_errors = 0
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        steps, error = self._script(model, messages, kwargs, stream=False)
+        for delay, _ in steps:
+            time.sleep(delay)
+        if error:
+            raise error
+        return ''.join(chunk for _, chunk in steps if chunk is not None)
+
+    def stream_chat(self, model: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        steps, error = self._script(model, messages, kwargs, stream=True)
+        for delay, chunk in steps:
+            time.sleep(delay)
+            if chunk is not None:
+                yield chunk
+        if error:
+            raise error
+
+    async def achat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        steps, error = self._script(model, messages, kwargs, stream=False)
+        for delay, _ in steps:
+            await asyncio.sleep(delay)
+        if error:
+            raise error
+        return ''.join(chunk for _, chunk in steps if chunk is not None)
+
+    async def astream_chat(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        steps, error = self._script(model, messages, kwargs, stream=True)
+        for delay, chunk in steps:
+            await asyncio.sleep(delay)
+            if chunk is not None:
+                yield chunk
+        if error:
+            raise error
+
+    def stats(self) -> dict:
+        """Return replayed, missed and injected-error counts."""
+        with self._lock:
+            return {
+                'recorded': len(self.cassette),
+                'hits': self._hits,
+                'misses': self._misses,
+                'injected_errors': self._injected_errors,
+            }
+
+    def _script(self, model: str, messages: List[Dict], kwargs: Dict,
+                stream: bool) -> Tuple[List[Tuple[float, Optional[str]]], Optional[Exception]]:
+        """Plan a call as (delay, chunk) steps followed by an optional error."""
+        key = fingerprint(model, messages, **kwargs)
+        records = self.cassette.get(key)
+        with self._lock:
+            replayed = self._replays.get(key, 0)
+            self._replays[key] = replayed + 1
+            if records:
+                self._hits += 1
+            else:
+                self._misses += 1
+        if not records:
+            if self.stub is None:
+                raise CassetteMissError(model, key)
+            return [(0.0, self.stub.chat(model, messages, **kwargs))], None
+
+        record = records[replayed % len(records)]
+        rng = random.Random(f"{self.seed}:{key}:{replayed}")
+        latency = max(0.0, self.sample_latency(rng, record['latency']))
+        if self.error_kinds and rng.random() < self.error_rate:
+            with self._lock:
+                self._injected_errors += 1
+            kind = rng.choice(self.error_kinds)
+            # Timeouts take the full latency; other failures return quickly
+            delay = latency if kind == "timeout" else 0.0
+            return [(self._capped(delay, kwargs), None)], injected_error(kind)
+
+        timeout = kwargs.get("timeout")
+        if timeout is not None and latency > timeout:
+            return [(timeout, None)], injected_error("timeout")
+
+        chunks = record['chunks'] if stream and record['chunks'] else [record['response']]
+        first_share = (record['first_chunk_latency'] / record['latency']
+                       if record['first_chunk_latency'] is not None and record['latency'] else 1.0)
+        first = latency * first_share
+        gap = (latency - first) / max(1, len(chunks) - 1)
+        return [(first if i == 0 else gap, chunk) for i, chunk in enumerate(chunks)], None
+
+    @staticmethod
+    def _capped(delay: float, kwargs: Dict) -> float:
+        timeout = kwargs.get("timeout")
+        return min(delay, timeout) if timeout is not None else delay
@@ -0,0 +1,178 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import threading
+import httpx
+import streamlit as st
+from openai import OpenAI, AsyncOpenAI
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+from config.settings import LLM_POOL_SIZE, LLM_KEEPALIVE_SECONDS
+
+class TokenUsage(NamedTuple):
+    """Token counts reported by the API for one request."""
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class Completion(str):
+    """Response text that also carries the `TokenUsage` the API reported, if any."""
+
+    def __new__(cls, text: str, usage: Optional[TokenUsage] = None):
+        completion = super().__new__(cls, text)
+        completion.usage = usage
+        return completion
+
+
+def _usage(response) -> Optional[TokenUsage]:
+    usage = getattr(response, 'usage', None)
+    return TokenUsage(usage.prompt_tokens, usage.completion_tokens) if usage else None
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_loop_closers = []  # coroutine functions awaited on the loop before it stops
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+            atexit.register(_stop_background_loop)
+        return _loop
+
+
+def _stop_background_loop():
+    async def close():
+        for closer in _loop_closers:
+            try:
+                await closer()
+            except Exception as e:
+                print(f"Error closing async LLM client: {str(e)}")
+
+    try:
+        asyncio.run_coroutine_threadsafe(close(), _loop).result(timeout=5)
+    finally:
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+def run_async(coro: Awaitable) -> concurrent.futures.Future:
+    """Run a coroutine on the process-wide LLM event loop and return a future for its result.
+
+    Async LLM calls all share this one long-lived loop, so the pooled async
+    client, whose connections are bound to a loop, is created once instead
+    of per `asyncio.run`. The coroutine runs in a copy of the caller's
+    context, as it would under `asyncio.run`.
+    """
+    loop = _background_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def settle(task: asyncio.Task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def start():
+        # The task copies the current context, which is the caller's here
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(settle)
+
+    loop.call_soon_threadsafe(start)
+    return future
+
+
+class LLMClient:
+    """Process-wide OpenAI client with keep-alive connection pooling.
+
+    Every service shares one instance, so connections (and their TLS sessions)
+    are reused across Streamlit reruns and sessions instead of being rebuilt
+    on every request.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(LLMClient, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, api_key=None):
+        """Create the pooled sync client; the async client is created on first use by `run_async` work."""
+        if not self._initialized:
+            self.api_key = api_key or st.secrets["OPENAI_API_KEY"]
+            self.limits = httpx.Limits(
+                max_connections=LLM_POOL_SIZE,
+                max_keepalive_connections=LLM_POOL_SIZE,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS
+            )
+            # Retries are handled by the resilience layer, not the SDK
+            self.client = OpenAI(
+                api_key=self.api_key,
+                http_client=httpx.Client(limits=self.limits),
+                max_retries=0
+            )
+            # httpx async connections are bound to the loop that opened them
+            self._async = None
+            self._async_lock = threading.Lock()
+            self._initialized = True
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> Completion:
+        """Run a chat completion and return the response text with its token usage."""
+        response = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return Completion(response.choices[0].message.content, _usage(response))
+
+    def stream_chat(self, model: str, messages: List[Dict], **kwargs) -> Iterator[Union[str, TokenUsage]]:
+        """Run a streaming chat completion and yield content fragments as they arrive.
+
+        The token usage is yielded last, as a `TokenUsage`, when the API reports it.
+        """
+        stream = self.client.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    yield _usage(chunk)
+        finally:
+            # Releases the pooled connection when the caller stops reading early
+            stream.close()
+
+    async def achat(self, model: str, messages: List[Dict], **kwargs) -> Completion:
+        """Async variant of `chat`."""
+        response = await self._async_client().chat.completions.create(model=model, messages=messages, **kwargs)
+        return Completion(response.choices[0].message.content, _usage(response))
+
+    async def astream_chat(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[Union[str, TokenUsage]]:
+        """Async variant of `stream_chat`."""
+        stream = await self._async_client().chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    yield _usage(chunk)
+        finally:
+            await stream.close()
+
+    def _async_client(self) -> AsyncOpenAI:
+        if asyncio.get_running_loop() is not _background_loop():
+            raise RuntimeError("Async LLM calls must run on the shared event loop; start them with run_async")
+        with self._async_lock:
+            if self._async is None:
+                self._async = AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=httpx.AsyncClient(limits=self.limits),
+                    max_retries=0
+                )
+                _loop_closers.append(self._async.close)
+            return self._async
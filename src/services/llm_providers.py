@@ -0,0 +1,481 @@
+import abc
+import asyncio
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from services.llm_client import TokenUsage
+from services.llm_scheduler import FairScheduler, background_context
+from services.resilience import ResilienceManager, first_fragment_key
+from services.telemetry import LLMTelemetry, prompt_name, register_stats
+from config.settings import (
+    LLM_PROVIDER,
+    LLM_CASSETTE_PATH,
+    LLM_HEDGING_ENABLED,
+    LLM_HEDGE_DELAY_SECONDS,
+    LLM_HEDGE_MAX_WORKERS,
+)
+
+
+# Marks the end of a hedged stream's fragments
+_STREAM_END = object()
+
+
+def route_options(config) -> dict:
+    """Return the routing options (fallback chain, hedge model) and telemetry name of a prompt config."""
+    if isinstance(config, dict):
+        return {
+            'fallback_models': config.get('fallback_models', []),
+            'hedge_model': config.get('hedge_model'),
+            'prompt': prompt_name(config),
+        }
+    return {
+        'fallback_models': config.fallback_models,
+        'hedge_model': config.hedge_model,
+        'prompt': prompt_name(config),
+    }
+
+
+class LLMProvider(abc.ABC):
+    """Interface every model backend implements; streaming and async default to wrapping `chat`."""
+
+    @abc.abstractmethod
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        """Return the response text of a chat completion."""
+
+    def stream_chat(self, model: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        yield self.chat(model, messages, **kwargs)
+
+    async def achat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        return await asyncio.to_thread(self.chat, model, messages, **kwargs)
+
+    async def astream_chat(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        yield await self.achat(model, messages, **kwargs)
+
+
+class OpenAIProvider(LLMProvider):
+    """Provider backed by the shared, pooled OpenAI client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        return self.client.chat(model, messages, **kwargs)
+
+    def stream_chat(self, model: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        return self.client.stream_chat(model, messages, **kwargs)
+
+    async def achat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        return await self.client.achat(model, messages, **kwargs)
+
+    def astream_chat(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        return self.client.astream_chat(model, messages, **kwargs)
+
+
+class StubProvider(LLMProvider):
+    """Offline provider returning canned, schema-valid responses for local testing.
+
+    JSON configs are answered with every `RESPONSES` key their system prompt
+    names; the refinement texts are recognized by their instructions.
+    """
+
+    REFINED_GOAL = "I will make measurable progress on my goal every week for the next three months."
+    RESPONSES = {
+        "questions": [
+            "Where are you starting from today?",
+            "What has stopped you from reaching this goal before?",
+            "What have you already tried?",
+            "What time, tools and support do you have available?"
+        ],
+        "strategic_initiatives": [
+            "Build the Foundation: Spend the first two weeks setting up a routine and measuring your baseline.",
+            "Make Steady Progress: Over the next two months, increase effort gradually and track weekly results.",
+            "Review and Adjust: Every month, compare progress against your target and adjust the plan."
+        ],
+        "one_time_actions": [
+            "Write down your goal and the date you want to reach it",
+            "Set up a simple tracker for daily progress"
+        ],
+        "habits": [
+            "Spend 10 minutes on the most important task for your goal",
+            "Log today's progress in your tracker",
+            "Plan tomorrow's first step before bed"
+        ],
+        "refined_goal": REFINED_GOAL,
+        "item": "Block 30 minutes in your calendar each week to review progress and plan the next step",
+    }
+    REFINEMENT_QUESTIONS = (
+        "To phrase the goal in more tangible terms, give me a bit more information about what you want to achieve:\n\n"
+        "1. What exactly do you want to have achieved?\n"
+        "2. How will you measure your progress?\n"
+        "3. Why does this goal matter to you?"
+    )
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> str:
+        system_prompt = messages[0]["content"] if messages else ""
+        keys = [key for key in self.RESPONSES if f'"{key}"' in system_prompt]
+        if keys:
+            return json.dumps({key: self.RESPONSES[key] for key in keys})
+        if "Refined goal:" in system_prompt:
+            # Refinement chat: one clarifying question, then a proposal once there is history or a summary
+            if len(messages) <= 2:
+                return "What would achieving this look like in three months, and how will you measure it?"
+            return f"Here is a more specific version of your goal:\nRefined goal: {self.REFINED_GOAL}"
+        if "summarize goal refinement conversations" in system_prompt:
+            return "The user wants to refine their goal and has described what success looks like and how to measure it."
+        if 'starting with "I will..."' in "\n".join(message["content"] for message in messages):
+            return self.REFINED_GOAL
+        return self.REFINEMENT_QUESTIONS
+
+
+class LLMRouter:
+    """Process-wide entry point for model calls.
+
+    Routes each call to the configured provider, walks the per-config fallback
+    chain on errors and, when hedging is enabled, fires a second request to the
+    config's `hedge_model` (which may be the same model) if the first is slower
+    than the model's observed p95. Streams, and sync chats, which are hedged as
+    streams, race to the first fragment; async chats race to the response. The
+    losing request is closed or cancelled. Until enough latencies are recorded,
+    LLM_HEDGE_DELAY_SECONDS is used. Every provider call waits for a
+    `FairScheduler` slot and then goes through the `ResilienceManager`, both
+    keyed by model.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(LLMRouter, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, api_key=None):
+        if not self._initialized:
+            self.provider = self._create_provider(LLM_PROVIDER, api_key)
+            self.resilience = ResilienceManager()
+            self.scheduler = FairScheduler()
+            self.telemetry = LLMTelemetry()
+            self.hedging_enabled = LLM_HEDGING_ENABLED
+            self.hedge_delay = LLM_HEDGE_DELAY_SECONDS
+            self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_MAX_WORKERS, thread_name_prefix="llm-hedge")
+            self._lock = threading.Lock()
+            self._hedges_fired = 0
+            self._hedge_wins = 0
+            self._fallbacks = 0
+            register_stats("llm_router", self.stats)
+            self._initialized = True
+
+    def _create_provider(self, name: str, api_key=None) -> LLMProvider:
+        if name == "stub":
+            return StubProvider()
+        if name == "openai":
+            from services.llm_client import LLMClient
+            return OpenAIProvider(LLMClient(api_key))
+        if name in ("record", "replay"):
+            from services.llm_cassette import Cassette, RecordingProvider, ReplayProvider
+            cassette = Cassette(LLM_CASSETTE_PATH)
+            if name == "replay":
+                return ReplayProvider(cassette)
+            from services.llm_client import LLMClient
+            return RecordingProvider(OpenAIProvider(LLMClient(api_key)), cassette)
+        raise ValueError(f"Unknown LLM provider: {name}")
+
+    def chat(self, model: str, messages: List[Dict], fallback_models: Optional[List[str]] = None,
+             hedge_model: Optional[str] = None, **kwargs) -> str:
+        """Return the response text, hedging the first model and falling back on errors."""
+        last_error = None
+        for attempt, candidate in enumerate([model] + list(fallback_models or [])):
+            if attempt:
+                self._count('_fallbacks')
+            try:
+                if attempt == 0 and self._should_hedge(hedge_model):
+                    return ''.join(self._hedged_stream(candidate, hedge_model, messages, **kwargs))
+                return self._call(candidate, messages, **kwargs)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def stream_chat(self, model: str, messages: List[Dict], fallback_models: Optional[List[str]] = None,
+                    hedge_model: Optional[str] = None, **kwargs) -> Iterator[str]:
+        """Stream response fragments; falls back only if a model fails before its first fragment."""
+        last_error = None
+        for attempt, candidate in enumerate([model] + list(fallback_models or [])):
+            if attempt:
+                self._count('_fallbacks')
+            started = False
+            if attempt == 0 and self._should_hedge(hedge_model):
+                stream = self._hedged_stream(candidate, hedge_model, messages, **kwargs)
+            else:
+                stream = self._stream(candidate, messages, **kwargs)
+            try:
+                for delta in stream:
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+            finally:
+                # Closing this stream closes the provider's, so an abandoned stream frees its slot now
+                stream.close()
+        raise last_error
+
+    async def achat(self, model: str, messages: List[Dict], fallback_models: Optional[List[str]] = None,
+                    hedge_model: Optional[str] = None, **kwargs) -> str:
+        """Async variant of `chat`."""
+        last_error = None
+        for attempt, candidate in enumerate([model] + list(fallback_models or [])):
+            if attempt:
+                self._count('_fallbacks')
+            try:
+                if attempt == 0 and self._should_hedge(hedge_model):
+                    return await self._ahedged_chat(candidate, hedge_model, messages, **kwargs)
+                return await self._acall(candidate, messages, **kwargs)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def astream_chat(self, model: str, messages: List[Dict], fallback_models: Optional[List[str]] = None,
+                           hedge_model: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """Async variant of `stream_chat`."""
+        last_error = None
+        for attempt, candidate in enumerate([model] + list(fallback_models or [])):
+            if attempt:
+                self._count('_fallbacks')
+            started = False
+            if attempt == 0 and self._should_hedge(hedge_model):
+                stream = self._ahedged_stream(candidate, hedge_model, messages, **kwargs)
+            else:
+                stream = self._astream(candidate, messages, **kwargs)
+            try:
+                async for delta in stream:
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+            finally:
+                await stream.aclose()
+        raise last_error
+
+    def stats(self) -> dict:
+        """Return hedging and fallback counters, and the provider's own counters if it keeps any."""
+        with self._lock:
+            stats = {
+                'provider': type(self.provider).__name__,
+                'hedges_fired': self._hedges_fired,
+                'hedge_wins': self._hedge_wins,
+                'fallbacks': self._fallbacks,
+            }
+        if hasattr(self.provider, 'stats'):
+            stats.update(self.provider.stats())
+        return stats
+
+    def _call(self, model: str, messages: List[Dict], prompt: Optional[str] = None, **kwargs) -> str:
+        with self.scheduler.slot(model) as model:
+            call = self.telemetry.start(prompt, model, messages)
+            try:
+                response = self.resilience.call(model, call.wrap(self.provider.chat), model, messages, **kwargs)
+            except Exception as e:
+                call.finish(error=e)
+                raise
+            call.finish(response)
+            return response
+
+    def _stream(self, model: str, messages: List[Dict], prompt: Optional[str] = None, **kwargs) -> Iterator[str]:
+        with self.scheduler.slot(model) as model:
+            call = self.telemetry.start(prompt, model, messages)
+            parts = []
+            deltas = self.resilience.stream(model, call.wrap(self.provider.stream_chat), model, messages, **kwargs)
+            try:
+                for delta in deltas:
+                    if isinstance(delta, TokenUsage):
+                        call.usage = delta
+                        continue
+                    parts.append(delta)
+                    yield delta
+            except Exception as e:
+                call.finish(error=e)
+                raise
+            finally:
+                deltas.close()
+            call.finish(''.join(parts))
+
+    async def _acall(self, model: str, messages: List[Dict], prompt: Optional[str] = None, **kwargs) -> str:
+        async with self.scheduler.aslot(model) as model:
+            call = self.telemetry.start(prompt, model, messages)
+            try:
+                response = await self.resilience.acall(model, call.wrap(self.provider.achat), model, messages, **kwargs)
+            except Exception as e:
+                call.finish(error=e)
+                raise
+            call.finish(response)
+            return response
+
+    async def _astream(self, model: str, messages: List[Dict], prompt: Optional[str] = None,
+                       **kwargs) -> AsyncIterator[str]:
+        async with self.scheduler.aslot(model) as model:
+            call = self.telemetry.start(prompt, model, messages)
+            parts = []
+            deltas = self.resilience.astream(model, call.wrap(self.provider.astream_chat), model, messages, **kwargs)
+            try:
+                async for delta in deltas:
+                    if isinstance(delta, TokenUsage):
+                        call.usage = delta
+                        continue
+                    parts.append(delta)
+                    yield delta
+            except Exception as e:
+                call.finish(error=e)
+                raise
+            finally:
+                await deltas.aclose()
+            call.finish(''.join(parts))
+
+    def _should_hedge(self, hedge_model: Optional[str]) -> bool:
+        return self.hedging_enabled and bool(hedge_model)
+
+    def hedge_delay_for(self, key: str) -> float:
+        """Return the observed p95 latency for `key`, or LLM_HEDGE_DELAY_SECONDS with too few samples."""
+        latency = self.resilience.latency
+        if latency.has_enough_samples(key):
+            return latency.percentile(key, 95)
+        return self.hedge_delay
+
+    def _hedged_stream(self, model: str, hedge_model: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        """Stream from `model`, racing `hedge_model` if no fragment arrives in time; the first to yield wins."""
+        events = queue.Queue()  # (tag, fragment or _STREAM_END, error)
+        stops = {'primary': threading.Event(), 'hedge': threading.Event()}
+
+        def pump(tag: str, candidate: str):
+            stream = self._stream(candidate, messages, **kwargs)
+            try:
+                for delta in stream:
+                    if stops[tag].is_set():
+                        break
+                    events.put((tag, delta, None))
+            except Exception as e:
+                events.put((tag, None, e))
+                return
+            finally:
+                # Closes the HTTP response of a losing or abandoned stream
+                stream.close()
+            events.put((tag, _STREAM_END, None))
+
+        self._executor.submit(background_context().run, pump, 'primary', model)
+        running, winner, hedged, error = {'primary'}, None, False, None
+        try:
+            while True:
+                try:
+                    tag, delta, e = events.get(timeout=None if hedged else self.hedge_delay_for(first_fragment_key(model)))
+                except queue.Empty:
+                    hedged = True
+                    self._count('_hedges_fired')
+                    self._executor.submit(background_context().run, pump, 'hedge', hedge_model)
+                    running.add('hedge')
+                    continue
+                if winner is not None and tag != winner:
+                    continue
+                if e is not None:
+                    running.discard(tag)
+                    error = e
+                    if winner is not None or not running:
+                        raise error
+                    continue
+                if winner is None:
+                    winner = tag
+                    for other in running - {tag}:
+                        stops[other].set()
+                    if tag == 'hedge':
+                        self._count('_hedge_wins')
+                if delta is _STREAM_END:
+                    return
+                yield delta
+        finally:
+            for stop in stops.values():
+                stop.set()
+
+    async def _ahedged_stream(self, model: str, hedge_model: str, messages: List[Dict],
+                              **kwargs) -> AsyncIterator[str]:
+        """Async variant of `_hedged_stream`; the losing stream is cancelled."""
+        events = asyncio.Queue()  # (tag, fragment or _STREAM_END, error)
+
+        async def pump(tag: str, candidate: str):
+            stream = self._astream(candidate, messages, **kwargs)
+            try:
+                async for delta in stream:
+                    await events.put((tag, delta, None))
+            except Exception as e:
+                await events.put((tag, None, e))
+                return
+            finally:
+                await stream.aclose()
+            await events.put((tag, _STREAM_END, None))
+
+        tasks = {'primary': asyncio.ensure_future(pump('primary', model))}
+        running, winner, error = {'primary'}, None, None
+        try:
+            while True:
+                try:
+                    if 'hedge' in tasks:
+                        tag, delta, e = await events.get()
+                    else:
+                        tag, delta, e = await asyncio.wait_for(
+                            events.get(), self.hedge_delay_for(first_fragment_key(model))
+                        )
+                except asyncio.TimeoutError:
+                    self._count('_hedges_fired')
+                    tasks['hedge'] = asyncio.ensure_future(pump('hedge', hedge_model))
+                    running.add('hedge')
+                    continue
+                if winner is not None and tag != winner:
+                    continue
+                if e is not None:
+                    running.discard(tag)
+                    error = e
+                    if winner is not None or not running:
+                        raise error
+                    continue
+                if winner is None:
+                    winner = tag
+                    for other, task in tasks.items():
+                        if other != tag:
+                            task.cancel()
+                    if tag == 'hedge':
+                        self._count('_hedge_wins')
+                if delta is _STREAM_END:
+                    return
+                yield delta
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _ahedged_chat(self, model: str, hedge_model: str, messages: List[Dict], **kwargs) -> str:
+        primary = asyncio.ensure_future(self._acall(model, messages, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay_for(model))
+        if done:
+            return primary.result()
+
+        self._count('_hedges_fired')
+        hedge = asyncio.ensure_future(self._acall(hedge_model, messages, **kwargs))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if task is hedge:
+                        self._count('_hedge_wins')
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+from config.settings import (
+    LLM_DEFAULT_MODEL_CONCURRENCY,
+    LLM_MODEL_CONCURRENCY,
+    LLM_QUEUE_DOWNGRADE_THRESHOLD,
+    LLM_DOWNGRADE_MODELS,
+    LLM_SCHEDULER_TIER_WEIGHTS,
+)
+from services.telemetry import register_stats
+
+INTERACTIVE = "interactive"
+# (session_id, on_queued, weight) for the code currently issuing LLM calls
+_scheduling = contextvars.ContextVar("llm_scheduling", default=("anonymous", None, 1.0))
+
+
+def parse_mapping(text: str) -> Dict[str, str]:
+    """Parse "key:value,key:value" settings into a dict."""
+    pairs = [item.split(":", 1) for item in text.split(",") if ":" in item]
+    return {key.strip(): value.strip() for key, value in pairs}
+
+
+def tier_weight(tier: str) -> float:
+    """Return the fair-queuing weight of a request tier from LLM_SCHEDULER_TIER_WEIGHTS (1.0 if unset)."""
+    return float(parse_mapping(LLM_SCHEDULER_TIER_WEIGHTS).get(tier, 1.0))
+
+
+@contextmanager
+def scheduling(session_id: str, on_queued: Optional[Callable[[int], None]] = None, tier: str = INTERACTIVE):
+    """Attribute LLM calls made in this context to a session and a tier.
+
+    `on_queued(position)` is called while a request waits for capacity, and
+    with 0 once it is dispatched. The tier sets the requests' weight, so e.g.
+    speculative "prefetch" or "deferred" work yields to "interactive" requests.
+    """
+    token = _scheduling.set((session_id, on_queued, tier_weight(tier)))
+    try:
+        yield
+    finally:
+        _scheduling.reset(token)
+
+
+def current_session_id() -> str:
+    """Return the session LLM calls in this context are attributed to ("anonymous" outside `scheduling`)."""
+    return _scheduling.get()[0]
+
+
+def background_context() -> contextvars.Context:
+    """Copy the scheduling context for work handed to another thread, minus the UI listener."""
+    session_id, _, weight = _scheduling.get()
+    context = contextvars.copy_context()
+    context.run(_scheduling.set, (session_id, None, weight))
+    return context
+
+
+class _Ticket:
+    def __init__(self, tag: float, sequence: int, session_id: str, lock: threading.Lock):
+        self.tag = tag
+        self.sequence = sequence  # FIFO among equal tags
+        self.session_id = session_id
+        self.ready = threading.Condition(lock)
+        self.cancelled = False
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.tag, self.sequence) < (other.tag, other.sequence)
+
+
+class FairScheduler:
+    """Process-wide concurrency cap per model with weighted fair queuing across sessions.
+
+    Each request gets a virtual finish tag 1/weight after the later of the
+    model's virtual time and its session's previous tag, so a burst from one
+    session cannot starve others and lower-weight tiers get a smaller share.
+    Waiting requests sit in a heap by tag; only the head is woken when a slot
+    frees up. When a model's queue grows past LLM_QUEUE_DOWNGRADE_THRESHOLD,
+    new requests are moved to its configured cheaper model.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FairScheduler, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.limits = {model: int(limit) for model, limit in parse_mapping(LLM_MODEL_CONCURRENCY).items()}
+        self.downgrades = parse_mapping(LLM_DOWNGRADE_MODELS)
+        self.downgrade_threshold = LLM_QUEUE_DOWNGRADE_THRESHOLD
+        self._lock = threading.Lock()
+        self._active = {}
+        self._queues = {}  # model -> heap of tickets, cancelled ones removed lazily
+        self._waiting = {}  # model -> tickets in the heap that are not cancelled
+        self._sequence = itertools.count()
+        self._virtual_time = {}
+        self._session_tags = {}
+        self._downgraded = 0
+        self._max_depth = 0
+        register_stats("llm_scheduler", self.stats)
+
+    def limit(self, model: str) -> int:
+        return self.limits.get(model, LLM_DEFAULT_MODEL_CONCURRENCY)
+
+    def acquire(self, model: str) -> str:
+        """Block until a slot is free; returns the model to use (possibly downgraded)."""
+        session_id, on_queued, weight = _scheduling.get()
+        last_position = None
+        with self._lock:
+            if (self.downgrade_threshold and model in self.downgrades
+                    and self._waiting.get(model, 0) >= self.downgrade_threshold):
+                model = self.downgrades[model]
+                self._downgraded += 1
+
+            queue = self._queues.setdefault(model, [])
+            start = max(self._virtual_time.get(model, 0.0), self._session_tags.get((model, session_id), 0.0))
+            ticket = _Ticket(start + 1.0 / weight, next(self._sequence), session_id, self._lock)
+            self._session_tags[(model, session_id)] = ticket.tag
+            heapq.heappush(queue, ticket)
+            self._waiting[model] = self._waiting.get(model, 0) + 1
+            self._max_depth = max(self._max_depth, self._waiting[model])
+
+            try:
+                while not (self._head(model) is ticket and self._active.get(model, 0) < self.limit(model)):
+                    if on_queued:
+                        position = self._position(model, ticket)
+                        if position != last_position:
+                            last_position = position
+                            self._lock.release()
+                            try:
+                                on_queued(position)
+                            finally:
+                                self._lock.acquire()
+                            continue
+                    # Woken when this ticket reaches the head with a free slot; the timeout refreshes positions
+                    ticket.ready.wait(timeout=1.0)
+            except BaseException:
+                # Interrupted while waiting (e.g. a Streamlit rerun): give up the place in line
+                ticket.cancelled = True
+                self._waiting[model] -= 1
+                self._wake_next(model)
+                raise
+
+            heapq.heappop(queue)
+            self._waiting[model] -= 1
+            self._active[model] = self._active.get(model, 0) + 1
+            self._virtual_time[model] = ticket.tag
+            if not self._waiting[model]:
+                # Nothing waiting: forget per-session tags so idle sessions start fresh
+                self._session_tags = {key: tag for key, tag in self._session_tags.items() if key[0] != model}
+            # A slot may still be free for the next in line
+            self._wake_next(model)
+        if on_queued and last_position:
+            on_queued(0)
+        return model
+
+    def release(self, model: str):
+        with self._lock:
+            self._active[model] -= 1
+            self._wake_next(model)
+
+    def _head(self, model: str) -> Optional[_Ticket]:
+        queue = self._queues.get(model)
+        while queue and queue[0].cancelled:
+            heapq.heappop(queue)
+        return queue[0] if queue else None
+
+    def _wake_next(self, model: str):
+        head = self._head(model)
+        if head is not None and self._active.get(model, 0) < self.limit(model):
+            head.ready.notify()
+
+    def _position(self, model: str, ticket: _Ticket) -> int:
+        # O(queue length), only for requests that report their position
+        return 1 + sum(1 for other in self._queues[model] if not other.cancelled and other < ticket)
+
+    @contextmanager
+    def slot(self, model: str):
+        """Hold a concurrency slot for `model`; yields the model to use."""
+        model = self.acquire(model)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    @asynccontextmanager
+    async def aslot(self, model: str):
+        """Async variant of `slot`; waiting happens off the event loop."""
+        waiter = asyncio.ensure_future(asyncio.to_thread(background_context().run, self.acquire, model))
+        try:
+            model = await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # The thread may still get a slot after we stop waiting; hand it back
+            waiter.add_done_callback(
+                lambda done: done.cancelled() or done.exception() or self.release(done.result())
+            )
+            raise
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def queue_depth(self, model: str) -> int:
+        with self._lock:
+            return self._waiting.get(model, 0)
+
+    def stats(self) -> dict:
+        """Return per-model active and queued requests plus downgrade counters."""
+        with self._lock:
+            models = set(self._active) | set(self._queues)
+            return {
+                'downgraded': self._downgraded,
+                'max_queue_depth': self._max_depth,
+                'models': {
+                    model: {
+                        'active': self._active.get(model, 0),
+                        'queued': self._waiting.get(model, 0),
+                        'limit': self.limit(model),
+                    }
+                    for model in sorted(models)
+                },
+            }
@@ -1,12 +1,71 @@
+import asyncio
 import openai
 import streamlit as st
-from typing import List, Dict, Optional
+from contextlib import closing
+from typing import Callable, List, Dict, Optional
 from pydantic import BaseModel, Field
 import json
-import os
-from pathlib import Path
-from config.prompts import QUESTIONS_CONFIG, PLAN_CONFIG
+import queue
+from config.prompts import (
+    PromptConfig,
+    QUESTIONS_CONFIG,
+    PLAN_CONFIG,
+    PLAN_SECTION_CONFIGS,
+    ONESHOT_REFINEMENT_CONFIG,
+    CATEGORY_QUESTION_BANKS,
+    PLAN_SECTION_REGENERATION_USER_PROMPT,
+    PLAN_ITEM_REGENERATION_CONFIG,
+)
+from config.settings import PLAN_GENERATION_MODE
 from services.security_service import SecurityService
+from services.llm_cache import ResponseCache, make_cache_key
+from services.llm_client import run_async
+from services.llm_providers import LLMRouter, route_options
+from services.prompt_registry import PromptRegistry
+from services.llm_scheduler import scheduling
+from services.prefetch_service import PrefetchService
+from services.resilience import CircuitOpenError
+from services.single_flight import SingleFlight
+from services.streaming import IncrementalJSONParser
+from services.json_repair import ResponseRepairer, UnsalvageableResponse, ValidatedElements
+from services.goal_classifier import GoalClassifier
+from services.job_service import JobService
+
+PLAN_SECTIONS = ('strategic_initiatives', 'one_time_actions', 'habits')
+
+# Key of each section in the plan dicts returned by fetch_plan
+PLAN_KEYS = {'strategic_initiatives': 'initiatives', 'one_time_actions': 'one_time_actions', 'habits': 'habits'}
+
+# Generic items used to pad a plan section the model returned too few items for
+PLAN_FILLERS = {
+    'strategic_initiatives': [
+        "Break the goal into monthly milestones and review progress at the end of each month",
+        "Identify the skills or resources you are missing and plan how to get them",
+        "Find an accountability partner or community working toward a similar goal",
+    ],
+    'one_time_actions': [
+        "Write down your goal and the reason it matters to you",
+        "Block recurring time in your calendar dedicated to this goal",
+    ],
+    'habits': [
+        "Spend 5 minutes each morning reviewing your goal and today's next step",
+        "Log one thing you did toward your goal before going to bed",
+        "Take a short weekly look at what worked and what to adjust",
+    ],
+}
+
+class QuestionSet(BaseModel):
+    """Schema for the questions response."""
+    questions: List[str] = Field(min_items=1, max_items=4)
+
+class PlanItem(BaseModel):
+    """Schema for a single regenerated plan item."""
+    item: str
+
+class RefinedGoal(BaseModel):
+    """Schema for the one-shot refinement response."""
+    refined_goal: str
+    questions: List[str] = Field(min_items=1, max_items=4)
 
 class GoalPlan(BaseModel):
     """Schema for the goal plan response."""
@@ -30,11 +89,159 @@ class OpenAIService:
     def __init__(self, api_key=None):
         """Initialize OpenAI service with API key."""
         self.security = SecurityService()
-        api_key = api_key or st.secrets["OPENAI_API_KEY"]
-        openai.api_key = api_key
+        self.cache = ResponseCache()
+        self.llm = LLMRouter(api_key)
+        self.prefetch = PrefetchService()
+        self.single_flight = SingleFlight()
+        self.repairer = ResponseRepairer()
+        self.classifier = GoalClassifier()
+        self.jobs = JobService()
+        self.prompts = PromptRegistry()
+
+    def _complete(self, config: PromptConfig, messages: List[Dict], parser: Optional[IncrementalJSONParser] = None,
+                  on_element: Optional[Callable] = None) -> str:
+        """Run a chat completion, streaming parsed array elements to `on_element` when given."""
+        if on_element is None:
+            return self.llm.chat(config.model, messages, **route_options(config))
+        parts = []
+        # Closed explicitly so a caller that stops early (an error, a rerun) frees the scheduler slot now
+        with closing(self.llm.stream_chat(config.model, messages, **route_options(config))) as stream:
+            for delta in stream:
+                parts.append(delta)
+                self._emit_elements(parser, delta, on_element)
+        return ''.join(parts)
+
+    async def _acomplete(self, config: PromptConfig, messages: List[Dict], parser: Optional[IncrementalJSONParser] = None,
+                         on_element: Optional[Callable] = None) -> str:
+        """Async variant of `_complete`."""
+        if on_element is None:
+            return await self.llm.achat(config.model, messages, **route_options(config))
+        parts = []
+        stream = self.llm.astream_chat(config.model, messages, **route_options(config))
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                self._emit_elements(parser, delta, on_element)
+        finally:
+            await stream.aclose()
+        return ''.join(parts)
+
+    def _emit_elements(self, parser: IncrementalJSONParser, text: str, on_element: Callable):
+        for key, element in parser.feed(text):
+            on_element(key, element)
+
+    def _fetch_json(self, config: PromptConfig, messages: List[Dict], cache_key: str, parser: IncrementalJSONParser,
+                    on_element: Optional[Callable] = None, **repair) -> Dict:
+        """Fetch a JSON response through the cache and single-flight, repairing it before use.
+
+        `repair` is passed to `ResponseRepairer.parse`, and streamed elements are
+        validated the same way before `on_element` sees them. Only a response that
+        cannot be salvaged is requested again, once and without streaming.
+        """
+        on_element = ValidatedElements(on_element, parser.array_keys, repair.get('model_cls')) if on_element else None
+        for attempt in range(2):
+            content = self.cache.get(cache_key)
+            replay = content is not None
+            if content is None:
+                # Identical concurrent requests share one upstream call
+                content, replay = self.single_flight.do(
+                    cache_key, self._complete, config, messages, parser, on_element
+                )
+            data = self._accept_response(config, cache_key, parser, content, replay, on_element, attempt == 1, **repair)
+            if data is not None:
+                return data
+            on_element = None
 
-    def generate_questions(self, goal: str) -> List[str]:
-        """Generate relevant questions based on the user's goal."""
+    async def _afetch_json(self, config: PromptConfig, messages: List[Dict], cache_key: str,
+                           parser: IncrementalJSONParser, on_element: Optional[Callable] = None, **repair) -> Dict:
+        """Async variant of `_fetch_json`."""
+        on_element = ValidatedElements(on_element, parser.array_keys, repair.get('model_cls')) if on_element else None
+        for attempt in range(2):
+            content = self.cache.get(cache_key)
+            replay = content is not None
+            if content is None:
+                content, replay = await self.single_flight.ado(
+                    cache_key, self._acomplete, config, messages, parser, on_element
+                )
+            data = self._accept_response(config, cache_key, parser, content, replay, on_element, attempt == 1, **repair)
+            if data is not None:
+                return data
+            on_element = None
+
+    def _accept_response(self, config: PromptConfig, cache_key: str, parser: IncrementalJSONParser, content: str,
+                         replay: bool, on_element: Optional[ValidatedElements], last_attempt: bool,
+                         **repair) -> Optional[Dict]:
+        """Repair, record and cache a response; returns None when it should be requested again."""
+        if replay and on_element:
+            self._emit_elements(parser, content, on_element)
+        try:
+            data = self.repairer.parse(content, **repair)
+        except UnsalvageableResponse:
+            if not replay:
+                self.prompts.record_parse(config, failed=True)
+            if last_attempt:
+                raise
+            return None
+        if not replay:
+            self.prompts.record_parse(config, failed=False)
+        self.cache.set(cache_key, json.dumps(data))
+        if on_element:
+            # Items validation added, e.g. fillers for a short list
+            on_element.finish(data)
+        return data
+
+    def fetch_questions(self, goal: str, on_question: Optional[Callable[[str], None]] = None) -> List[str]:
+        """Generate questions for an already-sanitized goal without touching the UI.
+
+        Safe to call from background threads. API errors propagate to the caller
+        and a response that cannot be repaired raises `UnsalvageableResponse`.
+        Goals the local classifier recognizes get their category's question bank
+        without a request.
+        """
+        category = self.classifier.classify(goal)
+        if category:
+            questions = list(CATEGORY_QUESTION_BANKS[category])
+            if on_question:
+                for question in questions:
+                    on_question(question)
+            return questions
+
+        parser = IncrementalJSONParser(["questions"])
+        on_element = (lambda key, question: on_question(question)) if on_question else None
+        config = self.prompts.resolve(QUESTIONS_CONFIG)
+        response_data = self._fetch_json(
+            config,
+            [
+                {"role": "system", "content": config.system_prompt},
+                {"role": "user", "content": config.user_prompt_template.format(goal=goal)}
+            ],
+            make_cache_key(config.model, config, goal),
+            parser,
+            on_element,
+            model_cls=QuestionSet
+        )
+        return response_data["questions"]
+
+    def prefetch_questions(self, goal: str, session_id: str):
+        """Speculatively start generating questions for a goal in the background."""
+        goal = self.security.sanitize_input(goal)
+        if goal:
+            with scheduling(session_id, tier="prefetch"):
+                self.prefetch.start(session_id, 'questions', goal, self.fetch_questions, goal)
+
+    def cancel_prefetched_questions(self, session_id: str):
+        """Cancel or discard speculative question generation that will not be used."""
+        self.prefetch.discard(session_id, 'questions')
+
+    def generate_questions(self, goal: str, on_question: Optional[Callable[[str], None]] = None,
+                           session_id: Optional[str] = None) -> List[str]:
+        """Generate relevant questions based on the user's goal.
+
+        When `on_question` is given, the response is streamed and each question
+        is passed to it as soon as it has been generated. When `session_id` is
+        given, a matching speculative request started by `prefetch_questions`
+        is used instead of a new one, whether it has finished or is in flight.
+        """
         try:
             # Check rate limit using session ID
             if self.security.is_rate_limited(str(id(st.session_state))):
@@ -47,46 +254,158 @@ class OpenAIService:
                 st.error("Invalid input provided")
                 return []
             
-            response = openai.ChatCompletion.create(
-                model=QUESTIONS_CONFIG.model,
-                messages=[
-                    {"role": "system", "content": QUESTIONS_CONFIG.system_prompt},
-                    {"role": "user", "content": QUESTIONS_CONFIG.user_prompt_template.format(goal=goal)}
-                ]
-            )
-            
-            try:
-                # Parse JSON response
-                response_data = json.loads(response.choices[0].message.content)
-                questions = response_data.get("questions", [])
-                return questions[:4]
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
-                st.error("Error processing OpenAI response. Please try again.")
-                return []
-                
-        except openai.error.APIError as e:
-            st.error("OpenAI API error. Please try again in a few moments.")
-            return []
-        except openai.error.Timeout as e:
-            st.error("Request timed out. Please try again.")
-            return []
-        except openai.error.RateLimitError as e:
-            st.error("Rate limit exceeded. Please try again in a few moments.")
-            return []
-        except openai.error.APIConnectionError as e:
-            st.error("""
-                Unable to connect to OpenAI. Please check your internet connection and try:
-                1. Refreshing the page
-                2. Checking if you're connected to the internet
-                3. Waiting a few moments and trying again
-            """)
-            return []
+            prefetched = self.prefetch.take(session_id, 'questions', goal) if session_id else None
+            if prefetched is None:
+                return self.fetch_questions(goal, on_question)
+
+            questions = prefetched.result()
+            if on_question:
+                for question in questions:
+                    on_question(question)
+            return questions
+
         except Exception as e:
-            st.error(f"An unexpected error occurred. Please try again.")
+            st.error(self.error_message(e))
             return []
 
-    def generate_plan(self, goal: str, questions: List[str], answers: List[str]) -> Optional[Dict]:
-        """Generate a personalized action plan based on the user's goal and answers."""
+    def fetch_refined_goal_and_questions(self, initial_goal: str, user_responses: str,
+                                         on_question: Optional[Callable[[str], None]] = None) -> RefinedGoal:
+        """Refine a goal and generate its plan questions in one request, without touching the UI.
+
+        Inputs must already be sanitized. API errors propagate and a response
+        that cannot be repaired raises `UnsalvageableResponse`.
+        """
+        parser = IncrementalJSONParser(["questions"])
+        on_element = (lambda key, question: on_question(question)) if on_question else None
+        config = self.prompts.resolve(ONESHOT_REFINEMENT_CONFIG)
+        response_data = self._fetch_json(
+            config,
+            [
+                {"role": "system", "content": config.system_prompt},
+                {"role": "user", "content": config.user_prompt_template.format(
+                    goal=initial_goal,
+                    responses=user_responses
+                )}
+            ],
+            make_cache_key(config.model, config, initial_goal, user_responses),
+            parser,
+            on_element,
+            model_cls=RefinedGoal
+        )
+        return RefinedGoal(**response_data)
+
+    def generate_refined_goal_and_questions(self, initial_goal: str, user_responses: str,
+                                            on_question: Optional[Callable[[str], None]] = None) -> Optional[RefinedGoal]:
+        """Refine a goal and generate its plan questions in one request (the "oneshot" pipeline).
+
+        Replaces the separate refined-goal and question requests. `on_question`
+        streams questions the same way as in `generate_questions`.
+        """
+        try:
+            # Check rate limit using session ID
+            if self.security.is_rate_limited(str(id(st.session_state))):
+                st.error("Rate limit exceeded. Please try again later.")
+                return None
+
+            initial_goal = self.security.sanitize_input(initial_goal)
+            user_responses = self.security.sanitize_input(user_responses)
+            if not all([initial_goal, user_responses]):
+                st.error("Invalid input provided")
+                return None
+
+            return self.fetch_refined_goal_and_questions(initial_goal, user_responses, on_question)
+
+        except Exception as e:
+            st.error(self.error_message(e))
+            return None
+
+    def fetch_plan(self, goal: str, questions: List[str], answers: List[str],
+                   on_item: Optional[Callable[[str, str], None]] = None, mode: Optional[str] = None) -> Dict:
+        """Generate and validate a plan for already-sanitized inputs without touching the UI.
+
+        `mode` is "single" (one request for the whole plan) or "sectioned" (one
+        concurrent request per plan section); it defaults to PLAN_GENERATION_MODE.
+        Malformed JSON is repaired and section lists are truncated or padded to the
+        `GoalPlan` bounds. API errors propagate, and a response that cannot be
+        salvaged even after one re-request raises `UnsalvageableResponse`.
+        """
+        # Combine questions and answers
+        qa_pairs = [f"Q: {q}\nA: {a}" for q, a in zip(questions, answers)]
+        qa_text = "\n\n".join(qa_pairs)
+
+        if (mode or PLAN_GENERATION_MODE) == "sectioned":
+            events = queue.Queue()
+            future = run_async(self._fetch_plan_sections(
+                goal, questions, answers, qa_text,
+                (lambda section, item: events.put((section, item))) if on_item else None
+            ))
+            future.add_done_callback(lambda _: events.put(None))
+            # Items arrive on the event loop thread; render them on this one, which owns the UI
+            for section, item in iter(events.get, None):
+                on_item(section, item)
+            plan = future.result()
+        else:
+            config = self.prompts.resolve(PLAN_CONFIG)
+            response_data = self._fetch_json(
+                config,
+                [
+                    {"role": "system", "content": config.system_prompt},
+                    {"role": "user", "content": config.user_prompt_template.format(
+                        goal=goal,
+                        answers=qa_text
+                    )}
+                ],
+                make_cache_key(config.model, config, goal, questions, answers),
+                IncrementalJSONParser(PLAN_SECTIONS),
+                on_item,
+                model_cls=GoalPlan,
+                fillers=PLAN_FILLERS
+            )
+            # Validate the repaired response
+            plan = GoalPlan(**response_data)
+
+        self.prompts.record_completion()
+        return {
+            'goal': goal,
+            'questions': questions,
+            'answers': answers,
+            'initiatives': '\n'.join(plan.strategic_initiatives),
+            'one_time_actions': '\n'.join(plan.one_time_actions),
+            'habits': '\n'.join(plan.habits)
+        }
+
+    async def _fetch_plan_sections(self, goal: str, questions: List[str], answers: List[str], qa_text: str,
+                                   on_item: Optional[Callable[[str, str], None]] = None) -> GoalPlan:
+        """Request each plan section concurrently and merge the results into one `GoalPlan`."""
+        async def fetch_section(section: str, config: PromptConfig):
+            response_data = await self._afetch_json(
+                config,
+                [
+                    {"role": "system", "content": config.system_prompt},
+                    {"role": "user", "content": config.user_prompt_template.format(goal=goal, answers=qa_text)}
+                ],
+                make_cache_key(config.model, config, goal, questions, answers),
+                IncrementalJSONParser([section]),
+                on_item,
+                model_cls=GoalPlan,
+                fillers=PLAN_FILLERS,
+                fields=[section]
+            )
+            return section, response_data[section]
+
+        results = await asyncio.gather(*(
+            fetch_section(section, self.prompts.resolve(config)) for section, config in PLAN_SECTION_CONFIGS.items()
+        ))
+        return GoalPlan(**dict(results))
+
+    def generate_plan(self, goal: str, questions: List[str], answers: List[str],
+                      on_item: Optional[Callable[[str, str], None]] = None) -> Optional[Dict]:
+        """Generate a personalized action plan based on the user's goal and answers.
+
+        When `on_item` is given, the response is streamed and `on_item(section, item)`
+        is called for each initiative, one-time action and habit as soon as it is
+        complete. The returned plan is still validated against `GoalPlan`.
+        """
         try:
             # Check rate limit using session ID
             if self.security.is_rate_limited(str(id(st.session_state))):
@@ -101,56 +420,154 @@ class OpenAIService:
             if not all([goal, questions, answers]):
                 st.error("Invalid input provided")
                 return None
-                
-            # Combine questions and answers
-            qa_pairs = [f"Q: {q}\nA: {a}" for q, a in zip(questions, answers)]
-            qa_text = "\n\n".join(qa_pairs)
-            
-            response = openai.ChatCompletion.create(
-                model=PLAN_CONFIG.model,
-                messages=[
-                    {"role": "system", "content": PLAN_CONFIG.system_prompt},
-                    {"role": "user", "content": PLAN_CONFIG.user_prompt_template.format(
-                        goal=goal,
-                        answers=qa_text
-                    )}
-                ]
-            )
             
-            try:
-                # Parse and validate response
-                response_data = json.loads(response.choices[0].message.content)
-                plan = GoalPlan(**response_data)
-                
-                return {
-                    'goal': goal,
-                    'questions': questions,
-                    'answers': answers,
-                    'initiatives': '\n'.join(plan.strategic_initiatives),
-                    'one_time_actions': '\n'.join(plan.one_time_actions),
-                    'habits': '\n'.join(plan.habits)
-                }
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
-                st.error("Error processing the plan. Please try again.")
-                return None
-                
-        except openai.error.APIError as e:
-            st.error("OpenAI API error. Please try again in a few moments.")
-            return None
-        except openai.error.Timeout as e:
-            st.error("Request timed out. Please try again.")
+            return self.fetch_plan(goal, questions, answers, on_item)
+
+        except Exception as e:
+            st.error(self.error_message(e))
             return None
-        except openai.error.RateLimitError as e:
-            st.error("Rate limit exceeded. Please try again in a few moments.")
+
+    def start_plan_job(self, goal: str, questions: List[str], answers: List[str], session_id: str) -> Optional[str]:
+        """Start generating a plan in a background job; returns the job id, or None if the inputs are rejected.
+
+        Poll the job with `JobService().get(job_id)`: streamed `(section, item)`
+        pairs collect in `job.progress` and the plan dict becomes `job.result`.
+        On failure, `error_message(job.error)` describes the error for the user.
+        """
+        # Check rate limit using session ID
+        if self.security.is_rate_limited(str(id(st.session_state))):
+            st.error("Rate limit exceeded. Please try again later.")
             return None
-        except openai.error.APIConnectionError as e:
-            st.error("""
-                Unable to connect to OpenAI. Please check your internet connection and try:
-                1. Refreshing the page
-                2. Checking if you're connected to the internet
-                3. Waiting a few moments and trying again
-            """)
+
+        goal = self.security.sanitize_input(goal)
+        questions = [self.security.sanitize_input(q) for q in questions]
+        answers = [self.security.sanitize_input(a) for a in answers]
+        if not all([goal, questions, answers]):
+            st.error("Invalid input provided")
             return None
+
+        job = self.jobs.submit(
+            session_id,
+            'plan',
+            lambda job: self.fetch_plan(goal, questions, answers, on_item=lambda section, item: job.report((section, item)))
+        )
+        return job.id
+
+    @staticmethod
+    def error_message(error: Exception) -> str:
+        """Describe an error from a `fetch_*` call for the user; every `generate_*` entry point reports errors with it."""
+        if isinstance(error, CircuitOpenError):
+            return f"Our AI provider is having trouble right now. Please try again in {error.retry_after:.0f} seconds."
+        if isinstance(error, openai.APITimeoutError):
+            return "Request timed out. Please try again."
+        if isinstance(error, openai.RateLimitError):
+            return "Rate limit exceeded. Please try again in a few moments."
+        if isinstance(error, openai.APIConnectionError):
+            return "Unable to connect to OpenAI. Please check your internet connection and try again."
+        if isinstance(error, openai.APIError):
+            return "OpenAI API error. Please try again in a few moments."
+        if isinstance(error, (UnsalvageableResponse, ValueError, KeyError, TypeError, IndexError, AttributeError)):
+            return "Error processing the AI response. Please try again."
+        return "An unexpected error occurred. Please try again."
+
+    def _plan_text(self, plan: Dict, exclude: Optional[str] = None) -> str:
+        """Format the sections of a plan dict as prompt context, optionally leaving one out."""
+        return "\n\n".join(
+            f"{section.replace('_', ' ').title()}:\n{plan[key]}"
+            for section, key in PLAN_KEYS.items() if section != exclude
+        )
+
+    def fetch_section_items(self, goal: str, questions: List[str], answers: List[str], plan: Dict, section: str,
+                            feedback: str = "", on_item: Optional[Callable[[str, str], None]] = None) -> List[str]:
+        """Regenerate one section of an existing plan for already-sanitized inputs without touching the UI.
+
+        Only the section is generated; the rest of the plan is sent as context.
+        Lists are coerced to the `GoalPlan` bounds for the section.
+        """
+        config = self.prompts.resolve(PLAN_SECTION_CONFIGS[section])
+        qa_text = "\n\n".join(f"Q: {q}\nA: {a}" for q, a in zip(questions, answers))
+        context = self._plan_text(plan, exclude=section)
+        response_data = self._fetch_json(
+            config,
+            [
+                {"role": "system", "content": config.system_prompt},
+                {"role": "user", "content": PLAN_SECTION_REGENERATION_USER_PROMPT.format(
+                    goal=goal,
+                    answers=qa_text,
+                    plan=context,
+                    current_items=plan[PLAN_KEYS[section]],
+                    feedback=feedback or "None"
+                )}
+            ],
+            make_cache_key(config.model, config, goal, questions, answers, context, plan[PLAN_KEYS[section]], feedback),
+            IncrementalJSONParser([section]),
+            on_item,
+            model_cls=GoalPlan,
+            fillers=PLAN_FILLERS,
+            fields=[section]
+        )
+        return response_data[section]
+
+    def fetch_plan_item(self, goal: str, questions: List[str], answers: List[str], plan: Dict, section: str,
+                        item: str, feedback: str = "") -> str:
+        """Generate a replacement for one item of a plan section without touching the UI."""
+        qa_text = "\n\n".join(f"Q: {q}\nA: {a}" for q, a in zip(questions, answers))
+        context = self._plan_text(plan)
+        config = self.prompts.resolve(PLAN_ITEM_REGENERATION_CONFIG)
+        response_data = self._fetch_json(
+            config,
+            [
+                {"role": "system", "content": config.system_prompt},
+                {"role": "user", "content": config.user_prompt_template.format(
+                    goal=goal,
+                    answers=qa_text,
+                    plan=context,
+                    section=section.replace('_', ' '),
+                    item=item,
+                    feedback=feedback or "None"
+                )}
+            ],
+            make_cache_key(config.model, config, goal, questions, answers, context, section, item, feedback),
+            IncrementalJSONParser([])
+        )
+        return PlanItem(**response_data).item
+
+    def regenerate_section(self, plan: Dict, section: str, answers: Optional[List[str]] = None, feedback: str = "",
+                           item_index: Optional[int] = None,
+                           on_item: Optional[Callable[[str, str], None]] = None) -> Optional[Dict]:
+        """Regenerate one section of a plan, or one item of it, leaving the rest of the plan untouched.
+
+        `section` is one of PLAN_SECTIONS. `answers` replaces the plan's answers
+        when they have been edited, and `feedback` is the user's note on what to
+        change. With `item_index`, only that item of the section is replaced.
+        `on_item` streams new section items as in `generate_plan`. Returns an
+        updated copy of `plan`, or None on error.
+        """
+        try:
+            # Check rate limit using session ID
+            if self.security.is_rate_limited(str(id(st.session_state))):
+                st.error("Rate limit exceeded. Please try again later.")
+                return None
+
+            goal = self.security.sanitize_input(plan['goal'])
+            questions = [self.security.sanitize_input(q) for q in plan['questions']]
+            answers = [self.security.sanitize_input(a) for a in (answers if answers is not None else plan['answers'])]
+            feedback = self.security.sanitize_input(feedback) if feedback else ""
+
+            if not all([goal, questions, answers]) or section not in PLAN_KEYS:
+                st.error("Invalid input provided")
+                return None
+
+            items = [item for item in plan[PLAN_KEYS[section]].split('\n') if item.strip()]
+            if item_index is None:
+                items = self.fetch_section_items(goal, questions, answers, plan, section, feedback, on_item)
+            else:
+                items[item_index] = self.fetch_plan_item(
+                    goal, questions, answers, plan, section, items[item_index], feedback
+                )
+
+            return {**plan, 'answers': answers, PLAN_KEYS[section]: '\n'.join(items)}
+
         except Exception as e:
-            st.error(f"An unexpected error occurred. Please try again.")
+            st.error(self.error_message(e))
             return None
@@ -0,0 +1,203 @@
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Callable, Iterable, List, Tuple
+import numpy as np
+from config.settings import PLAN_INDEX_DIMENSIONS, PLAN_INDEX_PATH, PLAN_INDEX_SYNC_SECONDS
+from services.telemetry import register_stats
+
+_WORD_PATTERN = re.compile(r"[a-z0-9$]+")
+_STOP_WORDS = frozenset(
+    "a an and at be by for from i in into is it my of on or so that the this to want will with".split()
+)
+_SEARCH_CHUNK_ROWS = 65536
+
+
+def hashed_features(text: str) -> Iterable[str]:
+    """Yield word unigrams, word bigrams and character trigrams of `text`."""
+    words = [word for word in _WORD_PATTERN.findall(text.lower()) if word not in _STOP_WORDS]
+    for word in words:
+        yield word
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield "#" + padded[i:i + 3]
+    for first, second in zip(words, words[1:]):
+        yield first + " " + second
+
+
+def vectorize(text: str, dimensions: int) -> np.ndarray:
+    """Return the L2-normalized signed hashed n-gram vector of `text`."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in hashed_features(text):
+        # crc32 is stable across processes, unlike hash(), so saved snapshots stay valid
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dimensions] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class PlanIndex:
+    """Process-wide in-memory k-NN index over stored goals.
+
+    Only ids and float16 hashed n-gram vectors are kept in memory: 1M goals
+    at the default 128 dimensions take about 245 MB of vectors plus about
+    130 MB for the 20-character ids and the id-to-row map. Plans are read
+    from Firestore when a neighbor is used. Search is exact and chunked.
+    Goals are added as they are saved and synced incrementally from
+    Firestore by a (timestamp, id) cursor. A snapshot is kept on disk at
+    PLAN_INDEX_PATH so a restart only syncs goals stored since; with the
+    setting cleared every process start rescans the whole collection.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PlanIndex, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.dimensions = PLAN_INDEX_DIMENSIONS
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((1024, self.dimensions), dtype=np.float16)
+        self._ids = []
+        self._rows = {}  # goal id -> row
+        self._id_bytes = 0  # id strings and row ints, for the memory estimate
+        self._synced_until = None  # (timestamp, id) of the last goal read by sync
+        self._last_sync = 0.0
+        self._syncing = False
+        self._searches = 0
+        self._drafts = 0
+        if not PLAN_INDEX_PATH:
+            print("Warning: PLAN_INDEX_PATH is empty, so the plan index rescans all stored goals on every start")
+        self._load()
+        register_stats("plan_index", self.stats)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, goal_id: str, goal: str):
+        """Insert or replace a goal's vector."""
+        vector = vectorize(goal, self.dimensions)
+        with self._lock:
+            row = self._rows.get(goal_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self._vectors):
+                    grown = np.zeros((2 * len(self._vectors), self.dimensions), dtype=np.float16)
+                    grown[:row] = self._vectors
+                    self._vectors = grown
+                self._ids.append(goal_id)
+                self._rows[goal_id] = row
+                self._id_bytes += sys.getsizeof(goal_id) + sys.getsizeof(row)
+            self._vectors[row] = vector
+
+    def search(self, goal: str, k: int = 1, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+        """Return up to `k` (goal id, cosine similarity) pairs, most similar first."""
+        query = vectorize(goal, self.dimensions)
+        with self._lock:
+            self._searches += 1
+            size = len(self._ids)
+            if not size or not query.any():
+                return []
+            similarities = np.empty(size, dtype=np.float32)
+            for start in range(0, size, _SEARCH_CHUNK_ROWS):
+                chunk = self._vectors[start:min(start + _SEARCH_CHUNK_ROWS, size)]
+                similarities[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+            ids = self._ids
+        k = min(k, size)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(ids[row], float(similarities[row])) for row in top if similarities[row] >= min_similarity]
+
+    def record_draft(self):
+        """Count a search whose neighbor was shown as a draft plan."""
+        with self._lock:
+            self._drafts += 1
+
+    def sync(self, fetch_page: Callable, page_size: int = 500):
+        """Add goals stored since the last sync.
+
+        `fetch_page(cursor, limit)` returns up to `limit` goals with `id`, `goal`
+        and a datetime `timestamp`, ordered by (timestamp, id), after the
+        `(timestamp, id)` cursor (all goals when None). Pages are read until a
+        short one, so goals already added by this process don't end the sync
+        early.
+        """
+        while True:
+            page = fetch_page(self._synced_until, page_size)
+            for doc in page:
+                if doc['id'] not in self._rows:
+                    self.add(doc['id'], doc.get('goal') or '')
+            if page:
+                self._synced_until = (page[-1]['timestamp'], page[-1]['id'])
+            if len(page) < page_size:
+                break
+        self._last_sync = time.time()
+        self._save()
+
+    def sync_in_background(self, fetch_page: Callable):
+        """Start `sync` on a daemon thread unless one is running or the last one is recent."""
+        with self._lock:
+            if self._syncing or time.time() - self._last_sync < PLAN_INDEX_SYNC_SECONDS:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                self.sync(fetch_page)
+            except Exception as e:
+                print(f"Error syncing plan index: {str(e)}")
+                self._last_sync = time.time()
+            finally:
+                self._syncing = False
+
+        threading.Thread(target=run, name="plan-index-sync", daemon=True).start()
+
+    def stats(self) -> dict:
+        """Return index size, memory use, searches, drafts shown and time since the last sync."""
+        with self._lock:
+            return {
+                'goals': len(self._ids),
+                'memory_mb': (self._vectors.nbytes + sys.getsizeof(self._ids) + sys.getsizeof(self._rows)
+                              + self._id_bytes) / 2 ** 20,
+                'searches': self._searches,
+                'drafts': self._drafts,
+                'since_sync_seconds': time.time() - self._last_sync if self._last_sync else None,
+            }
+
+    def _save(self):
+        if not PLAN_INDEX_PATH:
+            return
+        with self._lock:
+            size = len(self._ids)
+            vectors = self._vectors[:size].copy()
+            ids = np.array(self._ids, dtype=object)
+        try:
+            tmp_path = PLAN_INDEX_PATH + ".tmp.npz"
+            synced_until = np.empty(1, dtype=object)
+            synced_until[0] = self._synced_until
+            np.savez(tmp_path, vectors=vectors, ids=ids, synced_until=synced_until)
+            os.replace(tmp_path, PLAN_INDEX_PATH)
+        except Exception as e:
+            print(f"Error saving plan index: {str(e)}")
+
+    def _load(self):
+        if not PLAN_INDEX_PATH or not os.path.exists(PLAN_INDEX_PATH):
+            return
+        try:
+            with np.load(PLAN_INDEX_PATH, allow_pickle=True) as snapshot:
+                vectors = snapshot['vectors']
+                if vectors.shape[1] != self.dimensions:
+                    return  # Dimensions changed: rebuild from Firestore
+                self._vectors = np.zeros((max(1024, 2 * len(vectors)), self.dimensions), dtype=np.float16)
+                self._vectors[:len(vectors)] = vectors
+                self._ids = list(snapshot['ids'])
+                self._rows = {goal_id: row for row, goal_id in enumerate(self._ids)}
+                self._id_bytes = sum(sys.getsizeof(goal_id) + sys.getsizeof(row) for goal_id, row in self._rows.items())
+                self._synced_until = snapshot['synced_until'][0]
+        except Exception as e:
+            print(f"Error loading plan index: {str(e)}")
@@ -0,0 +1,162 @@
+import atexit
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from services.firebase_service import FirebaseService
+from services.telemetry import register_stats
+from config.settings import PLAN_WRITE_BEHIND_ENABLED, PLAN_WRITE_DEBOUNCE_SECONDS
+
+# Failed writes are retried after the debounce delay up to this many times
+MAX_WRITE_ATTEMPTS = 5
+# Plans whose last written version is remembered for skipping unchanged saves
+MAX_REMEMBERED_PLANS = 10000
+
+
+def content_hash(goal: str, questions: list, answers, tasks: str, habits: str) -> str:
+    """Return a hash of a stored plan's content; time commitment and reminders are not part of it."""
+    content = json.dumps([goal, questions, answers, tasks, habits], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def payload_hash(payload: Dict) -> str:
+    """Return a hash of everything a save writes, time commitment and reminder included."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def goal_key(session_id: str, goal: str) -> str:
+    """Return the goal document id for a session's plan for `goal`.
+
+    Regenerated sections, edited answers and the signup save all produce the
+    same id, so they update one document instead of adding new ones.
+    """
+    return hashlib.sha256(f"{session_id}:{goal}".encode("utf-8")).hexdigest()[:20]
+
+
+class PlanStore:
+    """Idempotent, debounced write-behind persistence of plans.
+
+    `save` returns the plan's document id at once. A write is skipped when the
+    document already holds the same data, and changes made within
+    PLAN_WRITE_DEBOUNCE_SECONDS of each other are coalesced into one write by
+    a background thread. Pending writes are flushed at exit.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PlanStore, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.write_behind = PLAN_WRITE_BEHIND_ENABLED
+        self.debounce = PLAN_WRITE_DEBOUNCE_SECONDS
+        self._cond = threading.Condition()
+        self._pending = {}  # goal id -> (payload, changed_at, attempts)
+        self._written = OrderedDict()  # goal id -> hash of the last payload written, least recent first
+        self._writes = 0
+        self._skipped = 0
+        self._coalesced = 0
+        self._failures = 0
+        if self.write_behind:
+            threading.Thread(target=self._work, name="plan-store", daemon=True).start()
+            atexit.register(self.flush)
+        register_stats("plan_persistence", self.stats)
+
+    def save(self, session_id: str, plan: Dict, time_commitment=None, email: Optional[str] = None) -> str:
+        """Queue the session's plan for writing and return its goal document id."""
+        goal_id = goal_key(session_id, plan['goal'])
+        payload = {
+            'goal': plan['goal'],
+            'questions': plan['questions'],
+            'answers': plan['answers'],
+            'time_commitment': time_commitment,
+            'tasks': plan['initiatives'],
+            'habits': plan['habits'],
+            'reminder_settings': {
+                'email': email,
+                'frequency': 'Daily',
+                'time': None,
+                'status': 'active'
+            },
+            'extra_fields': {
+                'session_id': session_id,
+                'content_hash': content_hash(plan['goal'], plan['questions'], plan['answers'],
+                                             plan['initiatives'], plan['habits']),
+            },
+        }
+        with self._cond:
+            pending = self._pending.get(goal_id)
+            if pending:
+                unchanged = pending[0] == payload
+            else:
+                unchanged = self._written.get(goal_id) == payload_hash(payload)
+                if unchanged:
+                    self._written.move_to_end(goal_id)
+            if unchanged:
+                self._skipped += 1
+                return goal_id
+            if pending:
+                self._coalesced += 1
+            self._pending[goal_id] = (payload, time.time(), 0)
+            self._cond.notify()
+        if not self.write_behind:
+            self.flush()
+        return goal_id
+
+    def flush(self):
+        """Write all pending plans now."""
+        with self._cond:
+            due = {goal_id: (payload, attempts) for goal_id, (payload, _, attempts) in self._pending.items()}
+            self._pending.clear()
+        self._write_all(due)
+
+    def stats(self) -> dict:
+        """Return write, skipped, coalesced and failure counts and the number of pending plans."""
+        with self._cond:
+            return {
+                'writes': self._writes,
+                'skipped': self._skipped,
+                'coalesced': self._coalesced,
+                'failures': self._failures,
+                'pending': len(self._pending),
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.time()
+                due = {
+                    goal_id: (payload, attempts)
+                    for goal_id, (payload, changed_at, attempts) in self._pending.items()
+                    if now - changed_at >= self.debounce
+                }
+                if not due:
+                    oldest = min(changed_at for _, changed_at, _ in self._pending.values())
+                    self._cond.wait(oldest + self.debounce - now)
+                    continue
+                for goal_id in due:
+                    del self._pending[goal_id]
+            self._write_all(due)
+
+    def _write_all(self, due: Dict[str, tuple]):
+        for goal_id, (payload, attempts) in due.items():
+            stored = FirebaseService().store_user_goal(goal_id=goal_id, **payload)
+            with self._cond:
+                if stored:
+                    self._writes += 1
+                    self._written[goal_id] = payload_hash(payload)
+                    self._written.move_to_end(goal_id)
+                    if len(self._written) > MAX_REMEMBERED_PLANS:
+                        self._written.popitem(last=False)
+                    continue
+                self._failures += 1
+                # Retry unless a newer version is already waiting
+                if attempts + 1 < MAX_WRITE_ATTEMPTS and goal_id not in self._pending:
+                    self._pending[goal_id] = (payload, time.time(), attempts + 1)
+                    self._cond.notify()
@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from services.llm_scheduler import background_context
+from services.telemetry import register_stats
+from config.settings import PREFETCH_MAX_WORKERS, PREFETCH_TTL_SECONDS
+
+
+class PrefetchService:
+    """Process-wide runner for speculative LLM requests.
+
+    Work is registered per session under a name (e.g. 'questions') and a key
+    describing its input. Taking it with a different key, discarding it, or
+    leaving it untaken past the TTL counts it as wasted.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PrefetchService, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch")
+        self._pending = {}  # (session_id, name) -> (key, started_at, future)
+        self._lock = threading.Lock()
+        self._started = 0
+        self._ready_hits = 0
+        self._in_flight_hits = 0
+        self._cancelled = 0
+        self._wasted = 0
+        register_stats("speculative_prefetch", self.stats)
+
+    def start(self, session_id: str, name: str, key: str, fn: Callable, *args):
+        """Start `fn(*args)` in the background unless the same work is already pending."""
+        with self._lock:
+            self._expire()
+            entry = self._pending.get((session_id, name))
+            if entry and entry[0] == key:
+                return
+            if entry:
+                self._drop(entry)
+            future = self._executor.submit(background_context().run, fn, *args)
+            self._pending[(session_id, name)] = (key, time.time(), future)
+            self._started += 1
+
+    def take(self, session_id: str, name: str, key: str) -> Optional[Future]:
+        """Claim pending work for `key`, finished or still in flight; None if there is none."""
+        with self._lock:
+            entry = self._pending.pop((session_id, name), None)
+            if entry is None:
+                return None
+            if entry[0] != key:
+                self._drop(entry)
+                return None
+            future = entry[2]
+            if future.done():
+                self._ready_hits += 1
+            else:
+                self._in_flight_hits += 1
+            return future
+
+    def discard(self, session_id: str, name: str):
+        """Cancel pending work that will not be used."""
+        with self._lock:
+            entry = self._pending.pop((session_id, name), None)
+            if entry:
+                self._drop(entry)
+
+    def stats(self) -> dict:
+        """Return prefetch hit rate and wasted-call counters."""
+        with self._lock:
+            hits = self._ready_hits + self._in_flight_hits
+            return {
+                'started': self._started,
+                'hits': hits,
+                'ready_hits': self._ready_hits,
+                'in_flight_hits': self._in_flight_hits,
+                'cancelled': self._cancelled,
+                'wasted': self._wasted,
+                'pending': len(self._pending),
+                'hit_rate': hits / self._started if self._started else 0.0,
+            }
+
+    def _drop(self, entry: tuple):
+        # A cancelled future never reached the API; anything else was a wasted call
+        if entry[2].cancel():
+            self._cancelled += 1
+        else:
+            self._wasted += 1
+
+    def _expire(self):
+        cutoff = time.time() - PREFETCH_TTL_SECONDS
+        for slot, entry in list(self._pending.items()):
+            if entry[1] < cutoff:
+                del self._pending[slot]
+                self._drop(entry)
@@ -0,0 +1,252 @@
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from services.llm_scheduler import current_session_id
+from services.telemetry import VARIANT_SEPARATOR, LLMTelemetry, prompt_configs, prompt_name, register_prompt
+from config.settings import (
+    PROMPT_EXPERIMENTS_PATH,
+    PROMPT_EXPERIMENTS_RELOAD_SECONDS,
+    PROMPT_EXPERIMENT_MIN_SESSIONS,
+)
+
+BASELINE = "baseline"
+ANONYMOUS_SESSION = "anonymous"
+# Sessions remembered for counting exposures and completions once each
+MAX_TRACKED_SESSIONS = 100000
+# A variant is only recommended if it is this close to the best parse-failure and completion rates
+PARSE_FAILURE_TOLERANCE = 0.02
+COMPLETION_TOLERANCE = 0.05
+
+
+def config_version(config) -> str:
+    """Return a short content hash identifying a config's model and prompt text."""
+    content = dataclasses.asdict(config) if dataclasses.is_dataclass(config) else config
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+
+def apply_overrides(config, overrides: Dict):
+    """Return a copy of a `PromptConfig` or dict config with some fields replaced."""
+    if dataclasses.is_dataclass(config):
+        return dataclasses.replace(config, **overrides)
+    unknown = set(overrides) - set(config) - {"fallback_models", "hedge_model"}
+    if unknown:
+        raise ValueError(f"Unknown config fields: {', '.join(sorted(unknown))}")
+    return {**config, **overrides}
+
+
+class _Experiment:
+    def __init__(self, name: str, base, spec: Dict):
+        self.name = name
+        self.variants = OrderedDict()  # variant -> (weight, config)
+        for variant, fields in spec.items():
+            fields = dict(fields)
+            weight = int(fields.pop("weight", 0))
+            config = apply_overrides(base, fields)
+            register_prompt(config, f"{name}{VARIANT_SEPARATOR}{variant}")
+            self.variants[variant] = (weight, config)
+        self.total_weight = sum(weight for weight, _ in self.variants.values())
+
+    def bucket(self, session_id: str) -> Optional[str]:
+        """Deterministically assign a session to a variant in proportion to the weights."""
+        if not self.total_weight:
+            return None
+        digest = hashlib.sha256(f"{self.name}:{session_id}".encode("utf-8")).digest()
+        point = int.from_bytes(digest[:8], "big") % self.total_weight
+        for variant, (weight, _) in self.variants.items():
+            if point < weight:
+                return variant
+            point -= weight
+        return None
+
+
+class PromptRegistry:
+    """Versioned prompt variants with deterministic per-session bucketing.
+
+    Experiments are read from the JSON file at PROMPT_EXPERIMENTS_PATH, which
+    is reloaded when it changes, so variants can be added, reweighted or
+    promoted without a deploy. Keys are config names as `prompt_name` reports
+    them, variants map to a weight and the config fields they override:
+
+        {"PLAN_CONFIG": {"baseline": {"weight": 50},
+                         "mini": {"weight": 50, "model": "gpt-4o-mini"}}}
+
+    Latency and tokens per variant come from `LLMTelemetry`, which labels
+    variant calls `PLAN_CONFIG@mini`; parse failures and completed plans are
+    recorded here. Calls outside a session use the config as defined in code;
+    deferred plans run as the session that queued them, so they get its
+    variants.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PromptRegistry, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._lock = threading.Lock()
+        self._experiments = {}  # config name -> _Experiment
+        self._variant_of = {}  # id(variant config) -> (experiment, variant)
+        self._spec = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._sessions = OrderedDict()  # session id -> {'experiments': set, 'completed': bool}
+        self._counts = {}  # (experiment, variant) -> counters
+        self._reload()
+
+    def resolve(self, config):
+        """Return the variant of `config` for the current session, or `config` itself."""
+        self._maybe_reload()
+        name = prompt_name(config)
+        session_id = current_session_id()
+        with self._lock:
+            experiment = self._experiments.get(name)
+            if experiment is None or session_id == ANONYMOUS_SESSION:
+                return config
+            variant = experiment.bucket(session_id)
+            if variant is None:
+                return config
+            self._expose(session_id, name, variant)
+            return experiment.variants[variant][1]
+
+    def record_parse(self, config, failed: bool):
+        """Count a parsed response of a variant config; other configs are ignored."""
+        with self._lock:
+            key = self._variant_of.get(id(config))
+            if key:
+                counts = self._counters(key)
+                counts['parses'] += 1
+                counts['parse_failures'] += failed
+
+    def record_completion(self):
+        """Count the current session as completed (it got a plan) in every variant it was exposed to."""
+        session_id = current_session_id()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session['completed']:
+                return
+            session['completed'] = True
+            for key in session['experiments']:
+                self._counters(key)['completions'] += 1
+
+    def summary(self) -> dict:
+        """Return per-variant sessions, completion and parse-failure rates, latency and tokens.
+
+        Each experiment also names the variant worth promoting: the fastest one
+        with PROMPT_EXPERIMENT_MIN_SESSIONS sessions whose parse-failure and
+        completion rates are close to the best variant's.
+        """
+        self._maybe_reload()
+        telemetry = LLMTelemetry()
+        with self._lock:
+            experiments = list(self._experiments.values())
+            counts = {key: dict(value) for key, value in self._counts.items()}
+        result = {}
+        for experiment in experiments:
+            variants = {}
+            for variant, (weight, config) in experiment.variants.items():
+                counters = counts.get((experiment.name, variant), self._new_counters())
+                calls = telemetry.prompt_summary(f"{experiment.name}{VARIANT_SEPARATOR}{variant}")
+                variants[variant] = {
+                    'version': config_version(config),
+                    'model': config.model if dataclasses.is_dataclass(config) else config['model'],
+                    'weight': weight,
+                    'sessions': counters['sessions'],
+                    'completion_rate': counters['completions'] / counters['sessions'] if counters['sessions'] else 0.0,
+                    'parse_failure_rate': counters['parse_failures'] / counters['parses'] if counters['parses'] else 0.0,
+                    'calls': calls['calls'],
+                    'avg_latency': calls['avg_latency'],
+                    'p95': calls['p95'],
+                    'avg_prompt_tokens': calls['avg_prompt_tokens'],
+                    'avg_completion_tokens': calls['avg_completion_tokens'],
+                }
+            result[experiment.name] = {'variants': variants, 'recommended': self._recommend(variants)}
+        return result
+
+    def promote(self, experiment: str, variant: str):
+        """Send all sessions to one variant by rewriting the experiments file."""
+        with self._lock:
+            spec = json.loads(json.dumps(self._spec))
+        if variant not in spec.get(experiment, {}):
+            raise KeyError(f"Unknown variant {variant} of {experiment}")
+        for name, fields in spec[experiment].items():
+            fields['weight'] = 100 if name == variant else 0
+        tmp_path = PROMPT_EXPERIMENTS_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(spec, f, indent=2)
+        os.replace(tmp_path, PROMPT_EXPERIMENTS_PATH)
+        self._reload()
+
+    def _recommend(self, variants: Dict[str, dict]) -> Optional[str]:
+        eligible = {name: v for name, v in variants.items()
+                    if v['sessions'] >= PROMPT_EXPERIMENT_MIN_SESSIONS and v['calls']}
+        if not eligible:
+            return None
+        best_parse = min(v['parse_failure_rate'] for v in eligible.values())
+        best_completion = max(v['completion_rate'] for v in eligible.values())
+        candidates = [
+            name for name, v in eligible.items()
+            if v['parse_failure_rate'] <= best_parse + PARSE_FAILURE_TOLERANCE
+            and v['completion_rate'] >= best_completion - COMPLETION_TOLERANCE
+        ]
+        return min(candidates, key=lambda name: eligible[name]['avg_latency'])
+
+    def _expose(self, session_id: str, experiment: str, variant: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {'experiments': set(), 'completed': False}
+            if len(self._sessions) > MAX_TRACKED_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        key = (experiment, variant)
+        if key not in session['experiments']:
+            session['experiments'].add(key)
+            self._counters(key)['sessions'] += 1
+
+    def _counters(self, key) -> dict:
+        return self._counts.setdefault(key, self._new_counters())
+
+    @staticmethod
+    def _new_counters() -> dict:
+        return {'sessions': 0, 'completions': 0, 'parses': 0, 'parse_failures': 0}
+
+    def _maybe_reload(self):
+        if time.time() - self._checked >= PROMPT_EXPERIMENTS_RELOAD_SECONDS:
+            self._reload()
+
+    def _reload(self):
+        self._checked = time.time()
+        try:
+            mtime = os.path.getmtime(PROMPT_EXPERIMENTS_PATH) if PROMPT_EXPERIMENTS_PATH else None
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        spec, experiments, variant_of = {}, {}, {}
+        if mtime is not None:
+            try:
+                with open(PROMPT_EXPERIMENTS_PATH, encoding="utf-8") as f:
+                    spec = json.load(f)
+                configs = prompt_configs()
+                for name, variants in spec.items():
+                    if name not in configs:
+                        raise ValueError(f"Unknown prompt config: {name}")
+                    experiment = experiments[name] = _Experiment(name, configs[name], variants)
+                    for variant, (_, config) in experiment.variants.items():
+                        variant_of[id(config)] = (name, variant)
+            except Exception as e:
+                # Keep serving the previous experiments rather than a half-applied file
+                print(f"Error loading prompt experiments: {str(e)}")
+                return
+        with self._lock:
+            self._spec = spec
+            self._experiments = experiments
+            self._variant_of = variant_of
+            self._mtime = mtime
@@ -0,0 +1,98 @@
+import re
+import threading
+from typing import Dict, List, Optional
+from services.telemetry import register_stats
+
+# Turns at or beyond this index share one latency bucket
+MAX_TRACKED_TURN = 10
+
+_PROPOSAL_PATTERN = re.compile(r"^\s*\**\s*refined goal\s*:\s*\**\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+class RefinementConversation:
+    """One session's refinement chat: the full transcript and a rolling summary.
+
+    Messages before `summarized` are folded into `summary` and no longer sent
+    to the model; the transcript itself is kept for display.
+    """
+
+    def __init__(self, initial_goal: str):
+        self.initial_goal = initial_goal
+        self.messages: List[Dict] = []
+        self.summary = ""
+        self.summarized = 0
+        self.turn_stats: List[Dict] = []
+
+    def add(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+
+    @property
+    def turns(self) -> int:
+        """Number of user turns so far."""
+        return sum(message["role"] == "user" for message in self.messages)
+
+    def recent_messages(self) -> List[Dict]:
+        """Return the messages not yet folded into the summary."""
+        return self.messages[self.summarized:]
+
+    def proposed_goal(self) -> Optional[str]:
+        """Return the goal statement in the latest assistant reply, if it proposes one."""
+        for message in reversed(self.messages):
+            if message["role"] == "assistant":
+                matches = _PROPOSAL_PATTERN.findall(message["content"])
+                return matches[-1].strip().strip("*").strip() if matches else None
+        return None
+
+
+class ChatTurnStats:
+    """Process-wide latency and prompt-size statistics per conversation turn.
+
+    Bucketing by turn index shows whether later turns stay as fast as early
+    ones, which is what the token budget is for.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ChatTurnStats, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._lock = threading.Lock()
+        self._turns = {}  # turn index -> {'count', 'latency', 'max_latency', 'prompt_tokens'}
+        self._compactions = 0
+        self._compaction_seconds = 0.0
+        register_stats("refinement_chat", self.stats)
+
+    def record(self, turn: int, latency: float, prompt_tokens: int, compaction_seconds: Optional[float] = None):
+        """Record a completed turn, including the time spent compacting older turns, if any."""
+        with self._lock:
+            bucket = self._turns.setdefault(
+                min(turn, MAX_TRACKED_TURN), {'count': 0, 'latency': 0.0, 'max_latency': 0.0, 'prompt_tokens': 0}
+            )
+            bucket['count'] += 1
+            bucket['latency'] += latency
+            bucket['max_latency'] = max(bucket['max_latency'], latency)
+            bucket['prompt_tokens'] += prompt_tokens
+            if compaction_seconds is not None:
+                self._compactions += 1
+                self._compaction_seconds += compaction_seconds
+
+    def stats(self) -> dict:
+        """Return per-turn average latency and prompt tokens, and compaction counts."""
+        with self._lock:
+            turns = {
+                turn: {
+                    'count': bucket['count'],
+                    'avg_latency': bucket['latency'] / bucket['count'],
+                    'max_latency': bucket['max_latency'],
+                    'avg_prompt_tokens': bucket['prompt_tokens'] / bucket['count'],
+                }
+                for turn, bucket in sorted(self._turns.items())
+            }
+            return {
+                'turns': turns,
+                'compactions': self._compactions,
+                'avg_compaction_seconds': self._compaction_seconds / self._compactions if self._compactions else 0.0,
+            }
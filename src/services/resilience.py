@@ -0,0 +1,320 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, Iterator
+import openai
+from config.settings import (
+    LLM_TIMEOUT_DEFAULT_SECONDS,
+    LLM_TIMEOUT_MIN_SECONDS,
+    LLM_TIMEOUT_MAX_SECONDS,
+    LLM_TIMEOUT_MULTIPLIER,
+    LLM_RETRY_MAX_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY_SECONDS,
+    LLM_RETRY_MAX_DELAY_SECONDS,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_SECONDS,
+)
+from services.telemetry import register_stats
+
+# Errors worth retrying: the request may succeed if sent again
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"{endpoint} is unavailable; retry in {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def first_fragment_key(endpoint: str) -> str:
+    """Return the `LatencyTracker` key under which an endpoint's time to first streamed fragment is kept."""
+    return f"{endpoint}:first-fragment"
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per endpoint."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, endpoint: str, pct: float):
+        """Return the given percentile (0-100) of recent latencies, or None without data."""
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def has_enough_samples(self, endpoint: str) -> bool:
+        with self._lock:
+            return len(self._samples.get(endpoint, ())) >= self.min_samples
+
+    def timeout_for(self, endpoint: str) -> float:
+        """Derive a timeout from the observed p99, clamped to the configured bounds."""
+        if not self.has_enough_samples(endpoint):
+            return LLM_TIMEOUT_DEFAULT_SECONDS
+        timeout = self.percentile(endpoint, 99) * LLM_TIMEOUT_MULTIPLIER
+        return max(LLM_TIMEOUT_MIN_SECONDS, min(LLM_TIMEOUT_MAX_SECONDS, timeout))
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open lets one probe through after a cool-down."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.time() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """Return whether a call may be made now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.time() - self._opened_at < self.reset_timeout or self._probe_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_abandoned(self):
+        """The call was interrupted (cancelled, abandoned stream, rerun) before the endpoint answered."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.time()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+
+
+class ResilienceManager:
+    """Process-wide timeouts, retries and circuit breakers for LLM endpoints."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResilienceManager, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.latency = LatencyTracker()
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._retries = 0
+        register_stats("llm_endpoints", self.stats)
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    endpoint, LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS
+                )
+            return self._breakers[endpoint]
+
+    def call(self, endpoint: str, fn: Callable, *args, **kwargs):
+        """Call `fn(*args, timeout=..., **kwargs)` with an adaptive timeout, retries and the breaker."""
+        breaker = self.breaker(endpoint)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            self._check(breaker)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, timeout=self.latency.timeout_for(endpoint), **kwargs)
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if attempt == LLM_RETRY_MAX_ATTEMPTS - 1:
+                    raise
+                self._count_retry()
+                time.sleep(backoff_delay(attempt))
+                continue
+            except Exception:
+                # The endpoint answered; the request itself was bad
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Neither a success nor a failure, but a half-open probe must not stay in flight
+                breaker.record_abandoned()
+                raise
+            breaker.record_success()
+            self.latency.record(endpoint, time.perf_counter() - start)
+            return result
+
+    async def acall(self, endpoint: str, fn: Callable, *args, **kwargs):
+        """Async variant of `call`; `fn` must return an awaitable."""
+        breaker = self.breaker(endpoint)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            self._check(breaker)
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, timeout=self.latency.timeout_for(endpoint), **kwargs)
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if attempt == LLM_RETRY_MAX_ATTEMPTS - 1:
+                    raise
+                self._count_retry()
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except Exception:
+                # The endpoint answered; the request itself was bad
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Neither a success nor a failure, but a half-open probe must not stay in flight
+                breaker.record_abandoned()
+                raise
+            breaker.record_success()
+            self.latency.record(endpoint, time.perf_counter() - start)
+            return result
+
+    def stream(self, endpoint: str, fn: Callable, *args, **kwargs) -> Iterator:
+        """Like `call` for a streaming `fn`; retries only before the first fragment is yielded.
+
+        The time to the first fragment is recorded under `first_fragment_key(endpoint)`.
+        """
+        breaker = self.breaker(endpoint)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            self._check(breaker)
+            started = False
+            start = time.perf_counter()
+            deltas = fn(*args, timeout=self.latency.timeout_for(endpoint), **kwargs)
+            try:
+                for delta in deltas:
+                    if not started:
+                        started = True
+                        self.latency.record(first_fragment_key(endpoint), time.perf_counter() - start)
+                    yield delta
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if started or attempt == LLM_RETRY_MAX_ATTEMPTS - 1:
+                    raise
+                self._count_retry()
+                time.sleep(backoff_delay(attempt))
+                continue
+            except Exception:
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Neither a success nor a failure, but a half-open probe must not stay in flight
+                breaker.record_abandoned()
+                raise
+            finally:
+                # Closes the provider's HTTP response when the caller abandons the stream
+                deltas.close()
+            breaker.record_success()
+            return
+
+    async def astream(self, endpoint: str, fn: Callable, *args, **kwargs) -> AsyncIterator:
+        """Async variant of `stream`; `fn` must return an async iterator."""
+        breaker = self.breaker(endpoint)
+        for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+            self._check(breaker)
+            started = False
+            start = time.perf_counter()
+            deltas = fn(*args, timeout=self.latency.timeout_for(endpoint), **kwargs)
+            try:
+                async for delta in deltas:
+                    if not started:
+                        started = True
+                        self.latency.record(first_fragment_key(endpoint), time.perf_counter() - start)
+                    yield delta
+            except RETRYABLE_ERRORS:
+                breaker.record_failure()
+                if started or attempt == LLM_RETRY_MAX_ATTEMPTS - 1:
+                    raise
+                self._count_retry()
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            except Exception:
+                breaker.record_success()
+                raise
+            except BaseException:
+                # Neither a success nor a failure, but a half-open probe must not stay in flight
+                breaker.record_abandoned()
+                raise
+            finally:
+                await deltas.aclose()
+            breaker.record_success()
+            return
+
+    def breaker_states(self) -> Dict[str, str]:
+        """Return the current state of every endpoint's circuit breaker."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.state for breaker in breakers}
+
+    def stats(self) -> dict:
+        """Return breaker states, current timeouts and the retry count."""
+        states = self.breaker_states()
+        with self._lock:
+            retries = self._retries
+        return {
+            'retries': retries,
+            'endpoints': {
+                endpoint: {
+                    'state': state,
+                    'timeout': self.latency.timeout_for(endpoint),
+                    'p50': self.latency.percentile(endpoint, 50),
+                    'p95': self.latency.percentile(endpoint, 95),
+                }
+                for endpoint, state in states.items()
+            },
+        }
+
+    def _check(self, breaker: CircuitBreaker):
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name, breaker.retry_after())
+
+    def _count_retry(self):
+        with self._lock:
+            self._retries += 1
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from typing import Callable, Tuple
+from services.telemetry import register_stats
+
+
+class _Call:
+    """An upstream call in flight and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Process-wide coalescing of identical in-flight requests.
+
+    The first caller for a key runs the request; concurrent callers with the
+    same key wait for it and receive the same result or exception. If the
+    leading caller is interrupted (e.g. by a Streamlit rerun), a waiting
+    caller takes over instead of failing.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SingleFlight, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executions = 0
+        self._coalesced = 0
+        register_stats("request_coalescing", self.stats)
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[object, bool]:
+        """Run `fn` once per key at a time; returns (result, shared) where shared means coalesced."""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                return self._lead(key, call, fn, *args, **kwargs), False
+            call.done.wait()
+            if not call.abandoned:
+                return self._outcome(call), True
+
+    async def ado(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[object, bool]:
+        """Async variant of `do`; `fn` must return an awaitable."""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                try:
+                    call.result = await fn(*args, **kwargs)
+                except Exception as e:
+                    call.error = e
+                    raise
+                except BaseException:
+                    call.abandoned = True
+                    raise
+                finally:
+                    self._finish(key, call)
+                return call.result, False
+            await asyncio.to_thread(call.done.wait)
+            if not call.abandoned:
+                return self._outcome(call), True
+
+    def stats(self) -> dict:
+        """Return upstream executions, coalesced callers and calls in flight."""
+        with self._lock:
+            return {
+                'executions': self._executions,
+                'coalesced': self._coalesced,
+                'in_flight': len(self._calls),
+            }
+
+    def _join(self, key: str):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self._executions += 1
+            return call, True
+
+    def _lead(self, key: str, call: _Call, fn: Callable, *args, **kwargs):
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    def _finish(self, key: str, call: _Call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def _outcome(self, call: _Call):
+        if call.error is not None:
+            raise call.error
+        return call.result
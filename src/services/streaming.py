@@ -0,0 +1,92 @@
+import json
+from typing import Iterable, List, Tuple
+
+
+class IncrementalJSONParser:
+    """Emit array elements of a JSON object as soon as each element is complete.
+
+    Only arrays that are direct values of `array_keys` in the top-level object
+    are tracked. Text before the opening brace (prose, code fences) is ignored.
+    """
+
+    def __init__(self, array_keys: Iterable[str]):
+        self.array_keys = set(array_keys)
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_string = None
+        self._current_key = None
+        self._active_key = None
+        self._element = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        """Consume a chunk of text and return the (key, element) pairs it completed."""
+        completed = []
+        for ch in chunk:
+            if self._in_string:
+                self._consume_string_char(ch)
+                continue
+            if self._depth == 0 and ch != '{':
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._string = []
+                self._start_or_extend_element(ch)
+            elif ch in '{[':
+                self._start_or_extend_element(ch)
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._current_key in self.array_keys:
+                    self._active_key = self._current_key
+            elif ch in '}]':
+                if ch == ']' and self._depth == 2 and self._active_key:
+                    self._finish_element(completed)
+                    self._active_key = None
+                elif self._element is not None:
+                    self._element.append(ch)
+                self._depth -= 1
+            elif ch == ',':
+                if self._depth == 2 and self._active_key:
+                    self._finish_element(completed)
+                elif self._element is not None:
+                    self._element.append(ch)
+            elif ch == ':' and self._depth == 1:
+                self._current_key = self._last_string
+            elif not ch.isspace():
+                self._start_or_extend_element(ch)
+            elif self._element is not None:
+                self._element.append(ch)
+        return completed
+
+    def _consume_string_char(self, ch: str):
+        if self._element is not None:
+            self._element.append(ch)
+        if self._escape:
+            self._escape = False
+        elif ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            if self._depth == 1:
+                self._last_string = ''.join(self._string)
+            return
+        if self._depth == 1:
+            self._string.append(ch)
+
+    def _start_or_extend_element(self, ch: str):
+        if self._element is not None:
+            self._element.append(ch)
+        elif self._depth == 2 and self._active_key:
+            self._element = [ch]
+
+    def _finish_element(self, completed: list):
+        if self._element is None:
+            return
+        text = ''.join(self._element).strip()
+        self._element = None
+        try:
+            completed.append((self._active_key, json.loads(text)))
+        except ValueError:
+            pass
@@ -0,0 +1,328 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from services.token_counter import count_message_tokens, count_tokens
+from config.settings import LLM_TELEMETRY_ENABLED, LLM_METRICS_PATH, LLM_METRICS_EXPORT_SECONDS
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, float("inf"))
+UNNAMED_PROMPT = "unnamed"
+# Joins a config name and an experiment variant, e.g. "PLAN_CONFIG@fast"
+VARIANT_SEPARATOR = "@"
+
+_prompt_names = None
+# Configs built at runtime, by name; registering a name again replaces its config
+_registered_prompts: Dict[str, object] = {}
+# id of each registered config -> name; only ids of configs held in _registered_prompts, so never stale
+_registered_names: Dict[int, str] = {}
+_registered_lock = threading.Lock()
+# Component name -> zero-argument callable returning that component's counters
+_stats_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def _is_prompt_config(value) -> bool:
+    from config.prompts import PromptConfig
+    return isinstance(value, PromptConfig) or (isinstance(value, dict) and "model" in value)
+
+
+def _named_configs() -> Dict[int, Tuple[str, object]]:
+    global _prompt_names
+    if _prompt_names is None:
+        from config import prompts
+        names = {}
+        for name, value in vars(prompts).items():
+            if _is_prompt_config(value):
+                names[id(value)] = (name, value)
+            elif isinstance(value, dict):
+                for key, nested in value.items():
+                    if _is_prompt_config(nested):
+                        names[id(nested)] = (f"{name}[{key}]", nested)
+        _prompt_names = names
+    return _prompt_names
+
+
+def prompt_name(config) -> str:
+    """Return the name a prompt config is defined under in `config.prompts`.
+
+    Configs kept in a dict by category or section are named like
+    `PLAN_SECTION_CONFIGS[habits]`; configs built at runtime are named when
+    registered with `register_prompt`.
+    """
+    entry = _named_configs().get(id(config))
+    if entry:
+        return entry[0]
+    return _registered_names.get(id(config), UNNAMED_PROMPT)
+
+
+def prompt_configs() -> Dict[str, object]:
+    """Return every config defined in `config.prompts` by name."""
+    return {name: config for name, config in _named_configs().values()}
+
+
+def register_prompt(config, name: str):
+    """Name a config built at runtime, e.g. an experiment variant.
+
+    The config is kept until another one is registered under the same name,
+    so reloading experiments replaces their variants instead of adding more.
+    """
+    global _registered_names
+    with _registered_lock:
+        _registered_prompts[name] = config
+        _registered_names = {id(value): key for key, value in _registered_prompts.items()}
+
+
+def register_stats(name: str, source: Callable[[], dict]):
+    """Expose a component's counters on the dashboard metrics panel and in the Prometheus export.
+
+    `name` is a snake_case component name such as "response_cache"; `source`
+    returns a dict of numbers, strings, or tables keyed by e.g. model.
+    """
+    _stats_sources[name] = source
+
+
+def collect_stats() -> Dict[str, dict]:
+    """Return the counters of every registered component, by name."""
+    collected = {}
+    for name, source in sorted(_stats_sources.items()):
+        try:
+            collected[name] = source()
+        except Exception as e:
+            print(f"Error collecting {name} stats: {str(e)}")
+    return collected
+
+
+def _numeric(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _component_samples(name: str, stats: dict):
+    """Yield (metric, labels, value) for the numbers in one component's stats; tables get a `key` label."""
+    for field, value in stats.items():
+        metric = f"smart_planner_{name}_{field}"
+        if _numeric(value):
+            yield metric, "", value
+        elif isinstance(value, dict):
+            for key, row in value.items():
+                if _numeric(row):
+                    yield metric, f'key="{key}"', row
+            # Column by column, so each metric's samples stay together
+            tables = [(key, row) for key, row in value.items() if isinstance(row, dict)]
+            for column in dict.fromkeys(column for _, row in tables for column in row):
+                for key, row in tables:
+                    if _numeric(row.get(column)):
+                        yield f"{metric}_{column}", f'key="{key}"', row[column]
+
+
+class _Series:
+    """Counters for one (prompt, model) pair."""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.calls = 0
+        self.attempts = 0
+        self.latency_sum = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_token_calls = 0  # calls whose token counts include local estimates
+        self.errors = {}  # exception class name -> count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a latency quantile as the upper bound of the bucket it falls in."""
+        observed = sum(self.buckets)
+        if not observed:
+            return None
+        rank, seen = q * observed, 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+
+class LLMCall:
+    """One routed model call, which may span several attempts inside the resilience layer."""
+
+    def __init__(self, telemetry: "LLMTelemetry", prompt: str, model: str, messages: List[Dict]):
+        self.telemetry = telemetry
+        self.prompt = prompt
+        self.model = model
+        self.messages = messages
+        self.attempts = 0
+        self.usage = None  # TokenUsage reported at the end of a stream
+        self.started = time.perf_counter()
+
+    def wrap(self, fn: Callable) -> Callable:
+        """Wrap a provider function so every attempt is counted."""
+        def attempt(*args, **kwargs):
+            self.attempts += 1
+            return fn(*args, **kwargs)
+        return attempt
+
+    def finish(self, response: Optional[str] = None, error: Optional[Exception] = None):
+        self.telemetry.record(self, time.perf_counter() - self.started, response, error)
+
+
+class LLMTelemetry:
+    """Process-wide latency histograms, token counts, retries and error classes per prompt and model.
+
+    Latency covers a whole routed call, retries included, from the moment it
+    holds a scheduler slot. Tokens are the usage the API reports for the
+    answered attempt. Failed attempts, and providers that report no usage
+    (stub, replay), are counted locally with the refinement chat's counter
+    (exact with tiktoken installed, a rough estimate otherwise), and those
+    calls are counted as estimated. With LLM_METRICS_PATH set, a Prometheus text-format snapshot
+    is written there every LLM_METRICS_EXPORT_SECONDS for a node exporter
+    textfile collector.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMTelemetry, cls).__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        self.enabled = LLM_TELEMETRY_ENABLED
+        self._lock = threading.Lock()
+        self._series = {}  # (prompt, model) -> _Series
+        self._exporter = None
+        if self.enabled and LLM_METRICS_PATH:
+            self._exporter = threading.Thread(target=self._export_loop, name="llm-metrics", daemon=True)
+            self._exporter.start()
+
+    def start(self, prompt: Optional[str], model: str, messages: List[Dict]) -> LLMCall:
+        return LLMCall(self, prompt or UNNAMED_PROMPT, model, messages)
+
+    def record(self, call: LLMCall, latency: float, response: Optional[str], error: Optional[Exception]):
+        if not self.enabled:
+            return
+        usage = getattr(response, 'usage', None) or call.usage
+        attempts = max(1, call.attempts)
+        estimated_prompt = count_message_tokens(call.messages, call.model)
+        if usage is not None:
+            # Attempts before the answered one are estimated
+            prompt_tokens = usage.prompt_tokens + estimated_prompt * (attempts - 1)
+            completion_tokens = usage.completion_tokens
+        else:
+            prompt_tokens = estimated_prompt * attempts
+            completion_tokens = count_tokens(response, call.model) if response else 0
+        estimated = usage is None or attempts > 1
+        with self._lock:
+            series = self._series.setdefault((call.prompt, call.model), _Series())
+            series.calls += 1
+            series.attempts += max(1, call.attempts)
+            series.latency_sum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    series.buckets[i] += 1
+                    break
+            series.prompt_tokens += prompt_tokens
+            series.completion_tokens += completion_tokens
+            series.estimated_token_calls += estimated
+            if error is not None:
+                name = type(error).__name__
+                series.errors[name] = series.errors.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        """Return per-prompt and per-model call counts, latency, tokens, retries and errors."""
+        with self._lock:
+            series = {key: self._summary([value]) for key, value in sorted(self._series.items())}
+            by_model = {}
+            for (_, model), value in self._series.items():
+                by_model.setdefault(model, []).append(value)
+            models = {model: self._summary(values) for model, values in sorted(by_model.items())}
+        return {'prompts': series, 'models': models}
+
+    def prompt_summary(self, prompt: str) -> dict:
+        """Return the `stats` summary of one prompt across all models."""
+        with self._lock:
+            return self._summary([series for (name, _), series in self._series.items() if name == prompt])
+
+    def render_prometheus(self) -> str:
+        """Return all series, and the registered components' counters as gauges, in the Prometheus text format."""
+        lines = [
+            "# HELP smart_planner_llm_call_duration_seconds Routed LLM call latency, retries included.",
+            "# TYPE smart_planner_llm_call_duration_seconds histogram",
+        ]
+        with self._lock:
+            items: List[Tuple[Tuple[str, str], _Series]] = sorted(self._series.items())
+            for (prompt, model), series in items:
+                labels = f'prompt="{prompt}",model="{model}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, series.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'smart_planner_llm_call_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"smart_planner_llm_call_duration_seconds_sum{{{labels}}} {series.latency_sum:.6f}")
+                lines.append(f"smart_planner_llm_call_duration_seconds_count{{{labels}}} {series.calls}")
+            for metric, help_text, attribute in (
+                ("smart_planner_llm_prompt_tokens_total", "Prompt tokens sent, retries included.", "prompt_tokens"),
+                ("smart_planner_llm_completion_tokens_total", "Completion tokens received.", "completion_tokens"),
+                ("smart_planner_llm_estimated_token_calls_total",
+                 "Calls whose token counts include local estimates.", "estimated_token_calls"),
+            ):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (prompt, model), series in items:
+                    lines.append(f'{metric}{{prompt="{prompt}",model="{model}"}} {getattr(series, attribute)}')
+            lines.append("# HELP smart_planner_llm_retries_total Attempts beyond the first per call.")
+            lines.append("# TYPE smart_planner_llm_retries_total counter")
+            for (prompt, model), series in items:
+                lines.append(f'smart_planner_llm_retries_total{{prompt="{prompt}",model="{model}"}} '
+                             f'{series.attempts - series.calls}')
+            lines.append("# HELP smart_planner_llm_errors_total Failed calls by exception class.")
+            lines.append("# TYPE smart_planner_llm_errors_total counter")
+            for (prompt, model), series in items:
+                for error, count in sorted(series.errors.items()):
+                    lines.append(f'smart_planner_llm_errors_total{{prompt="{prompt}",model="{model}",'
+                                 f'error="{error}"}} {count}')
+        typed = set()
+        for name, stats in collect_stats().items():
+            for metric, labels, value in _component_samples(name, stats):
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric}{{{labels}}} {value:g}" if labels else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = LLM_METRICS_PATH):
+        """Write the Prometheus text atomically, so collectors never read a partial file."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def _export_loop(self):
+        while True:
+            time.sleep(LLM_METRICS_EXPORT_SECONDS)
+            try:
+                self.export()
+            except Exception as e:
+                print(f"Error exporting LLM metrics: {str(e)}")
+
+    @staticmethod
+    def _summary(values: List[_Series]) -> dict:
+        merged = _Series()
+        for series in values:
+            merged.buckets = [a + b for a, b in zip(merged.buckets, series.buckets)]
+            merged.calls += series.calls
+            merged.attempts += series.attempts
+            merged.latency_sum += series.latency_sum
+            merged.prompt_tokens += series.prompt_tokens
+            merged.completion_tokens += series.completion_tokens
+            merged.estimated_token_calls += series.estimated_token_calls
+            for error, count in series.errors.items():
+                merged.errors[error] = merged.errors.get(error, 0) + count
+        return {
+            'calls': merged.calls,
+            'retries': merged.attempts - merged.calls,
+            'errors': dict(merged.errors),
+            'avg_latency': merged.latency_sum / merged.calls if merged.calls else 0.0,
+            'p50': merged.quantile(0.5),
+            'p95': merged.quantile(0.95),
+            'avg_prompt_tokens': merged.prompt_tokens / merged.calls if merged.calls else 0.0,
+            'avg_completion_tokens': merged.completion_tokens / merged.calls if merged.calls else 0.0,
+            'estimated_token_calls': merged.estimated_token_calls,
+        }
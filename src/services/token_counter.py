@@ -0,0 +1,34 @@
+from functools import lru_cache
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency: fall back to an estimate
+    tiktoken = None
+
+# Tokens added per chat message for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+# Rough average for English text when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens in `text` for `model`, exactly with tiktoken or estimated without it."""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_encoding(model).encode(text))
+
+
+def count_message_tokens(messages: List[Dict], model: str) -> int:
+    """Count the prompt tokens of a chat message list."""
+    return sum(count_tokens(message["content"], model) + MESSAGE_OVERHEAD_TOKENS for message in messages) + 2
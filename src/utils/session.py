@@ -1,11 +1,18 @@
 import streamlit as st
 import re
+import uuid
 
 def is_valid_email(email: str) -> bool:
     """Validate email format."""
     pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
     return re.match(pattern, email) is not None
 
+def get_session_id() -> str:
+    """Return a stable identifier for the current browser session."""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
 def init_session_state():
     """Initialize session state variables."""
     # User progress
@@ -35,3 +42,11 @@ def init_session_state():
         st.session_state.show_reminder_form = False
     if 'plan_saved' not in st.session_state:
         st.session_state.plan_saved = False
+    if 'plan_job_id' not in st.session_state:
+        st.session_state.plan_job_id = None
+    if 'plan_error' not in st.session_state:
+        st.session_state.plan_error = None
+    if 'deferred_request_id' not in st.session_state:
+        st.session_state.deferred_request_id = None
+    if 'refinement_chat' not in st.session_state:
+        st.session_state.refinement_chat = None
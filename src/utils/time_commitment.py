@@ -0,0 +1,30 @@
+"""Normalization of the free-text time commitments stored with goals."""
+
+import re
+from typing import Optional
+
+_AMOUNT_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?\b(?:.*\b(week|weekly|wk)\b)?",
+    re.IGNORECASE
+)
+
+
+def parse_minutes(value) -> Optional[int]:
+    """Return a time commitment as whole minutes per day, or None if it has no number.
+
+    Accepts ints and strings such as "30", "45 min", "1.5 hours" or
+    "30 minutes/day"; a bare number means minutes, and weekly amounts are
+    spread over seven days.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value))
+    match = _AMOUNT_PATTERN.search(str(value))
+    if not match:
+        return None
+    amount, unit, weekly = match.groups()
+    minutes = float(amount) * (60 if unit and unit.lower().startswith("h") else 1)
+    if weekly:
+        minutes /= 7
+    return int(round(minutes))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app runs from src/ (streamlit run src/Home.py), so its packages import as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LLM_PROVIDER", "stub")
@@ -0,0 +1,229 @@
+"""In-memory stand-ins for the Firestore client and the OpenAI SDK responses used by the services."""
+
+import itertools
+from types import SimpleNamespace
+
+_auto_ids = itertools.count(1)
+_MISSING = object()
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split('.'):
+            value = (value or {}).get(part)
+        return value
+
+
+class FakeDocument:
+    def __init__(self, collection, doc_id):
+        self.parent = collection
+        self.id = doc_id
+
+    def collection(self, name):
+        """A subcollection, stored under its path, e.g. "rollups/goals/shards"."""
+        return FakeCollection(self.parent.db, f"{self.parent.name}/{self.id}/{name}")
+
+    @property
+    def _store(self):
+        return self.parent.docs
+
+    def get(self, *args, **kwargs):
+        self.parent.db.reads += 1
+        return FakeSnapshot(self, self._store.get(self.id))
+
+    def set(self, data, merge=False):
+        self.parent.db.writes += 1
+        current = dict(self._store.get(self.id) or {}) if merge else {}
+        current.update(resolve(data, current))
+        self._store[self.id] = current
+
+    def update(self, data):
+        if self.id not in self._store:
+            raise KeyError(self.id)
+        self.set(data, merge=True)
+
+    def delete(self):
+        self.parent.db.writes += 1
+        self._store.pop(self.id, None)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocument) and (self.parent.name, self.id) == (other.parent.name, other.id)
+
+    def __hash__(self):
+        return hash((self.parent.name, self.id))
+
+
+def resolve(data, current):
+    """Apply Firestore sentinels (Increment) against the current document."""
+    resolved = {}
+    for key, value in data.items():
+        if type(value).__name__ == 'Increment':
+            resolved[key] = current.get(key, 0) + value.value
+        else:
+            resolved[key] = value
+    return resolved
+
+
+class FakeQuery:
+    def __init__(self, collection, orders=(), filters=(), after=None, count=None, fields=None):
+        self.collection = collection
+        self.orders = list(orders)
+        self.filters = list(filters)
+        self.after = after
+        self.count = count
+        self.fields = fields
+
+    def _copy(self, **changes):
+        query = FakeQuery(self.collection, self.orders, self.filters, self.after, self.count, self.fields)
+        for key, value in changes.items():
+            setattr(query, key, value)
+        return query
+
+    def order_by(self, field, direction=None):
+        return self._copy(orders=self.orders + [(field, direction == 'DESCENDING')])
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def start_after(self, cursor):
+        return self._copy(after=cursor)
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def _project(self, data):
+        if self.fields is None:
+            return data
+        projected = {}
+        for field in self.fields:
+            parts = field.split('.')
+            value = data
+            for part in parts:
+                value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+            if value is not _MISSING:
+                target = projected
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                target[parts[-1]] = value
+        return projected
+
+    def _sort_key(self, doc_id, data):
+        return tuple(doc_id if field == '__name__' else data.get(field) for field, _ in self.orders)
+
+    def stream(self):
+        ops = {'==': lambda a, b: a == b, '>=': lambda a, b: a is not None and a >= b,
+               '>': lambda a, b: a is not None and a > b, '<': lambda a, b: a is not None and a < b}
+        rows = [(doc_id, data) for doc_id, data in self.collection.docs.items()
+                if all(ops[op](data.get(field), value) for field, op, value in self.filters)]
+        descending = any(desc for _, desc in self.orders)
+        rows.sort(key=lambda row: self._sort_key(*row), reverse=descending)
+        if self.after is not None:
+            if isinstance(self.after, dict):
+                after = tuple(self.after[field].id if field == '__name__' else self.after[field]
+                              for field, _ in self.orders)
+            else:
+                after_data = self.collection.docs[self.after.id] if isinstance(self.after, FakeSnapshot) else {}
+                after = self._sort_key(self.after.id, after_data)
+            rows = [row for row in rows if (self._sort_key(*row) < after if descending else self._sort_key(*row) > after)]
+        if self.count is not None:
+            rows = rows[:self.count]
+        self.collection.db.reads += len(rows)
+        return iter([FakeSnapshot(FakeDocument(self.collection, doc_id), self._project(data)) for doc_id, data in rows])
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(self)
+        self.db = db
+        self.name = name
+        self.docs = db.data.setdefault(name, {})
+
+    def document(self, doc_id=None):
+        return FakeDocument(self, doc_id or f"auto{next(_auto_ids)}")
+
+    def add(self, data):
+        doc = self.document()
+        doc.set(data)
+        return None, doc
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.operations = []
+
+    def set(self, ref, data, merge=False):
+        self.operations.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self.operations.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self.operations.append(ref.delete)
+
+    def commit(self):
+        self.db.commits += 1
+        for operation in self.operations:
+            operation()
+
+
+class FakeFirestore:
+    """Just enough of `google.cloud.firestore.Client` for the queries this app makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, refs, field_paths=None):
+        return [ref.get() for ref in refs]
+
+
+def fake_completion(content, prompt_tokens=10, completion_tokens=5):
+    """A chat.completions.create response."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+def fake_firebase_service(db):
+    """A FirebaseService bound to `db` without touching credentials or the app singleton."""
+    import threading
+    from collections import OrderedDict
+    from services.firebase_service import FirebaseService
+
+    service = object.__new__(FirebaseService)
+    service.db = db
+    service._goal_cache = OrderedDict()
+    service._goal_cache_lock = threading.Lock()
+    service._initialized = True
+    return service
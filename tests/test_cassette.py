@@ -0,0 +1,71 @@
+import openai
+import pytest
+
+from services.llm_cassette import Cassette, CassetteMissError, RecordingProvider, ReplayProvider, parse_latency
+from services.llm_providers import LLMProvider
+
+MESSAGES = [{'role': 'user', 'content': "Plan my week"}]
+
+
+class LiveProvider(LLMProvider):
+    def chat(self, model, messages, **kwargs):
+        return "Rest on Sunday."
+
+    def stream_chat(self, model, messages, **kwargs):
+        yield from ["Rest ", "on ", "Sunday."]
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    path = str(tmp_path / "cassettes" / "llm.jsonl")
+    recorder = RecordingProvider(LiveProvider(), Cassette(path))
+    assert list(recorder.stream_chat("m", MESSAGES, timeout=10)) == ["Rest ", "on ", "Sunday."]
+    assert recorder.chat("m", MESSAGES, temperature=0.7) == "Rest on Sunday."
+    return path
+
+
+@pytest.fixture
+def replay(cassette_path):
+    provider = ReplayProvider(Cassette(cassette_path))
+    provider.sample_latency = parse_latency("none")
+    return provider
+
+
+def test_recorded_streams_replay_chunk_by_chunk(replay):
+    # The per-attempt timeout is not part of the fingerprint
+    assert list(replay.stream_chat("m", MESSAGES, timeout=3)) == ["Rest ", "on ", "Sunday."]
+    assert replay.chat("m", MESSAGES, temperature=0.7) == "Rest on Sunday."
+    assert replay.stats()['hits'] == 2
+
+
+def test_unrecorded_requests_miss(replay):
+    with pytest.raises(CassetteMissError):
+        replay.chat("m", [{'role': 'user', 'content': "Something new"}])
+    assert replay.stats()['misses'] == 1
+
+
+def test_injected_errors_are_openai_errors_and_reproducible(cassette_path):
+    outcomes = []
+    for _ in range(2):
+        provider = ReplayProvider(Cassette(cassette_path))
+        provider.sample_latency = parse_latency("none")
+        provider.error_rate = 0.5
+        provider.error_kinds = ["rate_limit", "server"]
+        run = []
+        for _ in range(10):
+            try:
+                provider.chat("m", MESSAGES)
+                run.append("ok")
+            except (openai.RateLimitError, openai.InternalServerError) as e:
+                run.append(type(e).__name__)
+        outcomes.append(run)
+
+    assert outcomes[0] == outcomes[1]
+    assert "ok" in outcomes[0] and len(set(outcomes[0])) > 1
+
+
+def test_latency_beyond_the_timeout_times_out(replay):
+    replay.sample_latency = parse_latency("constant:5")
+
+    with pytest.raises(openai.APITimeoutError):
+        replay.chat("m", MESSAGES, timeout=0.01)
@@ -0,0 +1,91 @@
+import pytest
+
+from services import deferred_queue, firebase_service, openai_service
+from services.deferred_queue import DeferredQueue
+from services.llm_scheduler import current_session_id
+
+PLAN = {'initiatives': ["Build a base"], 'habits': ["Run daily"]}
+
+
+class FakeOpenAIService:
+    failures = 0
+    sessions = []
+
+    def fetch_plan(self, goal, questions, answers):
+        FakeOpenAIService.sessions.append(current_session_id())
+        if FakeOpenAIService.failures:
+            FakeOpenAIService.failures -= 1
+            raise RuntimeError("upstream down")
+        return PLAN
+
+
+class FakeFirebaseService:
+    stored = {}
+
+    def store_user_goal(self, goal_id=None, **fields):
+        FakeFirebaseService.stored[goal_id] = fields
+        return goal_id
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(deferred_queue, "DEFERRED_QUEUE_PATH", str(tmp_path / "queue.db"))
+    monkeypatch.setattr(DeferredQueue, "_instance", None)
+    monkeypatch.setattr(openai_service, "OpenAIService", FakeOpenAIService)
+    monkeypatch.setattr(firebase_service, "FirebaseService", FakeFirebaseService)
+    FakeOpenAIService.failures = 0
+    FakeOpenAIService.sessions = []
+    FakeFirebaseService.stored = {}
+    return DeferredQueue()
+
+
+def test_goal_ids_are_random_tokens(queue):
+    first = queue.enqueue("Run a marathon", ["Q?"], ["A"], "a@example.com")
+    second = queue.enqueue("Run a marathon", ["Q?"], ["A"], "a@example.com")
+    first_id, second_id = queue.status(first)['goal_id'], queue.status(second)['goal_id']
+    assert first_id != second_id
+    assert len(first_id) >= 20
+    assert queue.find(first_id) == first
+
+
+def test_plan_is_stored_under_the_queued_id_after_a_retry(queue):
+    request_id = queue.enqueue("Run a marathon", ["Q?"], ["A"], "a@example.com", 30)
+    goal_id = queue.status(request_id)['goal_id']
+    FakeOpenAIService.failures = 1
+
+    assert queue.drain() == 0
+    assert queue.status(request_id) == {'status': DeferredQueue.PENDING, 'attempts': 1, 'goal_id': goal_id}
+
+    assert queue.drain() == 1
+    assert queue.status(request_id)['status'] == DeferredQueue.DONE
+    assert list(FakeFirebaseService.stored) == [goal_id]
+    assert FakeFirebaseService.stored[goal_id]['reminder_settings']['email'] == "a@example.com"
+    assert queue.depth() == 0
+
+
+def test_requests_survive_a_restart(queue, monkeypatch):
+    request_id = queue.enqueue("Learn Spanish", [], [], "b@example.com")
+    queue._claim(1)  # interrupted while processing
+    monkeypatch.setattr(DeferredQueue, "_instance", None)
+
+    reopened = DeferredQueue()
+    assert reopened.status(request_id)['status'] == DeferredQueue.PENDING
+    assert reopened.depth() == 1
+
+
+def test_gives_up_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(deferred_queue, "DEFERRED_MAX_ATTEMPTS", 2)
+    request_id = queue.enqueue("Learn Spanish", [], [], "b@example.com")
+    FakeOpenAIService.failures = 5
+    queue.drain()
+    queue.drain()
+    assert queue.status(request_id)['status'] == DeferredQueue.FAILED
+    assert queue.drain() == 0
+
+
+def test_plans_are_generated_as_the_queueing_session(queue):
+    queue.enqueue("Run a marathon", ["Q?"], ["A"], "a@example.com", session_id="session-1")
+    request_id = queue.enqueue("Learn Spanish", [], [], "b@example.com")
+
+    assert queue.drain() == 2
+    assert sorted(FakeOpenAIService.sessions) == [f"deferred-{request_id}", "session-1"]
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fakes import FakeBatch, FakeFirestore, fake_firebase_service
+from services.firebase_service import GOAL_ROLLUP_SHARDS, ROLLUP_FIELDS
+
+REMINDER = {'email': "a@example.com", 'frequency': "Daily", 'time': None, 'status': "active"}
+
+
+def goal_args(goal, **fields):
+    return dict(goal=goal, questions=["Q?"], answers={"Q?": "A"}, time_commitment="30 minutes",
+                tasks=["Start"], habits=["Daily"], **fields)
+
+
+def rollup_totals(db):
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    for shard in db.data.get('rollups/goals/shards', {}).values():
+        for field in ROLLUP_FIELDS:
+            totals[field] += shard.get(field, 0)
+    return totals
+
+
+@pytest.fixture
+def db():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def service(db):
+    return fake_firebase_service(db)
+
+
+def test_goal_and_reminder_are_committed_in_one_batch(db, service):
+    goal_id = service.store_user_goal(**goal_args("Run a marathon", reminder_settings=REMINDER))
+
+    assert db.commits == 1
+    assert db.data['goals'][goal_id]['goal'] == "Run a marathon"
+    [reminder] = db.data['reminders'].values()
+    assert reminder['goal_id'] == goal_id
+    assert reminder['status'] == "active"
+
+
+def test_bulk_import_commits_chunks_and_reports_failed_ones(db, service, monkeypatch):
+    commit = FakeBatch.commit
+
+    def failing_commit(batch):
+        if db.commits == 1:
+            db.commits += 1
+            raise RuntimeError("deadline exceeded")
+        commit(batch)
+
+    monkeypatch.setattr(FakeBatch, "commit", failing_commit)
+    start = datetime(2026, 1, 1)
+    goals = [goal_args(f"Goal {i}", extra_fields={'timestamp': start + timedelta(seconds=i)}) for i in range(5)]
+
+    ids = service.store_user_goals_bulk(goals, chunk_size=2, max_workers=1)
+
+    assert db.commits == 3
+    assert ids[2:4] == [None, None]
+    assert None not in ids[:2] + ids[4:]
+    assert db.data['goals'][ids[0]]['timestamp'] == start
+
+
+def test_bulk_import_counts_goals_in_the_rollups(db, service):
+    goals = [goal_args(f"Goal {i}", reminder_settings=REMINDER if i % 2 else None) for i in range(6)]
+
+    service.store_user_goals_bulk(goals, chunk_size=4, max_workers=2)
+
+    totals = rollup_totals(db)
+    assert totals['goals'] == 6
+    assert totals['goals_with_reminders'] == 3
+    assert totals['time_commitment_minutes_sum'] == 180
+
+
+def test_goal_sync_reports_errors_as_an_empty_page(service, capsys):
+    service.db = None
+
+    assert service.get_goals_since((datetime(2026, 1, 1), "a")) == []
+    assert "Error retrieving goals from Firebase" in capsys.readouterr().out
+
+
+def test_goal_pages_cover_every_goal_once_newest_first(db, service):
+    start = datetime(2026, 1, 1)
+    for i in range(7):
+        # Pairs of goals share a timestamp, so the document id must break ties
+        db.collection('goals').document(f"g{i}").set({'goal': f"Goal {i}", 'timestamp': start + timedelta(minutes=i // 2)})
+
+    pages, cursor = [], None
+    while True:
+        db.reads = 0
+        goals, cursor = service.get_goals_page(limit=3, cursor=cursor)
+        assert db.reads <= 4
+        pages.append([goal['id'] for goal in goals])
+        if cursor is None:
+            break
+
+    assert pages == [["g6", "g5", "g4"], ["g3", "g2", "g1"], ["g0"]]
+
+
+def test_goal_metrics_read_only_the_rollup_shards(db, service):
+    for i in range(20):
+        service.store_user_goal(**goal_args(f"Goal {i}", reminder_settings=REMINDER if i < 5 else None))
+    db.reads = 0
+
+    metrics = service.get_goal_metrics()
+
+    assert metrics == {'total_goals': 20, 'goals_with_reminders': 5, 'avg_time_commitment': 30}
+    assert db.reads <= GOAL_ROLLUP_SHARDS
+
+
+def test_reset_rollups_replaces_the_counters(db, service):
+    service.store_user_goal(**goal_args("Goal"))
+
+    service.reset_goal_rollups({'goals': 3, 'goals_with_reminders': 1,
+                                'time_commitment_minutes_sum': 90, 'time_commitment_count': 2})
+
+    assert service.get_goal_metrics() == {'total_goals': 3, 'goals_with_reminders': 1, 'avg_time_commitment': 45}
+
+
+def test_listings_load_only_the_listing_fields(db, service):
+    goal_id = service.store_user_goal(**goal_args("Run a marathon", reminder_settings=REMINDER))
+    db.data['goals'][goal_id]['timestamp'] = datetime(2026, 1, 1)
+
+    [listed] = service.get_user_goals()
+
+    assert listed['reminder_settings'] == {'email': "a@example.com", 'frequency': "Daily", 'time': None}
+    assert 'questions' not in listed and 'tasks' not in listed
+    assert listed['timestamp'] == "2026-01-01 00:00:00"
+
+
+def test_goal_details_are_cached_until_the_goal_is_saved_again(db, service):
+    goal_id = service.store_user_goal(**goal_args("Run a marathon"))
+    db.reads = 0
+
+    assert service.get_goal(goal_id)['tasks'] == ["Start"]
+    assert service.get_goal(goal_id)['tasks'] == ["Start"]
+    assert db.reads == 1
+
+    service._forget_goal(goal_id)  # as store_user_goal does for a known goal id
+    db.data['goals'][goal_id]['tasks'] = ["Changed"]
+    assert service.get_goal(goal_id)['tasks'] == ["Changed"]
+    assert service.get_goal("missing") is None
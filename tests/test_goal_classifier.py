@@ -0,0 +1,46 @@
+import pytest
+
+from config.prompts import CATEGORY_QUESTION_BANKS
+from services.goal_classifier import GoalClassifier, stem
+from services.llm_cache import ResponseCache
+from services.openai_service import OpenAIService
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    monkeypatch.setattr(GoalClassifier, "_instance", None)
+    classifier = GoalClassifier()
+    classifier.enabled = True
+    return classifier
+
+
+def test_stems_match_word_forms():
+    assert stem("running") == stem("runs") == stem("run")
+
+
+@pytest.mark.parametrize("goal, category", [
+    ("Run my first marathon and lose 10 pounds", "fitness"),
+    ("Get promoted to senior software engineer", "career"),
+    ("Save $20,000 for a house down payment", "finance"),
+])
+def test_clear_goals_are_classified(classifier, goal, category):
+    assert classifier.classify(goal) == category
+
+
+def test_a_single_matching_word_is_not_enough(classifier):
+    assert classifier.classify("Learn to play piano at home") is None
+    assert classifier.stats()['unclassified'] == 1
+
+
+def test_disabled_classifier_classifies_nothing(classifier):
+    classifier.enabled = False
+    assert classifier.classify("Run my first marathon") is None
+
+
+def test_classified_goals_get_bank_questions_without_a_request(classifier, monkeypatch):
+    monkeypatch.setattr(ResponseCache, "_instance", None)
+    service = OpenAIService()
+    service.classifier = classifier
+    service.llm = None  # any request would fail
+
+    assert service.fetch_questions("Run my first marathon and lose 10 pounds") == CATEGORY_QUESTION_BANKS["fitness"]
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from services import job_service
+from services.job_service import Job, JobService
+from services.llm_scheduler import current_session_id
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    monkeypatch.setattr(JobService, "_instance", None)
+    return JobService()
+
+
+def test_jobs_run_as_their_session_and_report_progress(jobs):
+    def work(job):
+        job.report("first item")
+        return current_session_id()
+
+    job = jobs.submit("session-1", "plan", work)
+    job.future.result(timeout=5)
+
+    assert jobs.get(job.id) is job
+    assert job.status == Job.DONE
+    assert job.result == "session-1"
+    assert job.progress == ["first item"]
+
+
+def test_failed_jobs_keep_their_error(jobs):
+    def work(job):
+        raise ValueError("bad plan")
+
+    job = jobs.submit("session-1", "plan", work)
+    job.future.result(timeout=5)
+
+    assert job.status == Job.FAILED
+    assert str(job.error) == "bad plan"
+    assert jobs.stats()['failed'] == 1
+
+
+def test_queued_jobs_can_be_cancelled(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(job_service, "JOB_MAX_WORKERS", 1)
+    monkeypatch.setattr(JobService, "_instance", None)
+    jobs = JobService()
+    blocker = jobs.submit("session-1", "plan", lambda job: release.wait(5))
+    queued = jobs.submit("session-2", "plan", lambda job: "never")
+
+    jobs.cancel(queued.id)
+    release.set()
+    blocker.future.result(timeout=5)
+
+    assert queued.status == Job.CANCELLED
+    assert jobs.get(queued.id) is None
+
+
+def test_finished_jobs_expire(jobs, monkeypatch):
+    job = jobs.submit("session-1", "plan", lambda job: "done")
+    job.future.result(timeout=5)
+    monkeypatch.setattr(job_service, "JOB_RESULT_TTL_SECONDS", -1)
+
+    assert jobs.get(job.id) is None
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from services.json_repair import ResponseRepairer, UnsalvageableResponse, extract_json_object, fix_json_syntax
+from services.openai_service import GoalPlan
+
+PLAN = {
+    'strategic_initiatives': ["Build a base", "Add speed work", "Taper"],
+    'one_time_actions': ["Buy shoes", "Sign up for a race"],
+    'habits': ["Run daily", "Stretch", "Sleep eight hours"],
+}
+
+
+@pytest.fixture
+def repairer(monkeypatch):
+    monkeypatch.setattr(ResponseRepairer, "_instance", None)
+    return ResponseRepairer()
+
+
+def test_json_is_found_inside_prose_and_code_fences():
+    text = 'Here is your plan:\n```json\n{"a": "}", "b": [1, 2]}\n```\nGood luck!'
+    assert json.loads(extract_json_object(text)) == {'a': "}", 'b': [1, 2]}
+
+
+def test_truncated_json_is_closed():
+    text = '{"habits": ["Run daily", "Stretch",'
+    assert json.loads(fix_json_syntax(extract_json_object(text))) == {'habits': ["Run daily", "Stretch"]}
+    assert json.loads(fix_json_syntax('{“a”: ["x",]}')) == {'a': ["x"]}
+
+
+def test_clean_responses_are_counted_as_clean(repairer):
+    assert repairer.parse(json.dumps(PLAN), GoalPlan) == PLAN
+    assert repairer.stats()['clean'] == 1
+
+
+def test_lists_are_coerced_to_the_model_bounds(repairer):
+    data = dict(PLAN, habits="- Run daily\n- Stretch\n- Sleep\n- Read\n- Walk\n- Cook\n- Journal\n- Plan\n",
+                one_time_actions=["Buy shoes"])
+
+    parsed = repairer.parse(json.dumps(data), GoalPlan, fillers={'one_time_actions': ["Buy shoes", "Book a checkup"]})
+
+    GoalPlan(**parsed)
+    assert parsed['habits'][:2] == ["Run daily", "Stretch"]
+    assert parsed['one_time_actions'] == ["Buy shoes", "Book a checkup"]
+    assert repairer.stats()['salvaged'] == 1
+
+
+def test_unsalvageable_responses_raise(repairer):
+    with pytest.raises(UnsalvageableResponse):
+        repairer.parse("I can't help with that.", GoalPlan)
+    with pytest.raises(UnsalvageableResponse):
+        repairer.parse(json.dumps(dict(PLAN, habits=[])), GoalPlan)
+    assert repairer.stats()['failed'] == 2
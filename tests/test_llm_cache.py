@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from config.prompts import PLAN_CONFIG
+from services import llm_cache
+from services.llm_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DISK_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(ResponseCache, "_instance", None)
+    return ResponseCache()
+
+
+def plan_key(goal, answers):
+    return make_cache_key(PLAN_CONFIG.model, PLAN_CONFIG, goal, ["Any injuries?"], answers)
+
+
+def test_keys_ignore_whitespace_only():
+    assert plan_key("Run a  marathon ", ["No"]) == plan_key("Run a marathon", [" No"])
+    assert plan_key("Run a marathon", ["No"]) != plan_key("run a marathon", ["No"])
+    assert plan_key("Run a marathon", ["Knee surgery."]) != plan_key("Run a marathon", ["Knee surgery?"])
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.max_entries = 2
+    cache._disk = None
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_expired_entries_are_misses(cache):
+    cache.ttl = -1
+    cache.set("a", "1")
+
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_a_restart(cache, monkeypatch):
+    cache.set("a", "1")
+    monkeypatch.setattr(ResponseCache, "_instance", None)
+
+    restarted = ResponseCache()
+
+    assert restarted.get("a") == "1"
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_concurrent_writers_and_readers(cache):
+    def worker(n):
+        for i in range(50):
+            cache.set(f"{n}-{i}", str(i))
+            assert cache.get(f"{n}-{i}") == str(i)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()['entries'] == 400
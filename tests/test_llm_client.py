@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from fakes import fake_completion
+from services.llm_client import LLMClient, TokenUsage, run_async
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(LLMClient, "_instance", None)
+    monkeypatch.setattr(LLMClient, "_initialized", False)
+    return LLMClient("test")
+
+
+def test_services_share_one_client(client):
+    assert LLMClient() is client
+    assert LLMClient("other").client is client.client
+
+
+def test_chat_carries_the_reported_usage(client):
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: fake_completion("hello", prompt_tokens=12, completion_tokens=3)
+    )))
+
+    response = client.chat("m", [{'role': 'user', 'content': "hi"}])
+
+    assert response == "hello"
+    assert response.usage == TokenUsage(12, 3)
+
+
+def test_async_work_from_many_threads_shares_one_loop():
+    async def loop_of(value):
+        await asyncio.sleep(0.01)
+        return asyncio.get_running_loop(), value, request_id.get()
+
+    results = []
+
+    def submit(value):
+        request_id.set(f"request-{value}")
+        results.append(run_async(loop_of(value)).result(timeout=5))
+
+    threads = [threading.Thread(target=submit, args=(value,)) for value in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({loop for loop, _, _ in results}) == 1
+    assert all(context == f"request-{value}" for _, value, context in results)
+
+
+def test_async_errors_reach_the_caller():
+    async def fail():
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError, match="bad response"):
+        run_async(fail()).result(timeout=5)
+
+
+def test_async_client_refuses_other_loops(client):
+    async def outside():
+        client._async_client()
+
+    with pytest.raises(RuntimeError, match="shared event loop"):
+        asyncio.run(outside())
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services.llm_client import LLMClient
+from services.llm_providers import LLMProvider, LLMRouter
+from services.resilience import ResilienceManager, first_fragment_key
+
+
+class FakeProvider(LLMProvider):
+    """Streams three fragments per model after a per-model delay and records how each stream ended."""
+
+    def __init__(self, delays, errors=()):
+        self.delays = delays
+        self.errors = set(errors)
+        self.ended = {}  # model -> "finished" or "closed"
+        self.ended_event = threading.Event()
+
+    def _end(self, model, how):
+        self.ended[model] = how
+        self.ended_event.set()
+
+    def chat(self, model, messages, timeout=None, **kwargs):
+        return "".join(self.stream_chat(model, messages))
+
+    def stream_chat(self, model, messages, timeout=None, **kwargs):
+        time.sleep(self.delays.get(model, 0))
+        if model in self.errors:
+            raise ValueError(f"{model} failed")
+        how = "closed"
+        try:
+            for part in range(3):
+                yield f"{model}{part} "
+                time.sleep(0.01)
+            how = "finished"
+        finally:
+            self._end(model, how)
+
+    async def astream_chat(self, model, messages, timeout=None, **kwargs):
+        how = "closed"
+        try:
+            await asyncio.sleep(self.delays.get(model, 0))
+            for part in range(3):
+                yield f"{model}{part} "
+                await asyncio.sleep(0.01)
+            how = "finished"
+        finally:
+            self._end(model, how)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(ResilienceManager, "_instance", None)
+    monkeypatch.setattr(LLMRouter, "_instance", None)
+    monkeypatch.setattr(LLMRouter, "_initialized", False)
+    router = LLMRouter()
+    router.hedging_enabled = True
+    router.hedge_delay = 0.05
+    return router
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_hedge_delay_follows_observed_p95(router):
+    key = first_fragment_key("m")
+    assert router.hedge_delay_for(key) == 0.05
+    for i in range(1, 21):
+        router.resilience.latency.record(key, i / 10)
+    assert router.hedge_delay_for(key) == pytest.approx(1.9)
+
+
+def test_slow_stream_is_hedged_and_the_loser_closed(router):
+    router.provider = FakeProvider({"slow": 0.3, "fast": 0})
+    fragments = list(router.stream_chat("slow", MESSAGES, hedge_model="fast"))
+
+    assert fragments == ["fast0 ", "fast1 ", "fast2 "]
+    assert router.stats()['hedges_fired'] == 1
+    assert router.stats()['hedge_wins'] == 1
+    deadline = time.time() + 2
+    while "slow" not in router.provider.ended and time.time() < deadline:
+        time.sleep(0.01)
+    assert router.provider.ended["slow"] == "closed"
+
+
+def test_fast_stream_is_not_hedged(router):
+    router.provider = FakeProvider({"slow": 0, "fast": 0})
+    assert "".join(router.stream_chat("slow", MESSAGES, hedge_model="fast")) == "slow0 slow1 slow2 "
+    assert router.stats()['hedges_fired'] == 0
+
+
+def test_hedged_chat_returns_the_winning_text(router):
+    router.provider = FakeProvider({"slow": 0.3, "fast": 0})
+    assert router.chat("slow", MESSAGES, hedge_model="fast") == "fast0 fast1 fast2 "
+
+
+def test_failed_primary_falls_back_before_hedging(router):
+    router.provider = FakeProvider({}, errors={"broken"})
+    text = "".join(router.stream_chat("broken", MESSAGES, fallback_models=["backup"], hedge_model="fast"))
+    assert text == "backup0 backup1 backup2 "
+    assert router.stats()['hedges_fired'] == 0
+    assert router.stats()['fallbacks'] == 1
+
+
+def test_async_stream_hedge_cancels_the_loser(router):
+    router.provider = FakeProvider({"slow": 0.3, "fast": 0})
+
+    async def collect():
+        fragments = [delta async for delta in router.astream_chat("slow", MESSAGES, hedge_model="fast")]
+        await asyncio.sleep(0)  # let the cancellation land
+        return fragments
+
+    assert asyncio.run(collect()) == ["fast0 ", "fast1 ", "fast2 "]
+    assert router.provider.ended["slow"] == "closed"
+    assert router.provider.ended["fast"] == "finished"
+
+
+def test_closing_an_abandoned_stream_frees_its_slot(router):
+    router.provider = FakeProvider({})
+    stream = router.stream_chat("abandoned", MESSAGES)
+    assert next(stream) == "abandoned0 "
+    assert router.scheduler.stats()['models']['abandoned']['active'] == 1
+
+    stream.close()
+
+    assert router.scheduler.stats()['models']['abandoned']['active'] == 0
+    assert router.provider.ended["abandoned"] == "closed"
+
+
+def test_closing_an_abandoned_async_stream_frees_its_slot(router):
+    router.provider = FakeProvider({})
+
+    async def abandon():
+        stream = router.astream_chat("abandoned-async", MESSAGES)
+        assert await stream.__anext__() == "abandoned-async0 "
+        await stream.aclose()
+        # Before the event loop shuts down, which would finalize leftover generators anyway
+        assert router.scheduler.stats()['models']['abandoned-async']['active'] == 0
+        assert router.provider.ended["abandoned-async"] == "closed"
+
+    asyncio.run(abandon())
+
+
+class FakeSDKStream:
+    """The SDK's streamed response: chunks plus `close`, which releases the connection."""
+
+    def __init__(self, texts):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+                       for text in texts]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def test_abandoned_client_stream_releases_its_connection(monkeypatch):
+    monkeypatch.setattr(LLMClient, "_instance", None)
+    monkeypatch.setattr(LLMClient, "_initialized", False)
+    client = LLMClient("test")
+    response = FakeSDKStream(["a", "b", "c"])
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+
+    stream = client.stream_chat("m", MESSAGES)
+    assert next(stream) == "a"
+    stream.close()
+
+    assert response.closed
@@ -0,0 +1,69 @@
+import pytest
+
+import maintenance
+from services.plan_store import content_hash
+from fakes import FakeFirestore
+
+PLAN = dict(goal="Run a marathon", questions=["How fit are you?"], answers={"0": "Not very"},
+            tasks=["Build a base"], habits=["Run daily"])
+
+
+def goal(session_id, timestamp, email=None, time_commitment=None):
+    return {
+        **PLAN,
+        'session_id': session_id,
+        'content_hash': content_hash(PLAN['goal'], PLAN['questions'], PLAN['answers'], PLAN['tasks'], PLAN['habits']),
+        'timestamp': timestamp,
+        'time_commitment': time_commitment,
+        'reminder_settings': {'email': email, 'frequency': 'Daily', 'time': None},
+    }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeFirestore()
+    monkeypatch.setattr(maintenance, "FirebaseService", lambda: type("Service", (), {'db': db})())
+    return db
+
+
+def test_merges_copies_of_one_session(db, monkeypatch):
+    monkeypatch.setattr(maintenance, "backfill_goals", lambda dry_run: None)
+    goals = db.collection('goals')
+    goals.document('first').set(goal('s1', 1))
+    goals.document('second').set(goal('s1', 2, email='a@example.com', time_commitment='30 minutes'))
+    db.collection('reminders').document('r2').set({'goal_id': 'second', 'email': 'a@example.com'})
+
+    maintenance.dedupe_goals(dry_run=True)
+    assert set(db.data['goals']) == {'first', 'second'}
+
+    maintenance.dedupe_goals(dry_run=False)
+
+    assert set(db.data['goals']) == {'first'}
+    kept = db.data['goals']['first']
+    assert kept['reminder_settings']['email'] == 'a@example.com'
+    assert kept['time_commitment'] == '30 minutes'
+    assert db.data['reminders']['r2']['goal_id'] == 'first'
+
+
+def test_never_merges_identical_plans_of_different_sessions(db, monkeypatch):
+    monkeypatch.setattr(maintenance, "backfill_goals", lambda dry_run: None)
+    goals = db.collection('goals')
+    goals.document('alice').set(goal('s1', 1, email='alice@example.com'))
+    goals.document('bob').set(goal('s2', 2, email='bob@example.com'))
+
+    maintenance.dedupe_goals(dry_run=False)
+
+    assert db.data['goals']['alice']['reminder_settings']['email'] == 'alice@example.com'
+    assert db.data['goals']['bob']['reminder_settings']['email'] == 'bob@example.com'
+
+
+def test_sessionless_goals_merge_only_with_the_same_email(db, monkeypatch):
+    monkeypatch.setattr(maintenance, "backfill_goals", lambda dry_run: None)
+    goals = db.collection('goals')
+    goals.document('a1').set(goal(None, 1, email='a@example.com'))
+    goals.document('a2').set(goal(None, 2, email='a@example.com'))
+    goals.document('b1').set(goal(None, 3, email='b@example.com'))
+
+    maintenance.dedupe_goals(dry_run=False)
+
+    assert set(db.data['goals']) == {'a1', 'b1'}
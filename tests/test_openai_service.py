@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+
+from services import openai_service
+from services.llm_cache import ResponseCache
+from services.openai_service import OpenAIService, PLAN_FILLERS
+from services.resilience import CircuitOpenError
+
+
+class FakeLLM:
+    """Stands in for the LLMRouter: answers every request with the queued responses in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def _next(self, kind):
+        self.calls.append(kind)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def chat(self, model, messages, **kwargs):
+        return self._next("chat")
+
+    def stream_chat(self, model, messages, **kwargs):
+        content = self._next("stream")
+        for start in range(0, len(content), 7):
+            yield content[start:start + 7]
+
+    async def achat(self, model, messages, **kwargs):
+        return self._next("achat")
+
+    async def astream_chat(self, model, messages, **kwargs):
+        content = self._next("astream")
+        for start in range(0, len(content), 7):
+            yield content[start:start + 7]
+
+
+PLAN = {
+    'strategic_initiatives': ["Train three times a week", "Join a running club"],
+    'one_time_actions': ["Buy running shoes", "Pick a race"],
+    'habits': [f"Habit {i}" for i in range(1, 10)],
+}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(ResponseCache, "_instance", None)
+    service = OpenAIService()
+    monkeypatch.setattr(service.classifier, "enabled", False)
+    errors = []
+    monkeypatch.setattr(openai_service.st, "error", errors.append)
+    service.errors = errors
+    return service
+
+
+def test_streamed_items_match_the_validated_plan(service):
+    service.llm = FakeLLM(json.dumps(PLAN))
+    streamed = []
+
+    plan = service.fetch_plan("Run a marathon", ["Q?"], ["A"], on_item=lambda section, item: streamed.append((section, item)))
+
+    habits = [item for section, item in streamed if section == 'habits']
+    initiatives = [item for section, item in streamed if section == 'strategic_initiatives']
+    assert habits == plan['habits'].split('\n')
+    assert len(habits) == 7  # the schema maximum, not the 9 the model sent
+    assert initiatives == plan['initiatives'].split('\n')
+    assert initiatives[-1] == PLAN_FILLERS['strategic_initiatives'][0]  # padded to the minimum of 3
+
+
+def test_unsalvageable_response_is_requested_again_without_streaming(service):
+    service.llm = FakeLLM("not json at all", json.dumps(PLAN))
+    streamed = []
+
+    plan = service.fetch_plan("Learn to swim", ["Q?"], ["A"], on_item=lambda section, item: streamed.append(item))
+
+    assert service.llm.calls == ["stream", "chat"]
+    assert plan['one_time_actions'] == "Buy running shoes\nPick a race"
+
+
+def test_sync_and_async_fetch_parse_alike(service):
+    content = json.dumps({'questions': ["  Why? ", "", "How?", "When?", "Where?", "Who?"]})
+    service.llm = FakeLLM(content, content)
+    parser = openai_service.IncrementalJSONParser(["questions"])
+    config = openai_service.QUESTIONS_CONFIG
+    sync = service._fetch_json(config, [], "sync-key", parser, model_cls=openai_service.QuestionSet)
+    streamed = []
+    asynchronous = asyncio.run(service._afetch_json(
+        config, [], "async-key", openai_service.IncrementalJSONParser(["questions"]),
+        lambda key, question: streamed.append(question), model_cls=openai_service.QuestionSet
+    ))
+    assert sync == asynchronous == {'questions': ["Why?", "How?", "When?", "Where?"]}
+    assert streamed == asynchronous['questions']
+
+
+def test_cached_response_is_not_requested_again(service):
+    service.llm = FakeLLM(json.dumps({'questions': ["Why?"]}))
+    assert service.fetch_questions("Write a novel") == ["Why?"]
+    assert service.fetch_questions("Write a novel") == ["Why?"]
+    assert service.llm.calls == ["chat"]
+
+
+@pytest.mark.parametrize("error, message", [
+    (CircuitOpenError("gpt-4o-mini", 30), "Please try again in 30 seconds."),
+    (ValueError("bad"), "Error processing the AI response. Please try again."),
+    (RuntimeError("boom"), "An unexpected error occurred. Please try again."),
+])
+def test_entry_points_report_errors_with_error_message(service, error, message):
+    service.llm = FakeLLM(error, error, error)
+    assert service.generate_questions("Climb a mountain") == []
+    assert service.generate_plan("Climb a mountain", ["Q?"], ["A"]) is None
+    plan = {'goal': "Climb a mountain", 'questions': ["Q?"], 'answers': ["A"],
+            'initiatives': "a", 'one_time_actions': "b", 'habits': "c"}
+    assert service.regenerate_section(plan, 'habits') is None
+    assert len(service.errors) == 3
+    assert all(text.endswith(message) for text in service.errors)
+
+
+def test_oneshot_refinement_makes_one_request(service):
+    service.llm = FakeLLM(json.dumps({
+        'refined_goal': "I will run a marathon in under four hours by October",
+        'questions': ["How far do you run now?", "Any injuries?", "How many days a week?", "Which race?", "Extra?"],
+    }))
+    streamed = []
+
+    refined = service.generate_refined_goal_and_questions("Run a marathon", "Sub four hours", streamed.append)
+
+    assert service.llm.calls == ["stream"]
+    assert refined.refined_goal.startswith("I will run a marathon")
+    assert refined.questions == streamed
+    assert len(refined.questions) == 4
+
+
+STORED_PLAN = {'goal': "Run a marathon", 'questions': ["Q?"], 'answers': ["A"],
+               'initiatives': "Build a base\nAdd speed work\nTaper",
+               'one_time_actions': "Buy shoes\nPick a race",
+               'habits': "Run daily\nStretch\nSleep eight hours"}
+
+
+def test_regenerating_a_section_leaves_the_rest_untouched(service):
+    service.llm = FakeLLM(json.dumps({'habits': ["Run before work", "Foam roll", "Log every run"]}))
+
+    updated = service.regenerate_section(STORED_PLAN, 'habits', answers=["New answer"], feedback="Mornings only")
+
+    assert service.llm.calls == ["chat"]
+    assert updated['habits'] == "Run before work\nFoam roll\nLog every run"
+    assert updated['answers'] == ["New answer"]
+    assert {key: updated[key] for key in ('initiatives', 'one_time_actions')} == \
+        {key: STORED_PLAN[key] for key in ('initiatives', 'one_time_actions')}
+
+
+def test_regenerating_an_item_replaces_only_that_item(service):
+    service.llm = FakeLLM(json.dumps({'item': "Pick a spring race"}))
+
+    updated = service.regenerate_section(STORED_PLAN, 'one_time_actions', item_index=1)
+
+    assert updated['one_time_actions'] == "Buy shoes\nPick a spring race"
+    assert updated['habits'] == STORED_PLAN['habits']
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fakes import FakeFirestore, fake_firebase_service
+from services import plan_index
+from services.plan_index import PlanIndex
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "plan_index.npz")
+    monkeypatch.setattr(plan_index, "PLAN_INDEX_PATH", path)
+    monkeypatch.setattr(PlanIndex, "_instance", None)
+    return path
+
+
+def store_goals(db, goals, start=START):
+    for i, (goal_id, goal) in enumerate(goals):
+        db.collection('goals').document(goal_id).set({'goal': goal, 'timestamp': start + timedelta(seconds=i)})
+
+
+def test_sync_pages_through_goals_sharing_a_timestamp(snapshot_path):
+    db = FakeFirestore()
+    for i in range(7):
+        db.collection('goals').document(f"g{i}").set({'goal': f"goal number {i}", 'timestamp': START})
+    service = fake_firebase_service(db)
+    index = PlanIndex()
+
+    index.sync(service.get_goals_since, page_size=3)
+
+    assert len(index) == 7
+    assert index._synced_until == (START, "g6")
+
+
+def test_search_returns_the_most_similar_goal(snapshot_path):
+    index = PlanIndex()
+    index.add("marathon", "Run a marathon in under four hours")
+    index.add("spanish", "Learn to speak Spanish fluently")
+
+    [(goal_id, similarity)] = index.search("run my first marathon", k=1)
+
+    assert goal_id == "marathon"
+    assert similarity > 0
+    assert index.search("", k=1) == []
+
+
+def test_restart_only_syncs_goals_stored_since_the_snapshot(snapshot_path, monkeypatch):
+    db = FakeFirestore()
+    store_goals(db, [("a", "Run a marathon"), ("b", "Learn Spanish")])
+    service = fake_firebase_service(db)
+    PlanIndex().sync(service.get_goals_since)
+
+    monkeypatch.setattr(PlanIndex, "_instance", None)
+    store_goals(db, [("c", "Write a novel")], start=START + timedelta(minutes=1))
+    db.reads = 0
+    restarted = PlanIndex()
+    assert len(restarted) == 2
+    restarted.sync(service.get_goals_since)
+
+    assert len(restarted) == 3
+    assert db.reads == 1
+    assert restarted.search("write a novel", k=1)[0][0] == "c"
+
+
+def test_snapshot_with_other_dimensions_is_ignored(snapshot_path, monkeypatch):
+    index = PlanIndex()
+    index.add("a", "Run a marathon")
+    index._save()
+
+    monkeypatch.setattr(plan_index, "PLAN_INDEX_DIMENSIONS", 64)
+    monkeypatch.setattr(PlanIndex, "_instance", None)
+
+    assert len(PlanIndex()) == 0
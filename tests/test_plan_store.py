@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from services import plan_store
+from services.plan_store import PlanStore
+
+PLAN = {'goal': "Run a marathon", 'questions': ["Q?"], 'answers': ["A"],
+        'initiatives': "Build a base", 'one_time_actions': "Buy shoes", 'habits': "Run daily"}
+
+
+class FakeFirebaseService:
+    """Records stored goals; fails the next `failures` writes."""
+
+    def __init__(self):
+        self.stored = []
+        self.failures = 0
+        self.written = threading.Event()
+
+    def store_user_goal(self, goal_id=None, **fields):
+        if self.failures:
+            self.failures -= 1
+            return None
+        self.stored.append((goal_id, fields))
+        self.written.set()
+        return goal_id
+
+
+@pytest.fixture
+def firebase(monkeypatch):
+    service = FakeFirebaseService()
+    monkeypatch.setattr(plan_store, "FirebaseService", lambda: service)
+    monkeypatch.setattr(PlanStore, "_instance", None)
+    return service
+
+
+def make_store(monkeypatch, write_behind, debounce=0.0):
+    monkeypatch.setattr(plan_store, "PLAN_WRITE_BEHIND_ENABLED", write_behind)
+    monkeypatch.setattr(plan_store, "PLAN_WRITE_DEBOUNCE_SECONDS", debounce)
+    return PlanStore()
+
+
+def test_unchanged_saves_are_skipped(firebase, monkeypatch):
+    store = make_store(monkeypatch, write_behind=False)
+    goal_id = store.save("session-1", PLAN, 30, "a@example.com")
+    assert store.save("session-1", dict(PLAN), 30, "a@example.com") == goal_id
+    store.save("session-1", PLAN, 45, "a@example.com")
+
+    assert [stored_id for stored_id, _ in firebase.stored] == [goal_id, goal_id]
+    assert firebase.stored[0][1]['extra_fields']['session_id'] == "session-1"
+    assert store.stats()['skipped'] == 1
+
+
+def test_each_session_gets_its_own_document(firebase, monkeypatch):
+    store = make_store(monkeypatch, write_behind=False)
+    assert store.save("session-1", PLAN) != store.save("session-2", PLAN)
+
+
+def test_rapid_changes_are_coalesced_into_one_write(firebase, monkeypatch):
+    store = make_store(monkeypatch, write_behind=True, debounce=0.2)
+    for minutes in (10, 20, 30):
+        store.save("session-1", PLAN, minutes)
+
+    assert firebase.written.wait(5)
+    time.sleep(0.3)
+    assert len(firebase.stored) == 1
+    assert firebase.stored[0][1]['time_commitment'] == 30
+    assert store.stats()['coalesced'] == 2
+
+
+def test_failed_writes_are_retried(firebase, monkeypatch):
+    firebase.failures = 2
+    store = make_store(monkeypatch, write_behind=True)
+    goal_id = store.save("session-1", PLAN)
+
+    assert firebase.written.wait(5)
+    assert firebase.stored[0][0] == goal_id
+    assert store.stats()['failures'] == 2
+    assert store.stats()['pending'] == 0
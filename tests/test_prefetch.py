@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from services import prefetch_service
+from services.llm_scheduler import current_session_id, scheduling
+from services.prefetch_service import PrefetchService
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    monkeypatch.setattr(PrefetchService, "_instance", None)
+    return PrefetchService()
+
+
+def test_matching_key_takes_the_prefetched_result(prefetch):
+    with scheduling("session-1"):
+        prefetch.start("session-1", "questions", "goal", current_session_id)
+
+    future = prefetch.take("session-1", "questions", "goal")
+
+    assert future.result(timeout=5) == "session-1"
+    assert prefetch.take("session-1", "questions", "goal") is None
+    assert prefetch.stats()['hits'] == 1
+
+
+def test_same_work_is_started_once(prefetch):
+    calls = []
+    for _ in range(3):
+        prefetch.start("session-1", "questions", "goal", calls.append, "goal")
+
+    prefetch.take("session-1", "questions", "goal").result(timeout=5)
+
+    assert calls == ["goal"]
+    assert prefetch.stats()['started'] == 1
+
+
+def test_changed_input_counts_as_wasted(prefetch):
+    started, release = threading.Event(), threading.Event()
+
+    def call():
+        started.set()
+        release.wait(5)
+
+    prefetch.start("session-1", "questions", "old goal", call)
+    started.wait(5)
+
+    assert prefetch.take("session-1", "questions", "new goal") is None
+    release.set()
+
+    stats = prefetch.stats()
+    assert stats['wasted'] == 1
+    assert stats['pending'] == 0
+
+
+def test_untaken_work_expires(prefetch, monkeypatch):
+    prefetch.start("session-1", "questions", "goal", lambda: None)
+    monkeypatch.setattr(prefetch_service, "PREFETCH_TTL_SECONDS", -1)
+
+    prefetch.start("session-2", "questions", "goal", lambda: None)
+
+    assert prefetch.take("session-1", "questions", "goal") is None
+    assert prefetch.stats()['cancelled'] + prefetch.stats()['wasted'] == 1
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from config.prompts import PLAN_CONFIG
+from services import prompt_registry
+from services.llm_scheduler import scheduling
+from services.prompt_registry import PromptRegistry
+from services.telemetry import prompt_name
+
+EXPERIMENTS = {"PLAN_CONFIG": {"baseline": {"weight": 50}, "mini": {"weight": 50, "model": "gpt-4o-mini-test"}}}
+
+
+@pytest.fixture
+def experiments_path(tmp_path, monkeypatch):
+    path = tmp_path / "experiments.json"
+    path.write_text(json.dumps(EXPERIMENTS))
+    monkeypatch.setattr(prompt_registry, "PROMPT_EXPERIMENTS_PATH", str(path))
+    monkeypatch.setattr(prompt_registry, "PROMPT_EXPERIMENTS_RELOAD_SECONDS", 3600)
+    monkeypatch.setattr(PromptRegistry, "_instance", None)
+    return path
+
+
+def resolve_as(registry, session_id):
+    with scheduling(session_id):
+        return registry.resolve(PLAN_CONFIG)
+
+
+def test_sessions_keep_their_variant_and_are_counted_once(experiments_path):
+    registry = PromptRegistry()
+    models = {resolve_as(registry, f"session-{i}").model for i in range(40)}
+    assert models == {PLAN_CONFIG.model, "gpt-4o-mini-test"}
+
+    config = resolve_as(registry, "session-1")
+    assert all(resolve_as(registry, "session-1") is config for _ in range(5))
+    assert prompt_name(config) in ("PLAN_CONFIG@baseline", "PLAN_CONFIG@mini")
+    variants = registry.summary()["PLAN_CONFIG"]['variants']
+    assert sum(variant['sessions'] for variant in variants.values()) == 40
+
+
+def test_calls_outside_a_session_use_the_config_in_code(experiments_path):
+    assert PromptRegistry().resolve(PLAN_CONFIG) is PLAN_CONFIG
+
+
+def test_parses_and_completions_are_counted_per_variant(experiments_path):
+    registry = PromptRegistry()
+    config = resolve_as(registry, "session-1")
+    registry.record_parse(config, failed=True)
+    registry.record_parse(PLAN_CONFIG, failed=True)  # not a variant: ignored
+    with scheduling("session-1"):
+        registry.record_completion()
+        registry.record_completion()
+
+    variant = "mini" if config.model == "gpt-4o-mini-test" else "baseline"
+    summary = registry.summary()["PLAN_CONFIG"]['variants'][variant]
+    assert summary['parse_failure_rate'] == 1.0
+    assert summary['completion_rate'] == 1.0
+
+
+def test_promoting_a_variant_sends_every_session_to_it(experiments_path):
+    registry = PromptRegistry()
+    registry.promote("PLAN_CONFIG", "mini")
+
+    assert json.loads(experiments_path.read_text())["PLAN_CONFIG"]["baseline"]["weight"] == 0
+    assert {resolve_as(registry, f"session-{i}").model for i in range(20)} == {"gpt-4o-mini-test"}
+
+
+def test_a_broken_file_keeps_the_previous_experiments(experiments_path):
+    registry = PromptRegistry()
+    experiments_path.write_text('{"PLAN_CONFIG": {"mini": {"weight": 100, "no_such_field": 1}}}')
+    registry._mtime = None  # as if the file changed
+    registry._reload()
+
+    assert set(registry.summary()["PLAN_CONFIG"]['variants']) == {"baseline", "mini"}
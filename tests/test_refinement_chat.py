@@ -0,0 +1,54 @@
+import pytest
+
+from config.prompts import REFINEMENT_SUMMARY_CONFIG
+from services import goal_refinement_service
+from services.goal_refinement_service import GoalRefinementService
+from services.llm_cache import ResponseCache
+from services.refinement_chat import RefinementConversation
+from services.token_counter import count_message_tokens
+
+BUDGET = 300
+
+
+class FakeLLM:
+    """Replies with a long coaching answer, or a short summary when asked to compact."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def chat(self, model, messages, **kwargs):
+        if messages[0]['content'] == REFINEMENT_SUMMARY_CONFIG["system_role"]:
+            return "The user wants to run a marathon and has a bad knee."
+        self.prompts.append(count_message_tokens(messages, model))
+        return "Tell me more about your training so far. " * 10
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(ResponseCache, "_instance", None)
+    monkeypatch.setattr(goal_refinement_service, "REFINEMENT_CHAT_TOKEN_BUDGET", BUDGET)
+    monkeypatch.setattr(goal_refinement_service, "REFINEMENT_CHAT_KEEP_TURNS", 2)
+    service = GoalRefinementService()
+    service.llm = FakeLLM()
+    return service
+
+
+def test_long_conversations_stay_within_the_token_budget(service):
+    conversation = RefinementConversation("Run a marathon")
+    for turn in range(8):
+        service.fetch_chat_reply(conversation, f"Turn {turn}: I run twice a week but my knee hurts after long runs.")
+
+    assert max(service.llm.prompts) <= BUDGET
+    assert conversation.summary.startswith("The user wants to run a marathon")
+    assert conversation.summarized > 0
+    assert len(conversation.messages) == 16
+    assert any(stats['compacted'] for stats in conversation.turn_stats)
+
+
+def test_the_latest_proposed_goal_is_found():
+    conversation = RefinementConversation("Run a marathon")
+    conversation.add("assistant", "**Refined goal:** Run a half marathon by June")
+    conversation.add("user", "Make it a full one")
+    conversation.add("assistant", "Sounds good.\nRefined goal: Run a marathon in under four hours by October")
+
+    assert conversation.proposed_goal() == "Run a marathon in under four hours by October"
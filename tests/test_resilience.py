@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from services import resilience
+from services.resilience import CircuitBreaker, CircuitOpenError, ResilienceManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(ResilienceManager, "_instance", None)
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0)
+    return ResilienceManager()
+
+
+def open_breaker(manager, endpoint):
+    breaker = manager.breaker(endpoint)
+    breaker.failure_threshold = 1
+    breaker.record_failure()
+    breaker._opened_at = time.time() - breaker.reset_timeout  # cool-down elapsed: next call is the probe
+    return breaker
+
+
+def test_breaker_opens_and_admits_one_probe():
+    breaker = CircuitBreaker("m", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    breaker._opened_at -= 60
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_probe_does_not_wedge_breaker(manager):
+    breaker = open_breaker(manager, "m")
+    started = asyncio.Event()
+
+    async def slow(timeout):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def scenario():
+        probe = asyncio.ensure_future(manager.acall("m", slow))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert manager.call("m", lambda timeout: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_abandoned_stream_probe_does_not_wedge_breaker(manager):
+    breaker = open_breaker(manager, "m")
+
+    def fragments(timeout):
+        yield "a"
+        yield "b"
+
+    stream = manager.stream("m", fragments)
+    assert next(stream) == "a"
+    stream.close()  # GeneratorExit inside the probe
+
+    assert breaker.allow_request()
+
+
+def test_interrupted_callback_does_not_wedge_breaker(manager):
+    breaker = open_breaker(manager, "m")
+
+    class Rerun(BaseException):
+        pass
+
+    def interrupted(timeout):
+        raise Rerun()
+
+    with pytest.raises(Rerun):
+        manager.call("m", interrupted)
+    assert breaker.allow_request()
+
+
+def test_open_breaker_fails_fast(manager):
+    breaker = open_breaker(manager, "m")
+    breaker._opened_at = time.time()
+    with pytest.raises(CircuitOpenError):
+        manager.call("m", lambda timeout: "ok")
+
+
+def test_retries_transient_errors_then_succeeds(manager):
+    import httpx
+    import openai
+
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise openai.APITimeoutError(request=httpx.Request("POST", "https://example.invalid"))
+        return "ok"
+
+    assert manager.call("m", flaky) == "ok"
+    assert len(calls) == 3
+    assert manager.stats()['retries'] == 2
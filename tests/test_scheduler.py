@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.llm_scheduler import FairScheduler, scheduling
+
+
+class Interrupted(BaseException):
+    """Stands in for Streamlit's rerun exception, which is not an Exception."""
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(FairScheduler, "_instance", None)
+    scheduler = FairScheduler()
+    scheduler.limits = {"m": 1}
+    return scheduler
+
+
+def wait_for_depth(scheduler, depth, model="m"):
+    deadline = time.time() + 5
+    while scheduler.queue_depth(model) < depth and time.time() < deadline:
+        time.sleep(0.005)
+    assert scheduler.queue_depth(model) == depth
+
+
+def queue_request(scheduler, session_id, served, on_queued=None):
+    def run():
+        try:
+            with scheduling(session_id, on_queued):
+                with scheduler.slot("m"):
+                    served.append(session_id)
+        except Interrupted:
+            served.append(f"{session_id} interrupted")
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_concurrency_is_capped_per_model(scheduler):
+    scheduler.limits = {"m": 2}
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def work():
+        with scheduler.slot("m"):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert scheduler.stats()['models']['m']['active'] == 0
+
+
+def test_a_burst_from_one_session_does_not_starve_another(scheduler):
+    served, threads = [], []
+    with scheduler.slot("m"):
+        for depth, session_id in enumerate(["a", "a", "a", "b"], start=1):
+            threads.append(queue_request(scheduler, session_id, served))
+            wait_for_depth(scheduler, depth)
+    for thread in threads:
+        thread.join()
+
+    assert served.index("b") < 3
+
+
+def test_an_interrupted_waiter_gives_up_its_place(scheduler):
+    served = []
+
+    def interrupt(position):
+        if position:
+            raise Interrupted()
+
+    with scheduler.slot("m"):
+        interrupted = queue_request(scheduler, "a", served, on_queued=interrupt)
+        interrupted.join()
+        waiting = queue_request(scheduler, "b", served)
+        wait_for_depth(scheduler, 1)
+    waiting.join()
+
+    assert served == ["a interrupted", "b"]
+    assert scheduler.queue_depth("m") == 0
+
+
+def test_deep_queues_are_downgraded(scheduler):
+    scheduler.downgrade_threshold = 1
+    scheduler.downgrades = {"m": "mini"}
+    used = []
+
+    def run():
+        with scheduler.slot("m") as model:
+            used.append(model)
+
+    with scheduler.slot("m"):
+        first = threading.Thread(target=run)
+        first.start()
+        wait_for_depth(scheduler, 1)
+        run()
+    first.join()
+
+    assert used == ["mini", "m"]
+    assert scheduler.stats()['downgraded'] == 1
+
+
+def test_async_slots_are_released(scheduler):
+    async def main():
+        async with scheduler.aslot("m"):
+            assert scheduler.stats()['models']['m']['active'] == 1
+
+    asyncio.run(main())
+
+    assert scheduler.stats()['models']['m']['active'] == 0
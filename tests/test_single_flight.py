@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+class Interrupted(BaseException):
+    """Stands in for Streamlit's rerun exception, which is not an Exception."""
+
+
+@pytest.fixture
+def flight(monkeypatch):
+    monkeypatch.setattr(SingleFlight, "_instance", None)
+    return SingleFlight()
+
+
+def run_concurrently(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_calls_run_once(flight):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "plan"
+
+    results = run_concurrently(5, lambda: flight.do("key", fetch))
+
+    assert calls == [1]
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"plan"}
+    assert flight.stats() == {'executions': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_waiters_receive_the_leaders_error(flight):
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("upstream down")
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            return str(e)
+
+    assert run_concurrently(3, call) == ["upstream down"] * 3
+
+
+def test_a_waiter_takes_over_when_the_leader_is_interrupted(flight):
+    leading = threading.Event()
+
+    def interrupted():
+        leading.set()
+        time.sleep(0.1)
+        raise Interrupted()
+
+    def lead():
+        with pytest.raises(Interrupted):
+            flight.do("key", interrupted)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    leading.wait(5)
+
+    assert flight.do("key", lambda: "plan") == ("plan", False)
+    leader.join()
+    assert flight.stats()['executions'] == 2
+
+
+def test_async_callers_are_coalesced(flight):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "plan"
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", fetch) for _ in range(3)))
+
+    results = asyncio.run(main())
+
+    assert calls == [1]
+    assert [result for result, _ in results] == ["plan"] * 3
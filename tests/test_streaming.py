@@ -0,0 +1,49 @@
+import json
+
+from services.json_repair import ValidatedElements
+from services.openai_service import GoalPlan
+from services.streaming import IncrementalJSONParser
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+def test_elements_are_emitted_as_soon_as_complete():
+    parser = IncrementalJSONParser(["habits"])
+    assert parser.feed('{"habits": ["Walk", "Re') == [("habits", "Walk")]
+    assert parser.feed('ad"]}') == [("habits", "Read")]
+
+
+def test_any_chunking_yields_the_same_elements():
+    text = 'Sure!\n```json\n' + json.dumps({
+        'goal': "x", 'habits': ["A, with comma", 'Quote \\" inside', {"nested": [1, 2]}], 'other': ["ignored"],
+    }) + '\n```'
+    expected = [("habits", "A, with comma"), ("habits", 'Quote \\" inside'), ("habits", {"nested": [1, 2]})]
+    for size in (1, 3, 7, len(text)):
+        assert feed_in_chunks(IncrementalJSONParser(["habits"]), text, size) == expected
+
+
+def test_validated_elements_stream_a_prefix_then_fillers():
+    received = []
+    validated = ValidatedElements(lambda key, item: received.append(item), ["habits"], GoalPlan)
+    for item in [" Walk ", "", "Read", *[f"H{i}" for i in range(10)]]:
+        validated("habits", item)
+    assert received == ["Walk", "Read", "H0", "H1", "H2", "H3", "H4"]  # at most 7
+
+    received.clear()
+    short = ValidatedElements(lambda key, item: received.append(item), ["habits"], GoalPlan)
+    short("habits", "Walk")
+    short.finish({'habits': ["Walk", "Filler 1", "Filler 2"]})
+    assert received == ["Walk", "Filler 1", "Filler 2"]
+
+
+def test_validated_elements_do_not_replay_a_diverged_response():
+    received = []
+    validated = ValidatedElements(lambda key, item: received.append(item), ["habits"], GoalPlan)
+    validated("habits", "Walk")
+    validated.finish({'habits': ["Something else", "Another", "Third"]})
+    assert received == ["Walk"]
@@ -0,0 +1,66 @@
+import dataclasses
+import threading
+
+from config.prompts import PLAN_CONFIG
+from services import telemetry
+from services.telemetry import LLMTelemetry, prompt_configs, prompt_name, register_prompt
+
+
+def test_configs_are_named_as_defined():
+    assert prompt_name(PLAN_CONFIG) == "PLAN_CONFIG"
+    assert prompt_configs()["PLAN_CONFIG"] is PLAN_CONFIG
+    assert prompt_name(dataclasses.replace(PLAN_CONFIG)) == telemetry.UNNAMED_PROMPT
+
+
+def test_registering_a_name_again_replaces_its_config(monkeypatch):
+    monkeypatch.setattr(telemetry, "_registered_prompts", {})
+    monkeypatch.setattr(telemetry, "_registered_names", {})
+    old = dataclasses.replace(PLAN_CONFIG, model="old")
+    register_prompt(old, "PLAN_CONFIG@fast")
+    for _ in range(100):
+        new = dataclasses.replace(PLAN_CONFIG, model="new")
+        register_prompt(new, "PLAN_CONFIG@fast")
+
+    assert prompt_name(new) == "PLAN_CONFIG@fast"
+    assert prompt_name(old) == telemetry.UNNAMED_PROMPT
+    assert len(telemetry._registered_names) == 1
+    assert "PLAN_CONFIG@fast" not in prompt_configs()
+
+
+def test_concurrent_calls_are_all_counted(monkeypatch):
+    monkeypatch.setattr(LLMTelemetry, "_instance", None)
+    monkeypatch.setattr(telemetry, "LLM_TELEMETRY_ENABLED", True)
+    monkeypatch.setattr(telemetry, "LLM_METRICS_PATH", "")
+    metrics = LLMTelemetry()
+    messages = [{'role': 'user', 'content': "Plan my week"}]
+
+    def worker():
+        for _ in range(50):
+            call = metrics.start("PLAN_CONFIG", "gpt-4o-mini", messages)
+            call.wrap(lambda: None)()
+            call.finish("ok")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    summary = metrics.prompt_summary("PLAN_CONFIG")
+    assert summary['calls'] == 400
+    assert summary['retries'] == 0
+    assert 'smart_planner_llm_call_duration_seconds_count{prompt="PLAN_CONFIG",model="gpt-4o-mini"} 400' \
+        in metrics.render_prometheus()
+
+
+def test_export_writes_the_whole_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLMTelemetry, "_instance", None)
+    monkeypatch.setattr(telemetry, "LLM_TELEMETRY_ENABLED", True)
+    monkeypatch.setattr(telemetry, "LLM_METRICS_PATH", "")
+    metrics = LLMTelemetry()
+    path = tmp_path / "llm.prom"
+
+    metrics.export(str(path))
+
+    assert path.read_text().endswith("\n")
+    assert not (tmp_path / "llm.prom.tmp").exists()